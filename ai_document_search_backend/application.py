@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import random
 import string
@@ -43,6 +44,58 @@ def create_app() -> FastAPI:
     app.include_router(chatbot_router.router)
     app.include_router(conversation_router.router)
 
+    @app.on_event("startup")
+    def create_auth_service():
+        # Hashes the password before the first request.
+        container.auth_service()
+
+    @app.on_event("startup")
+    def warm_up_chatbot_service():
+        if not container.config.chatbot.warm_up_on_startup():
+            return
+        try:
+            container.chatbot_service().warm_up()
+        except Exception as e:
+            logger.warning(f"Chatbot service warm-up failed: {e}")
+
+    @app.on_event("startup")
+    async def warm_up_cosmos_clients():
+        # Creates the database and the connections before the first request.
+        if container.config.conversation.database() != "cosmos":
+            return
+        cosmos_clients = container.cosmos_clients()
+        try:
+            if container.config.cosmos.provision_on_startup():
+                await asyncio.to_thread(
+                    cosmos_clients.provision, container.config.cosmos.offer_throughput()
+                )
+            await cosmos_clients.awarm_up()
+        except Exception as e:
+            logger.warning(f"Cosmos DB warm-up failed: {e}")
+
+    @app.on_event("shutdown")
+    async def close_cosmos_clients():
+        if container.config.conversation.database() == "cosmos":
+            await container.cosmos_clients().aclose()
+
+    @app.on_event("shutdown")
+    def finish_background_jobs():
+        # Waits for the running jobs, e.g. deletions of conversations, to finish.
+        container.background_jobs().shutdown()
+
+    @app.on_event("shutdown")
+    def flush_conversation_write_queue():
+        # Adds the queued exchanges before the conversations snapshot is saved.
+        if container.config.conversation.persistence() == "write_behind":
+            write_queue = container.conversation_write_queue()
+            write_queue.shutdown(timeout=30)
+            logger.info(f"Conversation write queue flushed: {write_queue.stats}")
+
+    @app.on_event("shutdown")
+    def save_conversations_snapshot():
+        if container.config.conversation.database() == "in_memory":
+            container.conversation_database().save_snapshot()
+
     @app.exception_handler(ChatbotError)
     async def chatbot_error_handler(request: Request, exc: ChatbotError):
         return JSONResponse(
@@ -1,12 +1,25 @@
 import weaviate
 from dependency_injector import containers, providers
 from dotenv import load_dotenv
+from langchain.embeddings import OpenAIEmbeddings
 
+from .database_providers.cosmos_clients import CosmosClients
 from .database_providers.cosmos_conversation_database import CosmosConversationDatabase
+from .database_providers.in_memory_conversation_database import InMemoryConversationDatabase
+from .database_providers.local_vector_index import LocalVectorIndex
+from .database_providers.sqlite_conversation_database import SqliteConversationDatabase
 from .services.auth_service import AuthService
 from .services.chatbot_service import ChatbotService
 from .services.conversation_service import ConversationService
-from .utils.relative_path_from_file import relative_path_from_file
+from .utils.answer_cache import AnswerCache
+from .utils.background_jobs import BackgroundJobs
+from .utils.conversation_write_queue import ConversationWriteQueue
+from .utils.embeddings import (
+    CachedEmbeddings,
+    HashingEmbeddings,
+    SentenceTransformerEmbeddings,
+)
+from .utils.relative_path_from_file import relative_path_from_file, resolve_path_from_file
 
 CONFIG_PATH = relative_path_from_file(__file__, "../config.yml")
 
@@ -28,17 +41,70 @@ class Container(containers.DeclarativeContainer):
 
     config.cosmos.key.from_env("COSMOS_KEY")
 
-    conversation_database = providers.Singleton(
-        CosmosConversationDatabase,
+    # The clients and their connections are shared by all requests of a worker.
+    cosmos_clients = providers.Singleton(
+        CosmosClients,
         url=config.cosmos.url,
         key=config.cosmos.key,
         db_name=config.cosmos.db_name,
-        offer_throughput=config.cosmos.offer_throughput,
+        pool_size=config.cosmos.pool_size,
+        preferred_locations=config.cosmos.preferred_locations,
+        connection_verify=config.cosmos.connection_verify,
+    )
+
+    # Also used directly by the scripts that work only with Cosmos DB.
+    cosmos_conversation_database = providers.Singleton(
+        CosmosConversationDatabase,
+        clients=cosmos_clients,
+        delete_concurrency=config.cosmos.delete_concurrency,
+        delete_by_partition_key=config.cosmos.delete_by_partition_key,
+        compact_messages=config.cosmos.compact_messages,
+    )
+
+    conversation_database = providers.Selector(
+        config.conversation.database,
+        cosmos=cosmos_conversation_database,
+        in_memory=providers.Singleton(
+            InMemoryConversationDatabase,
+            max_conversations=config.in_memory.max_conversations,
+            max_age_sec=config.in_memory.max_age_sec,
+            snapshot_path=config.in_memory.snapshot_path,
+            snapshot_interval_sec=config.in_memory.snapshot_interval_sec,
+        ),
+        sqlite=providers.Singleton(
+            SqliteConversationDatabase,
+            path=config.sqlite.path,
+            pool_size=config.sqlite.pool_size,
+        ),
+    )
+
+    background_jobs = providers.Singleton(
+        BackgroundJobs,
+        max_workers=config.background_jobs.max_workers,
+        ttl_sec=config.background_jobs.ttl_sec,
+    )
+
+    conversation_write_queue = providers.Singleton(
+        ConversationWriteQueue,
+        conversation_database=conversation_database,
+        num_workers=config.conversation.write_behind.num_workers,
+        batch_size=config.conversation.write_behind.batch_size,
+        max_pending=config.conversation.write_behind.max_pending,
+        max_retries=config.conversation.write_behind.max_retries,
+        retry_delay_sec=config.conversation.write_behind.retry_delay_sec,
+        stats_log_interval_sec=config.conversation.write_behind.stats_log_interval_sec,
     )
 
     conversation_service = providers.Factory(
         ConversationService,
         conversation_database=conversation_database,
+        chunk_size=config.conversation.stream_chunk_size,
+        background_jobs=background_jobs,
+        write_queue=providers.Selector(
+            config.conversation.persistence,
+            sync=providers.Object(None),
+            write_behind=conversation_write_queue,
+        ),
     )
 
     config.openai.api_key.from_env("APP_OPENAI_API_KEY")
@@ -49,7 +115,14 @@ class Container(containers.DeclarativeContainer):
         api_key=config.weaviate.api_key,
     )
 
-    weaviate_client = providers.Factory(
+    weaviate_connection_config = providers.Factory(
+        weaviate.config.ConnectionConfig,
+        session_pool_connections=config.weaviate.session_pool_connections,
+        session_pool_maxsize=config.weaviate.session_pool_maxsize,
+    )
+
+    # One client per worker so that the keep-alive connections in its pool are reused.
+    weaviate_client = providers.Singleton(
         weaviate.Client,
         url=config.weaviate.url,
         auth_client_secret=auth_client_secret,
@@ -58,11 +131,64 @@ class Container(containers.DeclarativeContainer):
                 "X-OpenAI-Api-Key": config.openai.api_key,
             }
         ),
+        additional_config=providers.Factory(
+            weaviate.Config,
+            connection_config=weaviate_connection_config,
+        ),
+    )
+
+    local_embeddings = providers.Singleton(
+        SentenceTransformerEmbeddings,
+        model_name=config.chatbot.embeddings.model_name,
+        batch_size=config.chatbot.embeddings.batch_size,
+        num_threads=config.chatbot.embeddings.num_threads,
+    )
+
+    hashing_embeddings = providers.Singleton(
+        HashingEmbeddings,
+        dimensions=config.chatbot.embeddings.dimensions,
+    )
+
+    # Embeddings of the questions, searched in the vector index and compared by the answer cache.
+    query_embeddings = providers.Singleton(
+        CachedEmbeddings,
+        embeddings=providers.Selector(
+            config.chatbot.embeddings.type,
+            openai=providers.Singleton(
+                OpenAIEmbeddings,
+                openai_api_key=config.openai.api_key,
+            ),
+            local=local_embeddings,
+            hashing=hashing_embeddings,
+        ),
+        max_size=config.chatbot.embeddings.cache.max_size,
+        path=config.chatbot.embeddings.cache.path,
     )
 
-    chatbot_service = providers.Factory(
+    # None = the documents are vectorized by Weaviate
+    document_embeddings = providers.Selector(
+        config.chatbot.embeddings.type,
+        openai=providers.Object(None),
+        local=query_embeddings,
+        hashing=query_embeddings,
+    )
+
+    answer_cache = providers.Singleton(
+        AnswerCache,
+        max_size=config.chatbot.answer_cache.max_size,
+        ttl_sec=config.chatbot.answer_cache.ttl_sec,
+        similarity_threshold=config.chatbot.answer_cache.similarity_threshold,
+        embeddings=query_embeddings,
+    )
+
+    chatbot_service = providers.Singleton(
         ChatbotService,
-        weaviate_client=weaviate_client,
+        # The client connects when it is created, which is not needed with a local vector index.
+        weaviate_client=providers.Selector(
+            config.chatbot.vector_index.type,
+            weaviate=weaviate_client,
+            local=providers.Object(None),
+        ),
         openai_api_key=config.openai.api_key,
         question_answering_model=config.chatbot.question_answering_model,
         condense_question_model=config.chatbot.condense_question_model,
@@ -71,17 +197,56 @@ class Container(containers.DeclarativeContainer):
         max_history_length=config.chatbot.max_history_length,
         verbose=config.chatbot.verbose,
         temperature=config.chatbot.temperature,
+        max_concurrent_questions=config.chatbot.max_concurrent_questions,
+        filters_cache_ttl_sec=config.chatbot.filters_cache_ttl_sec,
+        filters_cache_path=config.chatbot.filters_cache_path,
+        answer_cache=answer_cache,
+        detect_standalone_questions=config.chatbot.detect_standalone_questions,
+        speculative_retrieval=config.chatbot.speculative_retrieval,
+        ingestion_max_workers=config.chatbot.ingestion_max_workers,
+        # Relative to the repository like the data of fill_vectorstore.py, not to the working directory.
+        index_manifest_path=providers.Callable(
+            resolve_path_from_file, CONFIG_PATH, config.chatbot.index_manifest_path
+        ),
+        class_refresh_sec=config.chatbot.class_versions.refresh_sec,
+        min_object_count_ratio=config.chatbot.class_versions.min_object_count_ratio,
+        validation_questions=config.chatbot.class_versions.validation_questions,
+        embeddings=document_embeddings,
+        embedding_batch_size=config.chatbot.embeddings.batch_size,
+        query_embeddings=query_embeddings,
+        chunk_size=config.chatbot.chunking.chunk_size,
+        chunk_overlap=config.chatbot.chunking.chunk_overlap,
+        chunk_encoding=config.chatbot.chunking.encoding,
+        vector_index=providers.Selector(
+            config.chatbot.vector_index.type,
+            weaviate=providers.Object(None),
+            local=providers.Singleton(
+                LocalVectorIndex,
+                path=providers.Callable(
+                    resolve_path_from_file, CONFIG_PATH, config.chatbot.vector_index.path
+                ),
+                embeddings=document_embeddings,
+                mode=config.chatbot.vector_index.mode,
+                num_lists=config.chatbot.vector_index.num_lists,
+                num_probes=config.chatbot.vector_index.num_probes,
+            ),
+        ),
     )
 
     config.auth.secret_key.from_env("AUTH_SECRET_KEY")
     config.auth.username.from_env("AUTH_USERNAME")
     config.auth.password.from_env("AUTH_PASSWORD")
+    config.auth.hashed_password.from_env("AUTH_HASHED_PASSWORD")
 
-    auth_service = providers.Factory(
+    # The password is hashed when the service is created, which must not happen on every request.
+    auth_service = providers.Singleton(
         AuthService,
         algorithm=config.auth.algorithm,
         access_token_expire_minutes=config.auth.access_token_expire_minutes,
         secret_key=config.auth.secret_key,
         username=config.auth.username,
         password=config.auth.password,
+        hashed_password=config.auth.hashed_password,
+        token_cache_size=config.auth.token_cache_size,
+        token_cache_ttl_sec=config.auth.token_cache_ttl_sec,
     )
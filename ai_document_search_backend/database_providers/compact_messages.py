@@ -0,0 +1,118 @@
+"""
+Compact storage format of the messages.
+
+The documents referred to by the sources (ISIN, shortname and link) are stored only once
+in a shared table and the sources refer to them by id. A message is stored as:
+
+    {"r": "u" | "b", "t": text, "s": [[document id, page, certainty, distance], ...]}
+
+Texts of at least COMPRESSION_MIN_LENGTH characters are compressed with zlib
+and stored in "z" instead of "t" if they get shorter.
+Messages stored in the original format (`Message` fields) are still read.
+"""
+
+import base64
+import hashlib
+import zlib
+from typing import Optional
+
+from pydantic import BaseModel
+
+from ai_document_search_backend.database_providers.conversation_database import Message, Source
+
+COMPRESSION_MIN_LENGTH = 1000
+
+ROLES = {"user": "u", "bot": "b"}
+ROLES_BY_CODE = {code: role for role, code in ROLES.items()}
+
+
+class SourceDocument(BaseModel):
+    id: str
+    isin: str
+    shortname: str
+    link: str
+
+
+def get_source_document_id(isin: str, shortname: str, link: str) -> str:
+    key = "\n".join([isin, shortname, link])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def get_source_document(source: Source) -> SourceDocument:
+    return SourceDocument(
+        id=get_source_document_id(source.isin, source.shortname, source.link),
+        isin=source.isin,
+        shortname=source.shortname,
+        link=source.link,
+    )
+
+
+def compress_text(text: str) -> Optional[bytes]:
+    """Compressed text, None if it is too short or compression does not make it shorter"""
+
+    if len(text) < COMPRESSION_MIN_LENGTH:
+        return None
+    compressed = zlib.compress(text.encode())
+    return compressed if len(compressed) < len(text.encode()) else None
+
+
+def decompress_text(compressed: bytes) -> str:
+    return zlib.decompress(compressed).decode()
+
+
+def encode_message(message: Message) -> dict:
+    data: dict = {"r": ROLES[message.role]}
+    compressed = compress_text(message.text)
+    if compressed is None:
+        data["t"] = message.text
+    else:
+        data["z"] = base64.b64encode(compressed).decode()
+    if message.sources is not None:
+        data["s"] = [
+            [get_source_document(source).id, source.page, source.certainty, source.distance]
+            for source in message.sources
+        ]
+    return data
+
+
+def get_source_documents(messages: list[Message]) -> list[SourceDocument]:
+    """Documents referred to by the sources of the messages, without duplicates"""
+
+    documents = {}
+    for message in messages:
+        for source in message.sources or []:
+            document = get_source_document(source)
+            documents[document.id] = document
+    return list(documents.values())
+
+
+def is_compact(data: dict) -> bool:
+    return "r" in data
+
+
+def get_document_ids(data: dict) -> set[str]:
+    if not is_compact(data):
+        return set()
+    return {document_id for document_id, *_ in data.get("s", [])}
+
+
+def decode_message(data: dict, documents: dict[str, SourceDocument]) -> Message:
+    """Message from its compact or original format, documents are looked up by id"""
+
+    if not is_compact(data):
+        return Message.model_validate(data)
+    text = data["t"] if "t" in data else decompress_text(base64.b64decode(data["z"]))
+    sources = None
+    if "s" in data:
+        sources = [
+            Source(
+                isin=documents[document_id].isin,
+                shortname=documents[document_id].shortname,
+                link=documents[document_id].link,
+                page=page,
+                certainty=certainty,
+                distance=distance,
+            )
+            for document_id, page, certainty, distance in data["s"]
+        ]
+    return Message(role=ROLES_BY_CODE[data["r"]], text=text, sources=sources)
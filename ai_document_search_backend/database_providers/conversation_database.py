@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Optional, Literal
 
@@ -24,21 +25,145 @@ class Conversation(BaseModel):
     messages: list[Message]
 
 
+class ConversationWindow(BaseModel):
+    """A continuous part of the messages of a conversation"""
+
+    id: str
+    created_at: str
+    messages: list[Message]
+    # index of the first message of the window in the whole conversation
+    start: int
+    # number of messages in the whole conversation
+    total_messages: int
+
+
+class ConversationNotFoundError(ValueError):
+    """The conversation does not exist, e.g. it was deleted"""
+
+
 class ConversationDatabase(ABC):
     @abstractmethod
-    def get_latest_conversation(self, username: str) -> Optional[Conversation]:
+    def get_latest_conversation_id(self, username: str) -> Optional[str]:
         raise NotImplementedError
 
     @abstractmethod
-    def add_conversation(self, username: str, conversation: Conversation) -> None:
+    def get_conversation(self, username: str, conversation_id: str) -> Optional[Conversation]:
         raise NotImplementedError
 
     @abstractmethod
-    def add_to_latest_conversation(
-        self, username: str, user_message: Message, bot_message: Message
+    def add_conversation(self, username: str, conversation: Conversation) -> str:
+        """Add the conversation and return its id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
     ) -> None:
         raise NotImplementedError
 
     @abstractmethod
     def clear_conversations(self, username: str) -> None:
         raise NotImplementedError
+
+    def get_conversation_window(
+        self,
+        username: str,
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> Optional[ConversationWindow]:
+        """
+        Get at most max_messages last messages of the conversation that precede the message
+        with index before, all of them if max_messages is None.
+        Providers that can select the messages in the database should override this method.
+        """
+
+        conversation = self.get_conversation(username, conversation_id)
+        if conversation is None:
+            return None
+        total_messages = len(conversation.messages)
+        end = total_messages if before is None else min(before, total_messages)
+        start = 0 if max_messages is None else max(end - max_messages, 0)
+        return ConversationWindow(
+            id=conversation_id,
+            created_at=conversation.created_at,
+            messages=conversation.messages[start:end],
+            start=start,
+            total_messages=total_messages,
+        )
+
+    def add_exchanges_to_conversation(
+        self,
+        username: str,
+        conversation_id: str,
+        exchanges: list[tuple[Message, Message]],
+        write_id: Optional[str] = None,
+    ) -> None:
+        """
+        Add several (user message, bot message) exchanges to the conversation, in order.
+        Providers that can add them in a single write should override this method.
+        Providers that add them in several writes skip the writes already done by an earlier call
+        with the same write_id, so that a failed call can be retried without duplicating messages.
+        """
+
+        for user_message, bot_message in exchanges:
+            self.add_to_conversation(username, conversation_id, user_message, bot_message)
+
+    def get_latest_conversation(self, username: str) -> Optional[Conversation]:
+        conversation_id = self.get_latest_conversation_id(username)
+        if conversation_id is None:
+            return None
+        return self.get_conversation(username, conversation_id)
+
+    def add_to_latest_conversation(
+        self, username: str, user_message: Message, bot_message: Message
+    ) -> None:
+        conversation_id = self.get_latest_conversation_id(username)
+        if conversation_id is None:
+            raise ConversationNotFoundError(f"No conversation found for user {username}")
+        self.add_to_conversation(username, conversation_id, user_message, bot_message)
+
+    # The asynchronous variants run the synchronous methods in a worker thread by default.
+    # Providers with a native asynchronous client can override them.
+
+    async def aget_latest_conversation_id(self, username: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get_latest_conversation_id, username)
+
+    async def aget_conversation(
+        self, username: str, conversation_id: str
+    ) -> Optional[Conversation]:
+        return await asyncio.to_thread(self.get_conversation, username, conversation_id)
+
+    async def aget_conversation_window(
+        self,
+        username: str,
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> Optional[ConversationWindow]:
+        return await asyncio.to_thread(
+            self.get_conversation_window, username, conversation_id, max_messages, before
+        )
+
+    async def aget_latest_conversation(self, username: str) -> Optional[Conversation]:
+        return await asyncio.to_thread(self.get_latest_conversation, username)
+
+    async def aadd_conversation(self, username: str, conversation: Conversation) -> str:
+        return await asyncio.to_thread(self.add_conversation, username, conversation)
+
+    async def aadd_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> None:
+        await asyncio.to_thread(
+            self.add_to_conversation, username, conversation_id, user_message, bot_message
+        )
+
+    async def aadd_to_latest_conversation(
+        self, username: str, user_message: Message, bot_message: Message
+    ) -> None:
+        await asyncio.to_thread(
+            self.add_to_latest_conversation, username, user_message, bot_message
+        )
+
+    async def aclear_conversations(self, username: str) -> None:
+        await asyncio.to_thread(self.clear_conversations, username)
@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import weakref
+from typing import Optional
+
+import aiohttp
+import requests
+from azure.core.pipeline.transport import AioHttpTransport, RequestsTransport
+from azure.cosmos import ContainerProxy, CosmosClient, PartitionKey
+from azure.cosmos.aio import ContainerProxy as AsyncContainerProxy
+from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+CONTAINER_NAME = "Conversations"
+
+
+class CosmosClients:
+    """
+    Cosmos DB clients shared by the whole process: one synchronous client,
+    and one asynchronous client per event loop, because the asynchronous connections
+    cannot be used from another event loop.
+
+    The clients are created when they are first used, which reads the database account,
+    so awarm_up should be called at startup to avoid slowing down the first request.
+    The database and the container are created by provision, which is called at startup
+    or by scripts/provision_cosmos.py, instead of when the conversation database is created.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        db_name: str,
+        pool_size: int = 100,
+        preferred_locations: Optional[list[str]] = None,
+        connection_verify: bool = True,
+    ):
+        self.url = url
+        self.key = key
+        self.db_name = db_name
+        self.pool_size = pool_size
+        self.client_kwargs = dict(
+            # Requests are sent to the first available region of the list.
+            preferred_locations=preferred_locations or [],
+            # The certificate of the local emulator is self-signed.
+            connection_verify=connection_verify,
+        )
+
+        self.__client: Optional[CosmosClient] = None
+        self.__async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Task[AsyncCosmosClient]
+        ] = weakref.WeakKeyDictionary()
+        self.__lock = threading.Lock()
+
+    def get_container(self) -> ContainerProxy:
+        with self.__lock:
+            if self.__client is None:
+                self.__client = CosmosClient(
+                    url=self.url,
+                    credential=self.key,
+                    transport=RequestsTransport(session=self.__create_session()),
+                    **self.client_kwargs,
+                )
+        return self.__client.get_database_client(self.db_name).get_container_client(CONTAINER_NAME)
+
+    async def aget_container(self) -> AsyncContainerProxy:
+        """Container of the client of the running event loop"""
+
+        loop = asyncio.get_running_loop()
+        # Concurrent requests wait for the same client to be created.
+        task = self.__async_clients.get(loop)
+        if task is None:
+            task = loop.create_task(self.__create_async_client())
+            self.__async_clients[loop] = task
+        try:
+            client = await task
+        except Exception:
+            self.__async_clients.pop(loop, None)
+            raise
+        return client.get_database_client(self.db_name).get_container_client(CONTAINER_NAME)
+
+    def provision(self, offer_throughput: int) -> None:
+        """Create the database and the container if they do not exist yet"""
+
+        self.get_container()
+        database = self.__client.create_database_if_not_exists(id=self.db_name)
+        database.create_container_if_not_exists(
+            id=CONTAINER_NAME,
+            partition_key=PartitionKey(path="/username"),
+            offer_throughput=offer_throughput,
+        )
+
+    async def awarm_up(self) -> None:
+        """Create the clients and read the container before the first request"""
+
+        await asyncio.to_thread(lambda: self.get_container().read())
+        await (await self.aget_container()).read()
+
+    async def aclose(self) -> None:
+        task = self.__async_clients.pop(asyncio.get_running_loop(), None)
+        if task is not None and task.done() and task.exception() is None:
+            await task.result().close()
+
+    async def __create_async_client(self) -> AsyncCosmosClient:
+        # The session is bound to the running event loop.
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size), trust_env=True
+        )
+        client = AsyncCosmosClient(
+            url=self.url,
+            credential=self.key,
+            transport=AioHttpTransport(session=session, session_owner=True),
+            **self.client_kwargs,
+        )
+        # Opens the session and reads the database account.
+        try:
+            await client.__aenter__()
+        except Exception:
+            await client.close()
+            raise
+        return client
+
+    def __create_session(self) -> requests.Session:
+        session = requests.Session()
+        # The retries are done by the Cosmos DB client.
+        adapter = HTTPAdapter(
+            pool_maxsize=self.pool_size,
+            max_retries=Retry(total=False, redirect=False, raise_on_status=False),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
@@ -1,80 +1,623 @@
+import asyncio
 import uuid
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, Optional
 
-from azure.cosmos import CosmosClient, PartitionKey
+from azure.core import MatchConditions
+from azure.cosmos import ContainerProxy
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 
+from ai_document_search_backend.database_providers.compact_messages import (
+    SourceDocument,
+    decode_message,
+    encode_message,
+    get_document_ids,
+    get_source_documents,
+    is_compact,
+)
+from ai_document_search_backend.database_providers.cosmos_clients import CosmosClients
 from ai_document_search_backend.database_providers.conversation_database import (
     ConversationDatabase,
+    ConversationNotFoundError,
     Conversation,
+    ConversationWindow,
     Message,
 )
+from ai_document_search_backend.utils.lru_cache import LRUCache
+
+# id of the document in each user's partition that points to the latest conversation
+LATEST_POINTER_ID = "latest"
+MAX_POINTER_UPDATE_ATTEMPTS = 10
+MAX_PATCH_OPERATIONS = 10
+# partition of the documents referred to by the sources of the messages in the compact format
+SOURCE_DOCUMENTS_PARTITION = "#source_documents"
+# the partitions with the prefix are reserved for other documents, e.g. the source documents
+RESERVED_USERNAME_PREFIX = "#"
+MAX_COMPACTION_ATTEMPTS = 10
+
+SELECT_LATEST_CONVERSATION = "SELECT c.id, c.created_at FROM conversation c WHERE c.username = @username AND IS_DEFINED(c.messages) ORDER BY c.created_at DESC OFFSET 0 LIMIT 1"
+SELECT_WINDOW = "SELECT c.id, c.created_at, {messages} AS messages, ARRAY_LENGTH(c.messages) AS total_messages FROM conversation c WHERE c.id = @id"
+SELECT_ITEM_IDS = "SELECT VALUE c.id FROM conversation c WHERE c.username = @username"
+SELECT_SOURCE_DOCUMENTS = (
+    "SELECT c.id, c.isin, c.shortname, c.link FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+)
+SELECT_CONVERSATIONS_TO_COMPACT = "SELECT c.id, c.username FROM conversation c WHERE IS_DEFINED(c.messages) AND EXISTS(SELECT VALUE m FROM m IN c.messages WHERE NOT IS_DEFINED(m.r))"
+
+
+def check_username(username: str) -> None:
+    if username.startswith(RESERVED_USERNAME_PREFIX):
+        raise ValueError(f"Usernames starting with {RESERVED_USERNAME_PREFIX} are reserved")
+
+
+def get_not_written_predicate(write_id: str, part: int) -> str:
+    """
+    Condition of a patch that was not applied yet: the part of the write and the parts after it.
+    The write ids are generated, they do not contain quotes.
+    """
+
+    return (
+        "FROM c WHERE NOT IS_DEFINED(c.last_write) "
+        f"OR c.last_write.id != '{write_id}' OR c.last_write.part < {part}"
+    )
 
 
 class DBConversation(BaseModel):
     id: str
     username: str
     created_at: str
-    messages: list[Message]
+    # in the compact format, see compact_messages.py
+    messages: list[dict]
+
+
+class DBLatestPointer(BaseModel):
+    id: str
+    username: str
+    conversation_id: str
+    created_at: str
+
+
+async def get_first_item(items: AsyncIterable[dict]) -> Optional[dict]:
+    async for item in items:
+        return item
+    return None
 
 
 class CosmosConversationDatabase(ConversationDatabase):
-    def __init__(self, url: str, key: str, db_name: str, offer_throughput: int):
-        self.client = CosmosClient(url=url, credential=key)
-        self.database = self.client.create_database_if_not_exists(id=db_name)
-        self.conversations = self.database.create_container_if_not_exists(
-            id="Conversations",
-            partition_key=PartitionKey(path="/username"),
-            offer_throughput=offer_throughput,
-        )
+    """
+    Stores the conversations in Cosmos DB.
+    The asynchronous methods use the asynchronous client instead of worker threads.
+    """
+
+    def __init__(
+        self,
+        clients: CosmosClients,
+        delete_concurrency: int = 10,
+        delete_by_partition_key: bool = False,
+        compact_messages: bool = True,
+    ):
+        self.delete_concurrency = delete_concurrency
+        self.delete_by_partition_key = delete_by_partition_key
+        # Messages are always read in both formats, so the compact format can be turned off
+        # while older versions of the server that cannot read it are still running.
+        self.compact_messages = compact_messages
+        self.source_documents: LRUCache[SourceDocument] = LRUCache(max_size=10000)
+        # The database and the container are created by CosmosClients.provision.
+        self.clients = clients
 
         super().__init__()
 
-    def get_latest_conversation(self, username: str) -> Optional[Conversation]:
-        db_conversation = self.__get_latest_db_conversation(username)
+    @property
+    def conversations(self) -> ContainerProxy:
+        return self.clients.get_container()
+
+    def get_latest_conversation_id(self, username: str) -> Optional[str]:
+        check_username(username)
+        try:
+            pointer = self.conversations.read_item(item=LATEST_POINTER_ID, partition_key=username)
+            return pointer["conversation_id"]
+        except CosmosResourceNotFoundError:
+            pass
+
+        # Conversations stored before the pointer was introduced are found by a query.
+        db_conversation = self.__query_latest_conversation(username)
         if db_conversation is None:
             return None
+        self.__update_latest_pointer(username, db_conversation["id"], db_conversation["created_at"])
+        return db_conversation["id"]
+
+    def get_conversation(self, username: str, conversation_id: str) -> Optional[Conversation]:
+        check_username(username)
+        try:
+            db_conversation = self.conversations.read_item(
+                item=conversation_id, partition_key=username
+            )
+        except CosmosResourceNotFoundError:
+            return None
         return Conversation(
-            created_at=db_conversation["created_at"], messages=db_conversation["messages"]
+            created_at=db_conversation["created_at"],
+            messages=self.__decode_messages(db_conversation["messages"]),
         )
 
-    def add_conversation(self, username: str, conversation: Conversation) -> None:
-        new_conversation = {
-            "id": str(uuid.uuid4()),
-            "username": username,
-            "created_at": conversation.created_at,
-            "messages": jsonable_encoder(conversation.messages),
-        }
-        self.conversations.create_item(new_conversation)
+    def get_conversation_window(
+        self,
+        username: str,
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> Optional[ConversationWindow]:
+        check_username(username)
+        query, params = self.__get_window_query(conversation_id, max_messages, before)
+        db_windows = self.conversations.query_items(
+            query=query, parameters=params, partition_key=username
+        )
+        db_window = next(db_windows, None)
+        if db_window is None:
+            return None
+        if before is not None and before > db_window["total_messages"]:
+            # The slice must end at the last message, like in the other providers.
+            return self.get_conversation_window(
+                username, conversation_id, max_messages, db_window["total_messages"]
+            )
+        return self.__to_window(
+            db_window, self.__decode_messages(db_window["messages"]), max_messages, before
+        )
 
-    def add_to_latest_conversation(
-        self, username: str, user_message: Message, bot_message: Message
-    ) -> None:
-        db_conversation = self.__get_latest_db_conversation(username)
-        if db_conversation is None:
-            raise ValueError(f"No conversation found for user {username}")
+    def add_conversation(self, username: str, conversation: Conversation) -> str:
+        check_username(username)
+        new_conversation = DBConversation(
+            id=str(uuid.uuid4()),
+            username=username,
+            created_at=conversation.created_at,
+            messages=self.__encode_messages(conversation.messages),
+        )
+        self.conversations.create_item(new_conversation.model_dump())
+        self.__update_latest_pointer(username, new_conversation.id, conversation.created_at)
+        return new_conversation.id
 
-        db_conversation["messages"].append(jsonable_encoder(user_message))
-        db_conversation["messages"].append(jsonable_encoder(bot_message))
+    def add_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> None:
+        # The messages are appended by Cosmos DB in a single atomic patch, so the cost does not
+        # depend on the length of the conversation and concurrent appends do not overwrite each other.
+        self.add_exchanges_to_conversation(username, conversation_id, [(user_message, bot_message)])
 
-        self.conversations.replace_item(item=db_conversation["id"], body=db_conversation)
+    def add_exchanges_to_conversation(
+        self,
+        username: str,
+        conversation_id: str,
+        exchanges: list[tuple[Message, Message]],
+        write_id: Optional[str] = None,
+    ) -> None:
+        check_username(username)
+        # A patch can contain at most 10 operations, i.e. 4 exchanges and the write id.
+        exchanges_per_patch = (MAX_PATCH_OPERATIONS - 1) // 2
+        for i in range(0, len(exchanges), exchanges_per_patch):
+            messages = [
+                message
+                for exchange in exchanges[i : i + exchanges_per_patch]
+                for message in exchange
+            ]
+            patch_operations = [
+                {"op": "add", "path": "/messages/-", "value": value}
+                for value in self.__encode_messages(messages)
+            ]
+            kwargs = {}
+            if write_id is not None:
+                # Each patch is applied at most once, also when it is retried after a timeout.
+                # The writes of a conversation are not concurrent, so the last one is enough.
+                patch_operations.append(
+                    {"op": "set", "path": "/last_write", "value": {"id": write_id, "part": i}}
+                )
+                kwargs["filter_predicate"] = get_not_written_predicate(write_id, i)
+            try:
+                self.conversations.patch_item(
+                    item=conversation_id,
+                    partition_key=username,
+                    patch_operations=patch_operations,
+                    **kwargs,
+                )
+            except CosmosResourceNotFoundError:
+                raise ConversationNotFoundError(
+                    f"No conversation {conversation_id} found for user {username}"
+                )
+            except CosmosAccessConditionFailedError:
+                # The patch was already applied by an earlier attempt.
+                pass
 
     def clear_conversations(self, username: str) -> None:
-        query = "SELECT * FROM conversation c WHERE c.username = @username"
+        check_username(username)
+        if self.delete_by_partition_key:
+            self.conversations.delete_all_items_by_partition_key(username)
+            return
+
+        # Only the ids are read, the documents are then deleted in parallel.
         params = [dict(name="@username", value=username)]
-        conversations = self.conversations.query_items(
-            query=query, parameters=params, enable_cross_partition_query=False
+        conversation_ids = list(
+            self.conversations.query_items(
+                query=SELECT_ITEM_IDS, parameters=params, partition_key=username
+            )
         )
-        for conversation in conversations:
-            conversation_id = conversation["id"]
-            self.conversations.delete_item(item=conversation_id, partition_key=username)
+        with ThreadPoolExecutor(max_workers=self.delete_concurrency) as executor:
+            for future in [
+                executor.submit(self.__delete_item, username, conversation_id)
+                for conversation_id in conversation_ids
+            ]:
+                future.result()
+
+    async def aget_latest_conversation_id(self, username: str) -> Optional[str]:
+        check_username(username)
+        conversations = await self.clients.aget_container()
+        try:
+            pointer = await conversations.read_item(item=LATEST_POINTER_ID, partition_key=username)
+            return pointer["conversation_id"]
+        except CosmosResourceNotFoundError:
+            pass
 
-    def __get_latest_db_conversation(self, username: str) -> Optional[DBConversation]:
-        query = "SELECT * FROM conversation c WHERE c.username = @username ORDER BY c.created_at DESC OFFSET 0 LIMIT 1"
         params = [dict(name="@username", value=username)]
+        db_conversations = conversations.query_items(
+            query=SELECT_LATEST_CONVERSATION, parameters=params, partition_key=username
+        )
+        db_conversation = await get_first_item(db_conversations)
+        if db_conversation is None:
+            return None
+        await self.__aupdate_latest_pointer(
+            username, db_conversation["id"], db_conversation["created_at"]
+        )
+        return db_conversation["id"]
 
+    async def aget_conversation(
+        self, username: str, conversation_id: str
+    ) -> Optional[Conversation]:
+        check_username(username)
+        conversations = await self.clients.aget_container()
+        try:
+            db_conversation = await conversations.read_item(
+                item=conversation_id, partition_key=username
+            )
+        except CosmosResourceNotFoundError:
+            return None
+        return Conversation(
+            created_at=db_conversation["created_at"],
+            messages=await self.__adecode_messages(db_conversation["messages"]),
+        )
+
+    async def aget_conversation_window(
+        self,
+        username: str,
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> Optional[ConversationWindow]:
+        check_username(username)
+        conversations = await self.clients.aget_container()
+        query, params = self.__get_window_query(conversation_id, max_messages, before)
+        db_windows = conversations.query_items(
+            query=query, parameters=params, partition_key=username
+        )
+        db_window = await get_first_item(db_windows)
+        if db_window is None:
+            return None
+        if before is not None and before > db_window["total_messages"]:
+            # The slice must end at the last message, like in the other providers.
+            return await self.aget_conversation_window(
+                username, conversation_id, max_messages, db_window["total_messages"]
+            )
+        messages = await self.__adecode_messages(db_window["messages"])
+        return self.__to_window(db_window, messages, max_messages, before)
+
+    async def aget_latest_conversation(self, username: str) -> Optional[Conversation]:
+        conversation_id = await self.aget_latest_conversation_id(username)
+        if conversation_id is None:
+            return None
+        return await self.aget_conversation(username, conversation_id)
+
+    async def aadd_conversation(self, username: str, conversation: Conversation) -> str:
+        check_username(username)
+        conversations = await self.clients.aget_container()
+        new_conversation = DBConversation(
+            id=str(uuid.uuid4()),
+            username=username,
+            created_at=conversation.created_at,
+            messages=await self.__aencode_messages(conversation.messages),
+        )
+        await conversations.create_item(new_conversation.model_dump())
+        await self.__aupdate_latest_pointer(username, new_conversation.id, conversation.created_at)
+        return new_conversation.id
+
+    async def aadd_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> None:
+        check_username(username)
+        conversations = await self.clients.aget_container()
+        patch_operations = [
+            {"op": "add", "path": "/messages/-", "value": value}
+            for value in await self.__aencode_messages([user_message, bot_message])
+        ]
+        try:
+            await conversations.patch_item(
+                item=conversation_id,
+                partition_key=username,
+                patch_operations=patch_operations,
+            )
+        except CosmosResourceNotFoundError:
+            raise ConversationNotFoundError(
+                f"No conversation {conversation_id} found for user {username}"
+            )
+
+    async def aadd_to_latest_conversation(
+        self, username: str, user_message: Message, bot_message: Message
+    ) -> None:
+        conversation_id = await self.aget_latest_conversation_id(username)
+        if conversation_id is None:
+            raise ConversationNotFoundError(f"No conversation found for user {username}")
+        await self.aadd_to_conversation(username, conversation_id, user_message, bot_message)
+
+    async def aclear_conversations(self, username: str) -> None:
+        check_username(username)
+        if self.delete_by_partition_key:
+            await asyncio.to_thread(self.clear_conversations, username)
+            return
+
+        conversations = await self.clients.aget_container()
+        params = [dict(name="@username", value=username)]
+        item_ids = [
+            item_id
+            async for item_id in conversations.query_items(
+                query=SELECT_ITEM_IDS, parameters=params, partition_key=username
+            )
+        ]
+        semaphore = asyncio.Semaphore(self.delete_concurrency)
+
+        async def delete_item(item_id: str) -> None:
+            async with semaphore:
+                try:
+                    await conversations.delete_item(item=item_id, partition_key=username)
+                except CosmosResourceNotFoundError:
+                    pass
+
+        await asyncio.gather(*[delete_item(item_id) for item_id in item_ids])
+
+    def compact_conversations(self) -> int:
+        """
+        Rewrite the conversations of all users that contain messages in the original format
+        to the compact format and return their number.
+        """
+
+        db_conversations = list(
+            self.conversations.query_items(
+                query=SELECT_CONVERSATIONS_TO_COMPACT, enable_cross_partition_query=True
+            )
+        )
+        for db_conversation in db_conversations:
+            self.__compact_conversation(db_conversation["username"], db_conversation["id"])
+        return len(db_conversations)
+
+    def __compact_conversation(self, username: str, conversation_id: str) -> None:
+        # The conversation is replaced only if no messages were added since it was read.
+        for _ in range(MAX_COMPACTION_ATTEMPTS):
+            try:
+                db_conversation = self.conversations.read_item(
+                    item=conversation_id, partition_key=username
+                )
+            except CosmosResourceNotFoundError:
+                return
+            if all(is_compact(message) for message in db_conversation["messages"]):
+                return
+            messages = self.__decode_messages(db_conversation["messages"])
+            db_conversation["messages"] = [encode_message(message) for message in messages]
+            self.__save_source_documents(messages)
+            try:
+                self.conversations.replace_item(
+                    item=conversation_id,
+                    body=db_conversation,
+                    etag=db_conversation["_etag"],
+                    match_condition=MatchConditions.IfNotModified,
+                )
+                return
+            except (CosmosAccessConditionFailedError, CosmosResourceNotFoundError):
+                continue
+        raise RuntimeError(f"Could not compact conversation {conversation_id} of user {username}")
+
+    def __encode_messages(self, messages: list[Message]) -> list[dict]:
+        if not self.compact_messages:
+            return jsonable_encoder(messages)
+        # The documents are saved first, so that the sources never refer to a missing document.
+        self.__save_source_documents(messages)
+        return [encode_message(message) for message in messages]
+
+    def __decode_messages(self, db_messages: list[dict]) -> list[Message]:
+        document_ids = set().union(*[get_document_ids(message) for message in db_messages])
+        documents = self.__load_source_documents(document_ids)
+        return [decode_message(message, documents) for message in db_messages]
+
+    def __save_source_documents(self, messages: list[Message]) -> None:
+        for document in get_source_documents(messages):
+            if self.source_documents.get(document.id) is None:
+                self.conversations.upsert_item(
+                    {**document.model_dump(), "username": SOURCE_DOCUMENTS_PARTITION}
+                )
+                self.source_documents.set(document.id, document)
+
+    def __load_source_documents(self, document_ids: set[str]) -> dict[str, SourceDocument]:
+        documents = {}
+        for document_id in document_ids:
+            document = self.source_documents.get(document_id)
+            if document is not None:
+                documents[document_id] = document
+        missing_ids = list(document_ids - documents.keys())
+        if missing_ids:
+            params = [dict(name="@ids", value=missing_ids)]
+            for db_document in self.conversations.query_items(
+                query=SELECT_SOURCE_DOCUMENTS,
+                parameters=params,
+                partition_key=SOURCE_DOCUMENTS_PARTITION,
+            ):
+                document = SourceDocument.model_validate(db_document)
+                self.source_documents.set(document.id, document)
+                documents[document.id] = document
+        return documents
+
+    def __query_latest_conversation(self, username: str) -> Optional[dict]:
+        params = [dict(name="@username", value=username)]
         db_conversations = self.conversations.query_items(
-            query=query, parameters=params, enable_cross_partition_query=False
+            query=SELECT_LATEST_CONVERSATION, parameters=params, partition_key=username
         )
         return next(db_conversations, None)
+
+    def __update_latest_pointer(self, username: str, conversation_id: str, created_at: str) -> None:
+        """Point to the conversation, unless the pointer already points to a later one"""
+
+        new_pointer = self.__get_new_pointer(username, conversation_id, created_at)
+        # The pointer is replaced only if nobody changed it since it was read.
+        for _ in range(MAX_POINTER_UPDATE_ATTEMPTS):
+            try:
+                pointer = self.conversations.read_item(
+                    item=LATEST_POINTER_ID, partition_key=username
+                )
+            except CosmosResourceNotFoundError:
+                try:
+                    self.conversations.create_item(new_pointer)
+                    return
+                except CosmosResourceExistsError:
+                    continue
+            if pointer["created_at"] > created_at:
+                return
+            try:
+                self.conversations.replace_item(
+                    item=LATEST_POINTER_ID,
+                    body=new_pointer,
+                    etag=pointer["_etag"],
+                    match_condition=MatchConditions.IfNotModified,
+                )
+                return
+            except (CosmosAccessConditionFailedError, CosmosResourceNotFoundError):
+                continue
+        raise RuntimeError(f"Could not update the latest conversation of user {username}")
+
+    async def __aencode_messages(self, messages: list[Message]) -> list[dict]:
+        if not self.compact_messages:
+            return jsonable_encoder(messages)
+        conversations = await self.clients.aget_container()
+        for document in get_source_documents(messages):
+            if self.source_documents.get(document.id) is None:
+                await conversations.upsert_item(
+                    {**document.model_dump(), "username": SOURCE_DOCUMENTS_PARTITION}
+                )
+                self.source_documents.set(document.id, document)
+        return [encode_message(message) for message in messages]
+
+    async def __adecode_messages(self, db_messages: list[dict]) -> list[Message]:
+        document_ids = set().union(*[get_document_ids(message) for message in db_messages])
+        documents = {}
+        for document_id in document_ids:
+            document = self.source_documents.get(document_id)
+            if document is not None:
+                documents[document_id] = document
+        missing_ids = list(document_ids - documents.keys())
+        if missing_ids:
+            conversations = await self.clients.aget_container()
+            params = [dict(name="@ids", value=missing_ids)]
+            async for db_document in conversations.query_items(
+                query=SELECT_SOURCE_DOCUMENTS,
+                parameters=params,
+                partition_key=SOURCE_DOCUMENTS_PARTITION,
+            ):
+                document = SourceDocument.model_validate(db_document)
+                self.source_documents.set(document.id, document)
+                documents[document.id] = document
+        return [decode_message(message, documents) for message in db_messages]
+
+    async def __aupdate_latest_pointer(
+        self, username: str, conversation_id: str, created_at: str
+    ) -> None:
+        conversations = await self.clients.aget_container()
+        new_pointer = self.__get_new_pointer(username, conversation_id, created_at)
+        for _ in range(MAX_POINTER_UPDATE_ATTEMPTS):
+            try:
+                pointer = await conversations.read_item(
+                    item=LATEST_POINTER_ID, partition_key=username
+                )
+            except CosmosResourceNotFoundError:
+                try:
+                    await conversations.create_item(new_pointer)
+                    return
+                except CosmosResourceExistsError:
+                    continue
+            if pointer["created_at"] > created_at:
+                return
+            try:
+                await conversations.replace_item(
+                    item=LATEST_POINTER_ID,
+                    body=new_pointer,
+                    etag=pointer["_etag"],
+                    match_condition=MatchConditions.IfNotModified,
+                )
+                return
+            except (CosmosAccessConditionFailedError, CosmosResourceNotFoundError):
+                continue
+        raise RuntimeError(f"Could not update the latest conversation of user {username}")
+
+    @staticmethod
+    def __get_window_query(
+        conversation_id: str, max_messages: Optional[int], before: Optional[int]
+    ) -> tuple[str, list[dict]]:
+        # Only the messages of the window are read from the document.
+        if before is not None:
+            start = 0 if max_messages is None else max(before - max_messages, 0)
+            messages = "ARRAY_SLICE(c.messages, @start, @length)"
+            params = [
+                dict(name="@start", value=start),
+                dict(name="@length", value=before - start),
+            ]
+        elif max_messages is None:
+            messages = "c.messages"
+            params = []
+        elif max_messages == 0:
+            messages = "ARRAY_SLICE(c.messages, 0, 0)"
+            params = []
+        else:
+            messages = "ARRAY_SLICE(c.messages, -@max_messages)"
+            params = [dict(name="@max_messages", value=max_messages)]
+        params.append(dict(name="@id", value=conversation_id))
+        return SELECT_WINDOW.format(messages=messages), params
+
+    @staticmethod
+    def __to_window(
+        db_window: dict,
+        messages: list[Message],
+        max_messages: Optional[int],
+        before: Optional[int],
+    ) -> ConversationWindow:
+        total_messages = db_window["total_messages"]
+        if before is None:
+            start = total_messages - len(messages)
+        else:
+            start = 0 if max_messages is None else max(before - max_messages, 0)
+        return ConversationWindow(
+            id=db_window["id"],
+            created_at=db_window["created_at"],
+            messages=messages,
+            start=min(start, total_messages),
+            total_messages=total_messages,
+        )
+
+    @staticmethod
+    def __get_new_pointer(username: str, conversation_id: str, created_at: str) -> dict:
+        return DBLatestPointer(
+            id=LATEST_POINTER_ID,
+            username=username,
+            conversation_id=conversation_id,
+            created_at=created_at,
+        ).model_dump()
+
+    def __delete_item(self, username: str, item_id: str) -> None:
+        try:
+            self.conversations.delete_item(item=item_id, partition_key=username)
+        except CosmosResourceNotFoundError:
+            pass
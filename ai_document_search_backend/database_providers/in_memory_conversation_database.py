@@ -1,35 +1,222 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
 from typing import Optional
 
+from pydantic import BaseModel
+
 from ai_document_search_backend.database_providers.conversation_database import (
     ConversationDatabase,
+    ConversationNotFoundError,
     Conversation,
+    ConversationWindow,
     Message,
 )
 
 
+class InMemorySnapshot(BaseModel):
+    # username -> conversation id -> conversation
+    conversations: dict[str, dict[str, Conversation]]
+
+
 class InMemoryConversationDatabase(ConversationDatabase):
-    def __init__(self):
-        self.db: dict[str, list[Conversation]] = {}
+    """
+    Thread-safe database keeping the conversations in the memory of the process.
+
+    The id of the latest conversation of each user is kept up to date, so it is found in O(1).
+    Conversations that were not changed for max_age_sec seconds, and the least recently changed
+    conversations above max_conversations, are evicted.
+    If snapshot_path is set, the conversations are loaded from the file on start
+    and saved to it at most every snapshot_interval_sec seconds when they change.
+    """
+
+    def __init__(
+        self,
+        max_conversations: Optional[int] = None,
+        max_age_sec: Optional[float] = None,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval_sec: float = 60,
+    ):
+        self.max_conversations = max_conversations
+        self.max_age_sec = max_age_sec
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval_sec = snapshot_interval_sec
+        self.logger = logging.getLogger(__name__)
+
+        self.db: dict[str, dict[str, Conversation]] = {}
+        self.latest_ids: dict[str, str] = {}
+        # (username, conversation id) -> time of the last change, from the least recently changed
+        self.changed_at: OrderedDict[tuple[str, str], float] = OrderedDict()
+
+        self.__lock = threading.RLock()
+        self.__snapshot_lock = threading.Lock()
+        self.__snapshot_saved_at = time.time()
+        self.__load_snapshot()
 
         super().__init__()
 
-    def get_latest_conversation(self, username: str) -> Optional[Conversation]:
-        all_conversations = self.db.get(username, [])
-        if not all_conversations:
-            return None
-        return sorted(all_conversations, key=lambda x: x.created_at)[-1]
+    def get_latest_conversation_id(self, username: str) -> Optional[str]:
+        with self.__lock:
+            self.__evict()
+            return self.latest_ids.get(username)
+
+    def get_conversation(self, username: str, conversation_id: str) -> Optional[Conversation]:
+        with self.__lock:
+            self.__evict()
+            conversation = self.db.get(username, {}).get(conversation_id)
+            if conversation is None:
+                return None
+            # A copy, so that the caller does not see messages added later by other threads.
+            return Conversation(
+                created_at=conversation.created_at, messages=list(conversation.messages)
+            )
 
-    def add_conversation(self, username: str, conversation: Conversation) -> None:
-        self.db.setdefault(username, []).append(conversation)
+    def get_conversation_window(
+        self,
+        username: str,
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> Optional[ConversationWindow]:
+        with self.__lock:
+            self.__evict()
+            conversation = self.db.get(username, {}).get(conversation_id)
+            if conversation is None:
+                return None
+            total_messages = len(conversation.messages)
+            end = total_messages if before is None else min(before, total_messages)
+            start = 0 if max_messages is None else max(end - max_messages, 0)
+            return ConversationWindow(
+                id=conversation_id,
+                created_at=conversation.created_at,
+                messages=conversation.messages[start:end],
+                start=start,
+                total_messages=total_messages,
+            )
 
-    def add_to_latest_conversation(
-        self, username: str, user_message: Message, bot_message: Message
+    def add_conversation(self, username: str, conversation: Conversation) -> str:
+        conversation_id = str(uuid.uuid4())
+        conversation = Conversation(
+            created_at=conversation.created_at, messages=list(conversation.messages)
+        )
+        with self.__lock:
+            self.db.setdefault(username, {})[conversation_id] = conversation
+            self.__update_latest_id(username, conversation_id)
+            self.__mark_changed(username, conversation_id)
+            self.__evict()
+        self.__save_snapshot_if_due()
+        return conversation_id
+
+    def add_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
     ) -> None:
-        latest_conversation = self.get_latest_conversation(username)
-        if latest_conversation is None:
-            raise ValueError(f"No conversation found for user {username}")
-        latest_conversation.messages.append(user_message)
-        latest_conversation.messages.append(bot_message)
+        self.add_exchanges_to_conversation(username, conversation_id, [(user_message, bot_message)])
+
+    def add_exchanges_to_conversation(
+        self,
+        username: str,
+        conversation_id: str,
+        exchanges: list[tuple[Message, Message]],
+        write_id: Optional[str] = None,
+    ) -> None:
+        with self.__lock:
+            self.__evict()
+            conversation = self.db.get(username, {}).get(conversation_id)
+            if conversation is None:
+                raise ConversationNotFoundError(
+                    f"No conversation {conversation_id} found for user {username}"
+                )
+            conversation.messages.extend(message for exchange in exchanges for message in exchange)
+            self.__mark_changed(username, conversation_id)
+        self.__save_snapshot_if_due()
 
     def clear_conversations(self, username: str) -> None:
-        self.db[username] = []
+        with self.__lock:
+            for conversation_id in self.db.pop(username, {}):
+                self.changed_at.pop((username, conversation_id), None)
+            self.latest_ids.pop(username, None)
+        self.__save_snapshot_if_due()
+
+    def save_snapshot(self) -> None:
+        """Save all conversations to snapshot_path, if set."""
+
+        if self.snapshot_path is None:
+            return
+        with self.__lock:
+            snapshot_json = InMemorySnapshot(conversations=self.db).model_dump_json()
+        with self.__snapshot_lock:
+            # Written to a temporary file first, so that a crash does not leave a partial snapshot.
+            tmp_path = f"{self.snapshot_path}.tmp"
+            Path(tmp_path).parent.mkdir(parents=True, exist_ok=True)
+            Path(tmp_path).write_text(snapshot_json)
+            os.replace(tmp_path, self.snapshot_path)
+            self.__snapshot_saved_at = time.time()
+
+    def __save_snapshot_if_due(self) -> None:
+        if self.snapshot_path is None:
+            return
+        if time.time() - self.__snapshot_saved_at >= self.snapshot_interval_sec:
+            self.save_snapshot()
+
+    def __load_snapshot(self) -> None:
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            snapshot = InMemorySnapshot.model_validate_json(Path(self.snapshot_path).read_text())
+        except ValueError as e:
+            self.logger.warning(f"Ignoring invalid conversations snapshot: {e}")
+            return
+        self.db = snapshot.conversations
+        # The times of the changes are not saved, the loaded conversations count as changed now.
+        conversations = [
+            (conversation.created_at, username, conversation_id)
+            for username, conversations in self.db.items()
+            for conversation_id, conversation in conversations.items()
+        ]
+        for _, username, conversation_id in sorted(conversations):
+            self.__update_latest_id(username, conversation_id)
+            self.__mark_changed(username, conversation_id)
+        self.__evict()
+        self.logger.info(f"Loaded {len(conversations)} conversations from the snapshot")
+
+    def __update_latest_id(self, username: str, conversation_id: str) -> None:
+        conversations = self.db[username]
+        latest_id = self.latest_ids.get(username)
+        if (
+            latest_id is None
+            or conversations[conversation_id].created_at >= conversations[latest_id].created_at
+        ):
+            self.latest_ids[username] = conversation_id
+
+    def __mark_changed(self, username: str, conversation_id: str) -> None:
+        key = (username, conversation_id)
+        self.changed_at[key] = time.time()
+        self.changed_at.move_to_end(key)
+
+    def __evict(self) -> None:
+        now = time.time()
+        while self.changed_at:
+            key, changed_at = next(iter(self.changed_at.items()))
+            too_many = (
+                self.max_conversations is not None and len(self.changed_at) > self.max_conversations
+            )
+            too_old = self.max_age_sec is not None and now - changed_at > self.max_age_sec
+            if not too_many and not too_old:
+                return
+            self.__delete(*key)
+
+    def __delete(self, username: str, conversation_id: str) -> None:
+        self.changed_at.pop((username, conversation_id), None)
+        conversations = self.db.get(username, {})
+        conversations.pop(conversation_id, None)
+        if not conversations:
+            self.db.pop(username, None)
+            self.latest_ids.pop(username, None)
+        elif self.latest_ids.get(username) == conversation_id:
+            self.latest_ids[username] = max(
+                conversations, key=lambda c_id: conversations[c_id].created_at
+            )
@@ -0,0 +1,441 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterable, Literal, Optional
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores.base import VectorStore
+from pydantic import BaseModel
+
+from ai_document_search_backend.database_providers.vector_index import (
+    get_text_to_embed,
+    VectorIndex,
+)
+from ai_document_search_backend.utils.filter_index import FilterIndex
+
+MANIFEST_FILENAME = "manifest.json"
+# keys of the values compared by the Equal and NotEqual filters
+FILTER_VALUE_KEYS = ["valueText", "valueString", "valueInt", "valueNumber", "valueBoolean"]
+# with fewer objects, searching all of them is fast enough and the clusters would be too small
+MIN_IVF_OBJECTS = 1000
+KMEANS_ITERATIONS = 10
+# number of vectors compared with the centroids at a time while clustering
+KMEANS_CHUNK_SIZE = 10000
+
+
+class LocalIndexManifest(BaseModel):
+    """Version of the saved files, replaced last so that a reader never sees partial files"""
+
+    version: str
+    count: int
+    dimensions: int
+    # 0 = the objects are not clustered
+    num_lists: int
+
+
+class LoadedIndex:
+    """The saved objects as loaded by one process, never changed"""
+
+    def __init__(
+        self,
+        version: Optional[str],
+        ids: list[str],
+        objects: list[dict],
+        vectors: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+        list_offsets: Optional[np.ndarray] = None,
+        list_rows: Optional[np.ndarray] = None,
+    ):
+        self.version = version
+        self.ids = ids
+        self.objects = objects
+        # normalized, one row per object
+        self.vectors = vectors
+        # rows of the objects of cluster i are list_rows[list_offsets[i] : list_offsets[i + 1]]
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        # rows of the objects by their property values, to evaluate the filters
+        self.filter_index = FilterIndex(objects)
+
+
+class LocalVectorIndex(VectorIndex):
+    """
+    Objects stored in a local directory and searched in the memory of the process.
+
+    The vectors are normalized float32 arrays memory-mapped from the files, so the workers
+    of a node share them through the page cache. In the "flat" mode, the question is compared
+    with all objects matching the filter, which is exact. In the "ivf" mode, the objects are
+    clustered with k-means when they are saved and the question is compared only with
+    the objects of the num_probes nearest clusters, which is approximate but faster
+    for many objects. The filters are evaluated with an inverted index first. If they match
+    fewer objects than the probed clusters have (e.g. a single ISIN), only the matching objects
+    are compared, exactly. Otherwise the probed objects are filtered, and if fewer than k of them
+    match, all matching objects are compared.
+
+    The changes are written to new files by save. Other processes load them when refreshed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embeddings: Embeddings,
+        text_key: str = "text",
+        mode: Literal["flat", "ivf"] = "flat",
+        num_lists: Optional[int] = None,
+        num_probes: int = 8,
+    ):
+        if embeddings is None:
+            raise ValueError("The local vector index requires local embeddings")
+        if mode not in ("flat", "ivf"):
+            raise ValueError(f"Unknown local vector index mode {mode}")
+        self.path = Path(path)
+        self.embeddings = embeddings
+        self.text_key = text_key
+        self.mode = mode
+        self.num_lists = num_lists
+        self.num_probes = num_probes
+        self.logger = logging.getLogger(__name__)
+
+        # changes not saved yet, object id -> (properties, vector)
+        self.__added: dict[str, tuple[dict, list[float]]] = {}
+        self.__deleted: set[str] = set()
+        self.__lock = threading.Lock()
+        self.__loaded = LoadedIndex(None, [], [], np.zeros((0, 0), dtype=np.float32))
+        self.refresh()
+
+    @property
+    def name(self) -> str:
+        return str(self.path)
+
+    def create_if_not_exists(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_object_ids(self) -> set[str]:
+        with self.__lock:
+            return (set(self.__loaded.ids) - self.__deleted) | set(self.__added)
+
+    def add_objects(self, objects: list[tuple[str, dict]]) -> None:
+        if len(objects) == 0:
+            return
+        vectors = self.embeddings.embed_documents(
+            [get_text_to_embed(properties, self.text_key) for _, properties in objects]
+        )
+        with self.__lock:
+            for (object_id, properties), vector in zip(objects, vectors):
+                self.__added[object_id] = (properties, vector)
+                self.__deleted.discard(object_id)
+
+    def delete_objects(self, object_ids: set[str]) -> None:
+        with self.__lock:
+            for object_id in object_ids:
+                self.__added.pop(object_id, None)
+            self.__deleted.update(object_ids)
+
+    def delete_all(self) -> None:
+        """
+        Stage the deletion of all objects, the searches keep finding them until save is called,
+        so the index can be rebuilt while it is being searched.
+        """
+
+        with self.__lock:
+            self.__added.clear()
+            self.__deleted.update(self.__loaded.ids)
+
+    def save(self) -> None:
+        with self.__lock:
+            if not self.__added and not self.__deleted:
+                return
+            loaded = self.__loaded
+            kept_rows = [
+                row
+                for row, object_id in enumerate(loaded.ids)
+                if object_id not in self.__deleted and object_id not in self.__added
+            ]
+            ids = [loaded.ids[row] for row in kept_rows] + list(self.__added)
+            objects = [loaded.objects[row] for row in kept_rows] + [
+                properties for properties, _ in self.__added.values()
+            ]
+            parts = [np.asarray(loaded.vectors[kept_rows])] if kept_rows else []
+            if self.__added:
+                parts.append(
+                    normalize(
+                        np.array([vector for _, vector in self.__added.values()], dtype=np.float32)
+                    )
+                )
+            vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+            version = uuid.uuid4().hex
+            self.__write(version, ids, objects, vectors)
+            self.__delete_old_files(keep={version, loaded.version})
+            self.__added.clear()
+            self.__deleted.clear()
+            self.__loaded = self.__load(self.__read_manifest())
+        self.logger.info(f"Saved {len(ids)} objects to the local vector index {self.path}")
+
+    def count(self) -> int:
+        return len(self.get_object_ids())
+
+    def get_property_values(self, properties: list[str], limit: int) -> dict[str, list[str]]:
+        objects = self.__loaded.objects
+        return {
+            prop: sorted(
+                value
+                for value, _ in Counter(
+                    obj[prop] for obj in objects if isinstance(obj.get(prop), str)
+                ).most_common(limit)
+            )
+            for prop in properties
+        }
+
+    def as_vectorstore(self) -> "LocalVectorStore":
+        return LocalVectorStore(self)
+
+    def refresh(self) -> bool:
+        manifest = self.__read_manifest()
+        if manifest is None or manifest.version == self.__loaded.version:
+            return False
+        loaded = self.__load(manifest)
+        with self.__lock:
+            self.__loaded = loaded
+        self.logger.info(f"Loaded {manifest.count} objects from the local vector index {self.path}")
+        return True
+
+    def search(
+        self, vector: list[float], k: int, where_filter: Optional[dict] = None
+    ) -> list[tuple[dict, float]]:
+        """The k objects nearest to the vector matching the filter, with their cosine distances"""
+
+        loaded = self.__loaded
+        if len(loaded.ids) == 0:
+            return []
+        query = normalize(np.array(vector, dtype=np.float32))
+        mask = evaluate_filter(where_filter, loaded) if where_filter else None
+
+        rows = None if mask is None else np.flatnonzero(mask)
+        # Pre-filtered when the filter is more selective than the probed clusters.
+        if loaded.centroids is not None and (
+            rows is None or len(rows) > self.__get_probed_count(loaded)
+        ):
+            nearest_lists = np.argsort(loaded.centroids @ query)[-self.num_probes :]
+            probed_rows = np.concatenate(
+                [
+                    loaded.list_rows[loaded.list_offsets[i] : loaded.list_offsets[i + 1]]
+                    for i in nearest_lists
+                ]
+            )
+            if mask is not None:
+                probed_rows = probed_rows[mask[probed_rows]]
+            if len(probed_rows) >= k:
+                rows = probed_rows
+
+        scores = loaded.vectors @ query if rows is None else loaded.vectors[rows] @ query
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (loaded.objects[row if rows is None else rows[row]], float(1 - scores[row]))
+            for row in top
+        ]
+
+    def __read_manifest(self) -> Optional[LocalIndexManifest]:
+        manifest_path = self.path / MANIFEST_FILENAME
+        if not manifest_path.exists():
+            return None
+        return LocalIndexManifest.model_validate_json(manifest_path.read_text())
+
+    def __write(
+        self, version: str, ids: list[str], objects: list[dict], vectors: np.ndarray
+    ) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        np.save(self.path / f"vectors-{version}.npy", vectors)
+        (self.path / f"objects-{version}.json").write_text(
+            json.dumps({"ids": ids, "objects": objects})
+        )
+        num_lists = self.__get_num_lists(len(ids))
+        if num_lists > 0:
+            centroids, assignments = cluster(vectors, num_lists)
+            list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+            list_offsets = np.searchsorted(assignments[list_rows], np.arange(num_lists + 1))
+            np.savez(
+                self.path / f"ivf-{version}.npz",
+                centroids=centroids,
+                list_offsets=list_offsets,
+                list_rows=list_rows,
+            )
+        manifest = LocalIndexManifest(
+            version=version,
+            count=len(ids),
+            dimensions=vectors.shape[1],
+            num_lists=num_lists,
+        )
+        # Replaced atomically, the files of the version must be complete before.
+        tmp_path = self.path / f"{MANIFEST_FILENAME}.tmp"
+        tmp_path.write_text(manifest.model_dump_json())
+        os.replace(tmp_path, self.path / MANIFEST_FILENAME)
+
+    def __load(self, manifest: LocalIndexManifest) -> LoadedIndex:
+        data = json.loads((self.path / f"objects-{manifest.version}.json").read_text())
+        vectors_path = self.path / f"vectors-{manifest.version}.npy"
+        # An empty file cannot be memory-mapped.
+        vectors = np.load(vectors_path, mmap_mode="r" if manifest.count > 0 else None)
+        loaded = LoadedIndex(manifest.version, data["ids"], data["objects"], vectors)
+        if manifest.num_lists > 0:
+            with np.load(self.path / f"ivf-{manifest.version}.npz") as ivf:
+                loaded.centroids = ivf["centroids"]
+                loaded.list_offsets = ivf["list_offsets"]
+                loaded.list_rows = ivf["list_rows"]
+        return loaded
+
+    def __delete_old_files(self, keep: set[Optional[str]]) -> None:
+        """
+        The files of the previous version are kept,
+        in case another process has just read the manifest and loads them.
+        """
+
+        for file_path in self.path.glob("*-*.*"):
+            version = file_path.name.split("-", 1)[1].split(".", 1)[0]
+            if version not in keep:
+                file_path.unlink(missing_ok=True)
+
+    def __get_probed_count(self, loaded: LoadedIndex) -> float:
+        """Expected number of objects in the num_probes nearest clusters"""
+
+        return len(loaded.ids) * min(self.num_probes, len(loaded.centroids)) / len(loaded.centroids)
+
+    def __get_num_lists(self, count: int) -> int:
+        if self.mode != "ivf" or count < MIN_IVF_OBJECTS:
+            return 0
+        num_lists = self.num_lists or int(np.sqrt(count))
+        return min(num_lists, count)
+
+
+class LocalVectorStore(VectorStore):
+    """The LangChain interface of a LocalVectorIndex"""
+
+    def __init__(self, index: LocalVectorIndex):
+        self.index = index
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.index.embeddings
+
+    def add_texts(
+        self, texts: Iterable[str], metadatas: Optional[list[dict]] = None, **kwargs: Any
+    ) -> list[str]:
+        texts = list(texts)
+        ids = kwargs.get("ids") or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        self.index.add_objects(
+            [
+                (object_id, {**metadata, self.index.text_key: text})
+                for object_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+        )
+        self.index.save()
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: list[str],
+        embedding: Embeddings,
+        metadatas: Optional[list[dict]] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        raise NotImplementedError("Use LocalVectorIndex(...).as_vectorstore() instead")
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(
+        self, embedding: list[float], k: int = 4, **kwargs: Any
+    ) -> list[Document]:
+        """Documents in the format returned by the Weaviate vector store"""
+
+        additional = kwargs.get("additional") or []
+        documents = []
+        for properties, distance in self.index.search(embedding, k, kwargs.get("where_filter")):
+            metadata = {
+                key: value for key, value in properties.items() if key != self.index.text_key
+            }
+            if additional:
+                # The certainty of Weaviate for the cosine distance.
+                scores = {"certainty": 1 - distance / 2, "distance": distance}
+                metadata["_additional"] = {key: scores[key] for key in additional if key in scores}
+            documents.append(
+                Document(page_content=properties[self.index.text_key], metadata=metadata)
+            )
+        return documents
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def evaluate_filter(where_filter: dict, loaded: LoadedIndex) -> np.ndarray:
+    """Which objects match a Weaviate where filter, supports And, Or, Equal and NotEqual"""
+
+    operator = where_filter["operator"]
+    if operator == "Or" and is_equal_filter_of_one_property(where_filter["operands"]):
+        # The values of a filter, one look-up of each in the inverted index.
+        return loaded.filter_index.get_mask(
+            where_filter["operands"][0]["path"][0],
+            [get_filter_value(operand) for operand in where_filter["operands"]],
+        )
+    if operator in ("And", "Or"):
+        masks = [evaluate_filter(operand, loaded) for operand in where_filter["operands"]]
+        if len(masks) == 0:
+            return np.full(len(loaded.ids), operator == "And")
+        return np.logical_and.reduce(masks) if operator == "And" else np.logical_or.reduce(masks)
+    if operator in ("Equal", "NotEqual"):
+        mask = loaded.filter_index.get_mask(
+            where_filter["path"][0], [get_filter_value(where_filter)]
+        )
+        return mask if operator == "Equal" else ~mask
+    raise ValueError(f"Unsupported filter operator {operator}")
+
+
+def get_filter_value(where_filter: dict) -> Any:
+    return next(where_filter[key] for key in FILTER_VALUE_KEYS if key in where_filter)
+
+
+def is_equal_filter_of_one_property(operands: list[dict]) -> bool:
+    return len(operands) > 0 and all(
+        operand["operator"] == "Equal" and operand["path"] == operands[0]["path"]
+        for operand in operands
+    )
+
+
+def cluster(vectors: np.ndarray, num_lists: int) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means, return the normalized centroids and the cluster of each vector"""
+
+    # Seeded, so that the same objects are always clustered the same way.
+    rng = np.random.default_rng(0)
+    centroids = np.array(vectors[rng.choice(len(vectors), num_lists, replace=False)])
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = assign_to_clusters(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Empty clusters keep their centroids.
+        non_empty = np.any(sums != 0, axis=1)
+        centroids[non_empty] = normalize(sums[non_empty])
+    return centroids, assign_to_clusters(vectors, centroids)
+
+
+def assign_to_clusters(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [
+            np.argmax(vectors[i : i + KMEANS_CHUNK_SIZE] @ centroids.T, axis=1)
+            for i in range(0, len(vectors), KMEANS_CHUNK_SIZE)
+        ]
+    )
@@ -0,0 +1,301 @@
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ai_document_search_backend.database_providers.compact_messages import (
+    compress_text,
+    decompress_text,
+    get_source_document,
+    get_source_documents,
+)
+from ai_document_search_backend.database_providers.conversation_database import (
+    ConversationDatabase,
+    ConversationNotFoundError,
+    Conversation,
+    ConversationWindow,
+    Message,
+    Source,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS conversations_username_created_at
+    ON conversations (username, created_at);
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    -- long texts are stored compressed, as a BLOB
+    text TEXT NOT NULL,
+    has_sources INTEGER NOT NULL,
+    PRIMARY KEY (conversation_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS source_documents (
+    id TEXT PRIMARY KEY,
+    isin TEXT NOT NULL,
+    shortname TEXT NOT NULL,
+    link TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    conversation_id TEXT NOT NULL,
+    message_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    document_id TEXT NOT NULL REFERENCES source_documents (id),
+    page INTEGER NOT NULL,
+    certainty REAL NOT NULL,
+    distance REAL NOT NULL,
+    PRIMARY KEY (conversation_id, message_position, position),
+    FOREIGN KEY (conversation_id, message_position)
+        REFERENCES messages (conversation_id, position) ON DELETE CASCADE
+) WITHOUT ROWID;
+"""
+
+SELECT_LATEST_CONVERSATION_ID = """
+SELECT id FROM conversations WHERE username = ? ORDER BY created_at DESC, rowid DESC LIMIT 1
+"""
+SELECT_CONVERSATION = """
+SELECT created_at, message_count FROM conversations WHERE id = ? AND username = ?
+"""
+SELECT_MESSAGES = """
+SELECT position, role, text, has_sources FROM messages
+WHERE conversation_id = ? AND position >= ? AND position < ? ORDER BY position
+"""
+SELECT_SOURCES = """
+SELECT s.message_position, d.isin, d.shortname, d.link, s.page, s.certainty, s.distance
+FROM sources s JOIN source_documents d ON d.id = s.document_id
+WHERE s.conversation_id = ? AND s.message_position >= ? AND s.message_position < ?
+ORDER BY s.message_position, s.position
+"""
+INSERT_CONVERSATION = """
+INSERT INTO conversations (id, username, created_at, message_count) VALUES (?, ?, ?, ?)
+"""
+INSERT_MESSAGE = """
+INSERT INTO messages (conversation_id, position, role, text, has_sources) VALUES (?, ?, ?, ?, ?)
+"""
+INSERT_SOURCE_DOCUMENT = """
+INSERT OR IGNORE INTO source_documents (id, isin, shortname, link) VALUES (?, ?, ?, ?)
+"""
+INSERT_SOURCE = """
+INSERT INTO sources (
+    conversation_id, message_position, position, document_id, page, certainty, distance
+) VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+UPDATE_MESSAGE_COUNT = """
+UPDATE conversations SET message_count = message_count + ? WHERE id = ?
+"""
+DELETE_CONVERSATIONS = """
+DELETE FROM conversations WHERE username = ?
+"""
+
+
+class SqliteConversationDatabase(ConversationDatabase):
+    """
+    Stores the conversations in a local SQLite file, for single-node deployments and tests.
+
+    The messages and their sources are stored in separate tables,
+    so a new exchange is inserted without reading the conversation
+    and only the requested messages are read.
+    The sources refer to the documents stored once in the source_documents table
+    and long texts are compressed, see compact_messages.py.
+    The database is used in WAL mode, so that reads are not blocked by writes,
+    through a pool of pool_size connections shared by the threads of the process.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.__pool: queue.Queue[sqlite3.Connection] = queue.Queue()
+        for _ in range(pool_size):
+            self.__pool.put(self.__connect())
+        with self.__connection() as connection:
+            connection.executescript(SCHEMA)
+
+        super().__init__()
+
+    def get_latest_conversation_id(self, username: str) -> Optional[str]:
+        with self.__connection() as connection:
+            row = connection.execute(SELECT_LATEST_CONVERSATION_ID, (username,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_conversation(self, username: str, conversation_id: str) -> Optional[Conversation]:
+        window = self.get_conversation_window(username, conversation_id)
+        if window is None:
+            return None
+        return Conversation(created_at=window.created_at, messages=window.messages)
+
+    def get_conversation_window(
+        self,
+        username: str,
+        conversation_id: str,
+        max_messages: Optional[int] = None,
+        before: Optional[int] = None,
+    ) -> Optional[ConversationWindow]:
+        with self.__connection() as connection:
+            # Both reads are done in one transaction, so that they see the same messages.
+            connection.execute("BEGIN")
+            try:
+                row = connection.execute(
+                    SELECT_CONVERSATION, (conversation_id, username)
+                ).fetchone()
+                if row is None:
+                    return None
+                created_at, total_messages = row
+                end = total_messages if before is None else min(before, total_messages)
+                start = 0 if max_messages is None else max(end - max_messages, 0)
+                message_rows = connection.execute(
+                    SELECT_MESSAGES, (conversation_id, start, end)
+                ).fetchall()
+                source_rows = connection.execute(
+                    SELECT_SOURCES, (conversation_id, start, end)
+                ).fetchall()
+            finally:
+                connection.execute("COMMIT")
+
+        sources: dict[int, list[Source]] = {}
+        for message_position, isin, shortname, link, page, certainty, distance in source_rows:
+            sources.setdefault(message_position, []).append(
+                Source(
+                    isin=isin,
+                    shortname=shortname,
+                    link=link,
+                    page=page,
+                    certainty=certainty,
+                    distance=distance,
+                )
+            )
+        messages = [
+            Message(
+                role=role,
+                text=decompress_text(text) if isinstance(text, bytes) else text,
+                sources=sources.get(position, []) if has_sources else None,
+            )
+            for position, role, text, has_sources in message_rows
+        ]
+        return ConversationWindow(
+            id=conversation_id,
+            created_at=created_at,
+            messages=messages,
+            start=start,
+            total_messages=total_messages,
+        )
+
+    def add_conversation(self, username: str, conversation: Conversation) -> str:
+        conversation_id = str(uuid.uuid4())
+        with self.__transaction() as connection:
+            connection.execute(
+                INSERT_CONVERSATION,
+                (conversation_id, username, conversation.created_at, len(conversation.messages)),
+            )
+            self.__insert_messages(connection, conversation_id, 0, conversation.messages)
+        return conversation_id
+
+    def add_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> None:
+        self.add_exchanges_to_conversation(username, conversation_id, [(user_message, bot_message)])
+
+    def add_exchanges_to_conversation(
+        self,
+        username: str,
+        conversation_id: str,
+        exchanges: list[tuple[Message, Message]],
+        write_id: Optional[str] = None,
+    ) -> None:
+        messages = [message for exchange in exchanges for message in exchange]
+        with self.__transaction() as connection:
+            row = connection.execute(SELECT_CONVERSATION, (conversation_id, username)).fetchone()
+            if row is None:
+                raise ConversationNotFoundError(
+                    f"No conversation {conversation_id} found for user {username}"
+                )
+            _, message_count = row
+            self.__insert_messages(connection, conversation_id, message_count, messages)
+            connection.execute(UPDATE_MESSAGE_COUNT, (len(messages), conversation_id))
+
+    def clear_conversations(self, username: str) -> None:
+        # The messages and the sources are deleted by the foreign keys.
+        with self.__transaction() as connection:
+            connection.execute(DELETE_CONVERSATIONS, (username,))
+
+    @staticmethod
+    def __insert_messages(
+        connection: sqlite3.Connection, conversation_id: str, start: int, messages: list[Message]
+    ) -> None:
+        connection.executemany(
+            INSERT_SOURCE_DOCUMENT,
+            [
+                (document.id, document.isin, document.shortname, document.link)
+                for document in get_source_documents(messages)
+            ],
+        )
+        connection.executemany(
+            INSERT_MESSAGE,
+            [
+                (
+                    conversation_id,
+                    start + i,
+                    message.role,
+                    compress_text(message.text) or message.text,
+                    message.sources is not None,
+                )
+                for i, message in enumerate(messages)
+            ],
+        )
+        connection.executemany(
+            INSERT_SOURCE,
+            [
+                (
+                    conversation_id,
+                    start + i,
+                    j,
+                    get_source_document(source).id,
+                    source.page,
+                    source.certainty,
+                    source.distance,
+                )
+                for i, message in enumerate(messages)
+                for j, source in enumerate(message.sources or [])
+            ],
+        )
+
+    def __connect(self) -> sqlite3.Connection:
+        # isolation_level=None leaves the transactions to the explicit BEGIN statements.
+        # The compiled statements are cached by each connection.
+        connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False, cached_statements=256
+        )
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA busy_timeout = 5000")
+        return connection
+
+    @contextmanager
+    def __connection(self) -> Iterator[sqlite3.Connection]:
+        connection = self.__pool.get()
+        try:
+            yield connection
+        finally:
+            self.__pool.put(connection)
+
+    @contextmanager
+    def __transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.__connection() as connection:
+            # The write lock is taken at the start, so that concurrent additions
+            # to the same conversation do not read the same message count.
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
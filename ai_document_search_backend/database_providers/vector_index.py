@@ -0,0 +1,89 @@
+from abc import ABC, abstractmethod
+
+from langchain.vectorstores.base import VectorStore
+
+# metadata properties vectorized together with the text, including their names
+VECTORIZED_METADATA_PROPERTIES = [
+    "shortname",
+    "isin",
+    "issuer_name",
+    "filename",
+    "industry",
+    "risk_type",
+    "green",
+]
+
+
+def get_text_to_embed(properties: dict, text_key: str) -> str:
+    """The text and the metadata of an object as vectorized by text2vec-openai, in the same order"""
+
+    return "\n".join(
+        [properties[text_key]]
+        + [
+            f"{prop} {properties[prop]}"
+            for prop in VECTORIZED_METADATA_PROPERTIES
+            if prop in properties
+        ]
+    )
+
+
+class VectorIndex(ABC):
+    """
+    Objects (the pages of the documents with their metadata) searchable by their vectors.
+
+    The objects are added and deleted by their ids, and the changes are visible to the searches
+    after save is called. The filters of the searches have the format of Weaviate where filters,
+    as created by construct_and_filter.
+    """
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_if_not_exists(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_object_ids(self) -> set[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_objects(self, objects: list[tuple[str, dict]]) -> None:
+        """Add or replace the objects given by their ids and properties"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_objects(self, object_ids: set[str]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_all(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_property_values(self, properties: list[str], limit: int) -> dict[str, list[str]]:
+        """The most frequent values of each property, at most limit of them, sorted"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def as_vectorstore(self) -> VectorStore:
+        """
+        The objects as a LangChain vector store, whose retrievers return them as documents.
+        The search accepts where_filter, and additional=["certainty", "distance"]
+        adds them to the "_additional" metadata of the documents.
+        """
+        raise NotImplementedError
+
+    def refresh(self) -> bool:
+        """Reload the objects if they were changed by another process, return whether they were"""
+        return False
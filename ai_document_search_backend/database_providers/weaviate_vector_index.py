@@ -0,0 +1,212 @@
+import logging
+from typing import Optional
+
+import weaviate
+from langchain.schema.embeddings import Embeddings
+from langchain.vectorstores import Weaviate
+
+from ai_document_search_backend.database_providers.vector_index import (
+    get_text_to_embed,
+    VECTORIZED_METADATA_PROPERTIES,
+    VectorIndex,
+)
+
+# Weaviate module vectorizing the objects when the embeddings are not computed locally
+OPENAI_VECTORIZER = "text2vec-openai"
+# number of object ids listed or deleted in one request
+OBJECT_IDS_PAGE_SIZE = 1000
+# number of objects sent to Weaviate in one request
+BATCH_SIZE = 100
+
+
+class WeaviateVectorIndex(VectorIndex):
+    """
+    The objects of a Weaviate class.
+
+    Without embeddings, the objects are vectorized by Weaviate (text2vec-openai),
+    otherwise their vectors are computed by the embeddings and sent to Weaviate.
+    The questions are vectorized by query_embeddings if set (they must use the same model
+    as the objects), then by the embeddings, then by Weaviate.
+    The changes are visible immediately, save does nothing.
+    """
+
+    def __init__(
+        self,
+        client: weaviate.Client,
+        class_name: str,
+        text_key: str,
+        attributes: list[str],
+        embeddings: Optional[Embeddings] = None,
+        query_embeddings: Optional[Embeddings] = None,
+    ):
+        self.client = client
+        self.class_name = class_name
+        self.text_key = text_key
+        self.attributes = attributes
+        self.embeddings = embeddings
+        self.query_embeddings = query_embeddings
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def name(self) -> str:
+        return self.class_name
+
+    def create_if_not_exists(self) -> None:
+        if not self.client.schema.exists(self.class_name):
+            self.logger.info(f"Creating class {self.class_name}")
+            self.client.schema.create_class(self.__get_class_obj())
+            return
+        # The objects of a class and the questions must be vectorized the same way.
+        vectorizer = self.client.schema.get(self.class_name).get("vectorizer")
+        if vectorizer != self.__get_vectorizer():
+            raise ValueError(
+                f"Class {self.class_name} is vectorized by {vectorizer}, "
+                f"not {self.__get_vectorizer()}, store the documents with --full or --new-version"
+            )
+
+    def get_object_ids(self) -> set[str]:
+        object_ids = set()
+        after = None
+        while True:
+            query = (
+                self.client.query.get(self.class_name, [])
+                .with_additional(["id"])
+                .with_limit(OBJECT_IDS_PAGE_SIZE)
+            )
+            if after is not None:
+                query = query.with_after(after)
+            result = query.do()
+            if "errors" in result:
+                raise ValueError(f"Error while listing objects: {result['errors']}")
+            objects = result["data"]["Get"][self.class_name]
+            if len(objects) == 0:
+                return object_ids
+            object_ids.update(obj["_additional"]["id"] for obj in objects)
+            after = objects[-1]["_additional"]["id"]
+
+    def add_objects(self, objects: list[tuple[str, dict]]) -> None:
+        if len(objects) == 0:
+            return
+        vectors: list[Optional[list[float]]] = [None] * len(objects)
+        if self.embeddings is not None:
+            vectors = self.embeddings.embed_documents(
+                [get_text_to_embed(properties, self.text_key) for _, properties in objects]
+            )
+        self.client.batch.configure(batch_size=BATCH_SIZE)
+        with self.client.batch as batch:
+            for (object_id, properties), vector in zip(objects, vectors):
+                batch.add_data_object(
+                    data_object=properties,
+                    class_name=self.class_name,
+                    uuid=object_id,
+                    vector=vector,
+                )
+
+    def delete_objects(self, object_ids: set[str]) -> None:
+        sorted_object_ids = sorted(object_ids)
+        for i in range(0, len(sorted_object_ids), OBJECT_IDS_PAGE_SIZE):
+            self.client.batch.delete_objects(
+                class_name=self.class_name,
+                where={
+                    "path": ["id"],
+                    "operator": "ContainsAny",
+                    "valueTextArray": sorted_object_ids[i : i + OBJECT_IDS_PAGE_SIZE],
+                },
+            )
+
+    def delete_all(self) -> None:
+        if self.client.schema.exists(self.class_name):
+            self.client.schema.delete_class(self.class_name)
+
+    def save(self) -> None:
+        pass
+
+    def count(self) -> int:
+        result = self.client.query.aggregate(self.class_name).with_meta_count().do()
+        return result["data"]["Aggregate"][self.class_name][0]["meta"]["count"]
+
+    def get_property_values(self, properties: list[str], limit: int) -> dict[str, list[str]]:
+        """The values of all properties are aggregated in a single query"""
+
+        fields = " ".join(
+            f"{prop} {{ topOccurrences(limit: {limit}) {{ value }} }}" for prop in properties
+        )
+        result = self.client.query.aggregate(self.class_name).with_fields(fields).do()
+        if "errors" in result:
+            raise ValueError(f"Error while getting filters: {result['errors']}")
+        aggregate = result["data"]["Aggregate"][self.class_name][0]
+        return {
+            prop: sorted(occurrence["value"] for occurrence in aggregate[prop]["topOccurrences"])
+            for prop in properties
+        }
+
+    def as_vectorstore(self) -> Weaviate:
+        query_embeddings = self.query_embeddings or self.embeddings
+        return Weaviate(
+            self.client,
+            index_name=self.class_name,
+            embedding=query_embeddings,
+            by_text=query_embeddings is None,
+            text_key=self.text_key,
+            attributes=self.attributes,
+        )
+
+    def __get_vectorizer(self) -> str:
+        return OPENAI_VECTORIZER if self.embeddings is None else "none"
+
+    def __get_class_obj(self) -> dict:
+        properties = [
+            {
+                "name": self.text_key,
+                "dataType": ["text"],
+                "moduleConfig": {
+                    OPENAI_VECTORIZER: {
+                        "skip": False,
+                        "vectorizePropertyName": False,
+                    }
+                },
+            },
+            *[
+                {
+                    "name": name,
+                    "dataType": [data_type],
+                    "moduleConfig": {
+                        OPENAI_VECTORIZER: {
+                            "skip": True,
+                        }
+                    },
+                }
+                for name, data_type in [("page", "number"), ("source", "text"), ("link", "text")]
+            ],
+            *[
+                {
+                    "name": name,
+                    "dataType": ["text"],
+                    "moduleConfig": {
+                        OPENAI_VECTORIZER: {
+                            "skip": False,
+                            "vectorizePropertyName": True,
+                        }
+                    },
+                }
+                for name in VECTORIZED_METADATA_PROPERTIES
+            ],
+        ]
+        if self.embeddings is not None:
+            # The vectors are sent with the objects, the module does not have to be enabled.
+            for prop in properties:
+                del prop["moduleConfig"]
+            return {"class": self.class_name, "properties": properties, "vectorizer": "none"}
+        return {
+            "class": self.class_name,
+            "properties": properties,
+            "vectorizer": OPENAI_VECTORIZER,
+            "moduleConfig": {
+                OPENAI_VECTORIZER: {
+                    "model": "ada",
+                    "modelVersion": "002",
+                    "type": "text",
+                    "vectorizeClassName": False,
+                },
+            },
+        }
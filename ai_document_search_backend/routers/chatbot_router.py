@@ -1,7 +1,11 @@
-from typing import Annotated
+import json
+import logging
+from typing import Annotated, AsyncIterator, Optional
 
 from dependency_injector.wiring import inject, Provide
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 
@@ -11,6 +15,7 @@ from ai_document_search_backend.services.auth_service import AuthService
 from ai_document_search_backend.services.chatbot_service import (
     ChatbotService,
     ChatbotAnswer,
+    ChatbotError,
     Filters,
     Filter,
 )
@@ -18,6 +23,7 @@ from ai_document_search_backend.services.conversation_service import Conversatio
 from ai_document_search_backend.utils.conversation_to_chat_history import (
     conversation_to_chat_history,
 )
+from ai_document_search_backend.utils.etag import etag_matches
 
 router = APIRouter(
     prefix="/chatbot",
@@ -26,6 +32,8 @@ router = APIRouter(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+logger = logging.getLogger(__name__)
+
 
 class ChatbotRequest(BaseModel):
     question: str
@@ -34,7 +42,7 @@ class ChatbotRequest(BaseModel):
 
 @router.post("")
 @inject
-def answer_question(
+async def answer_question(
     request: ChatbotRequest,
     token: Annotated[str, Depends(oauth2_scheme)],
     auth_service: AuthService = Depends(Provide[Container.auth_service]),
@@ -43,15 +51,20 @@ def answer_question(
 ) -> ChatbotAnswer:
     username = auth_service.get_current_user(token).username
 
-    conversation = conversation_service.get_latest_conversation(username)
+    # Only the messages needed for the chat history are loaded,
+    # the exchange is then added to the conversation by its id.
+    conversation = await conversation_service.aget_latest_conversation_window(
+        username, get_max_history_messages(chatbot_service)
+    )
     chat_history = conversation_to_chat_history(conversation)
 
     question = request.question
     filters = request.filters
-    answer = chatbot_service.answer(question, chat_history, filters)
+    answer = await chatbot_service.aanswer(question, chat_history, filters)
 
-    conversation_service.add_to_latest_conversation(
+    await conversation_service.aadd_to_conversation(
         username,
+        conversation.id,
         Message(role="user", text=question),
         Message(role="bot", text=answer.text, sources=answer.sources),
     )
@@ -59,13 +72,77 @@ def answer_question(
     return answer
 
 
+@router.post("/stream")
+@inject
+async def stream_answer(
+    request: ChatbotRequest,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    auth_service: AuthService = Depends(Provide[Container.auth_service]),
+    chatbot_service: ChatbotService = Depends(Provide[Container.chatbot_service]),
+    conversation_service: ConversationService = Depends(Provide[Container.conversation_service]),
+) -> StreamingResponse:
+    """
+    Stream the answer as Server-Sent Events.
+    The `sources` event is sent as soon as the sources are retrieved, followed by a `token` event
+    for each generated token of the answer. The `answer` event with the complete answer is sent
+    after the exchange is saved (or queued) to the conversation. On failure, an `error` event is sent.
+    """
+    username = auth_service.get_current_user(token).username
+
+    conversation = await conversation_service.aget_latest_conversation_window(
+        username, get_max_history_messages(chatbot_service)
+    )
+    chat_history = conversation_to_chat_history(conversation)
+
+    question = request.question
+    filters = request.filters
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in chatbot_service.astream_answer(question, chat_history, filters):
+                if event.event == "answer":
+                    await conversation_service.aadd_to_conversation(
+                        username,
+                        conversation.id,
+                        Message(role="user", text=question),
+                        Message(role="bot", text=event.data.text, sources=event.data.sources),
+                    )
+                yield to_server_sent_event(event.event, event.data)
+        except ChatbotError as e:
+            yield to_server_sent_event("error", {"detail": e.message})
+        except Exception as e:
+            # The response has already started, the client learns about the failure only from the event.
+            logger.exception(f"Error while streaming the answer: {e}")
+            yield to_server_sent_event("error", {"detail": "Error while streaming the answer"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+def get_max_history_messages(chatbot_service: ChatbotService) -> Optional[int]:
+    """Number of last messages the chatbot uses, None when it uses all of them"""
+
+    max_history_length = chatbot_service.max_history_length
+    return None if max_history_length < 0 else 2 * max_history_length
+
+
+def to_server_sent_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
 @router.get("/filter")
 @inject
 def get_filters(
     token: Annotated[str, Depends(oauth2_scheme)],
+    response: Response,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     auth_service: AuthService = Depends(Provide[Container.auth_service]),
     chatbot_service: ChatbotService = Depends(Provide[Container.chatbot_service]),
 ) -> Filters:
     auth_service.get_current_user(token)
-    filters = chatbot_service.get_filters()
-    return filters
+    cached_filters = chatbot_service.get_cached_filters()
+    # The client has to revalidate the filters, but does not download them again if they did not change.
+    headers = {"ETag": cached_filters.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, cached_filters.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return cached_filters.filters
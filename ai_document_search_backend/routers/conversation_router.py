@@ -1,15 +1,22 @@
-from typing import Annotated
+import json
+from typing import Annotated, AsyncIterator, Optional, Union
 
 from dependency_injector.wiring import Provide, inject
-from fastapi import Depends, APIRouter
+from fastapi import Depends, APIRouter, Header, HTTPException, Query, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 
 from ai_document_search_backend.container import Container
+from ai_document_search_backend.database_providers.conversation_database import (
+    ConversationWindow,
+)
 from ai_document_search_backend.services.auth_service import AuthService
 from ai_document_search_backend.services.conversation_service import (
     Conversation,
     ConversationService,
 )
+from ai_document_search_backend.utils.background_jobs import BackgroundJob
 
 router = APIRouter(
     prefix="/conversation",
@@ -18,35 +25,99 @@ router = APIRouter(
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
 
 @router.get("")
 @inject
-def get_latest_conversation(
+async def get_latest_conversation(
     token: Annotated[str, Depends(oauth2_scheme)],
+    before: Annotated[Optional[int], Query(ge=0)] = None,
+    limit: Annotated[Optional[int], Query(ge=0)] = None,
+    accept: Annotated[Optional[str], Header()] = None,
     auth_service: AuthService = Depends(Provide[Container.auth_service]),
     conversation_service: ConversationService = Depends(Provide[Container.conversation_service]),
-) -> Conversation:
+) -> Union[ConversationWindow, Conversation]:
+    """
+    Get the latest conversation.
+    With `limit`, only the last `limit` messages before the message with index `before` are returned,
+    together with the index of the first returned message (`start`), which can be passed as `before`
+    to get the previous messages.
+    With the `Accept: application/x-ndjson` header, the response is streamed as newline-delimited JSON.
+    The first line contains the conversation without the messages, each of the following lines one message.
+    """
     user = auth_service.get_current_user(token)
-    return conversation_service.get_latest_conversation(user.username)
+
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        window = await conversation_service.aget_latest_conversation_window(
+            user.username, max_messages=0, before=before
+        )
+        end = window.start
+        start = 0 if limit is None else max(end - limit, 0)
+        window.start = start
+
+        async def ndjson_stream() -> AsyncIterator[str]:
+            yield to_ndjson_line(window.model_dump(exclude={"messages"}))
+            async for message in conversation_service.aiter_messages(
+                user.username, window.id, start, end
+            ):
+                yield to_ndjson_line(message)
+
+        return StreamingResponse(ndjson_stream(), media_type=NDJSON_MEDIA_TYPE)
+
+    if before is None and limit is None:
+        return await conversation_service.aget_latest_conversation(user.username)
+    return await conversation_service.aget_latest_conversation_window(
+        user.username, max_messages=limit, before=before
+    )
+
+
+def to_ndjson_line(data) -> str:
+    return json.dumps(jsonable_encoder(data)) + "\n"
 
 
 @router.post("")
 @inject
-def create_new_conversation(
+async def create_new_conversation(
     token: Annotated[str, Depends(oauth2_scheme)],
     auth_service: AuthService = Depends(Provide[Container.auth_service]),
     conversation_service: ConversationService = Depends(Provide[Container.conversation_service]),
 ) -> Conversation:
     user = auth_service.get_current_user(token)
-    return conversation_service.create_new_conversation(user.username)
+    return await conversation_service.acreate_new_conversation(user.username)
 
 
 @router.delete("")
 @inject
-def clear_conversations(
+async def clear_conversations(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    response: Response,
+    background: bool = False,
+    auth_service: AuthService = Depends(Provide[Container.auth_service]),
+    conversation_service: ConversationService = Depends(Provide[Container.conversation_service]),
+) -> Union[BackgroundJob, str]:
+    """
+    Delete all conversations of the user.
+    With `background=true`, the conversations are deleted in the background and the job is returned
+    immediately, its status can be polled at `/conversation/jobs/{job_id}`.
+    """
+    user = auth_service.get_current_user(token)
+    if background:
+        response.status_code = status.HTTP_202_ACCEPTED
+        return conversation_service.clear_conversations_in_background(user.username)
+    return await conversation_service.aclear_conversations(user.username)
+
+
+@router.get("/jobs/{job_id}")
+@inject
+async def get_background_job(
+    job_id: str,
     token: Annotated[str, Depends(oauth2_scheme)],
     auth_service: AuthService = Depends(Provide[Container.auth_service]),
     conversation_service: ConversationService = Depends(Provide[Container.conversation_service]),
-) -> str:
+) -> BackgroundJob:
     user = auth_service.get_current_user(token)
-    return conversation_service.clear_conversations(user.username)
+    job = conversation_service.get_background_job(user.username, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
@@ -0,0 +1,79 @@
+"""
+Measures how many PDF pages per second are parsed and joined with their metadata
+before they are sent to Weaviate, without calling Weaviate or OpenAI.
+
+Usage: python ai_document_search_backend/scripts/benchmark_ingestion.py [max_workers]
+
+- sequential: PyPDFDirectoryLoader followed by a pandas lookup of the metadata for each page
+- parallel: the pipeline used by ChatbotService.store, parsing the PDFs in a process pool
+  and looking up the metadata in a dictionary
+
+The sample corpus is downloaded by ai_document_search_backend/scripts/download_documents.py.
+"""
+
+import sys
+import time
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+from langchain.document_loaders import PyPDFDirectoryLoader
+
+from ai_document_search_backend.utils.pdf_pages import iter_pdf_pages, list_pdf_files
+from ai_document_search_backend.utils.relative_path_from_file import relative_path_from_file
+
+PDF_DIR_PATH = relative_path_from_file(__file__, "../../data/pdfs/")
+METADATA_PATH = relative_path_from_file(__file__, "../../data/clean_data.csv")
+
+MAX_WORKERS = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+METADATA_PROPERTIES = [
+    "link",
+    "shortname",
+    "isin",
+    "issuer_name",
+    "filename",
+    "industry",
+    "risk_type",
+    "green",
+]
+
+
+def iter_sequential(df: pd.DataFrame) -> Iterator[dict]:
+    documents = PyPDFDirectoryLoader(PDF_DIR_PATH).load()
+    for doc in documents:
+        if doc.page_content == "":
+            continue
+        metadata_row = df[df["filename"] == Path(doc.metadata["source"]).name]
+        yield {
+            "text": doc.page_content,
+            "page": doc.metadata["page"] + 1,
+            **{prop: metadata_row[prop].values[0] for prop in METADATA_PROPERTIES},
+        }
+
+
+def iter_parallel(df: pd.DataFrame) -> Iterator[dict]:
+    metadata_by_filename = df.set_index("filename", drop=False)[METADATA_PROPERTIES].to_dict(
+        "index"
+    )
+    for pdf_page in iter_pdf_pages(list_pdf_files(PDF_DIR_PATH), max_workers=MAX_WORKERS):
+        if pdf_page.text == "":
+            continue
+        yield {
+            "text": pdf_page.text,
+            "page": pdf_page.page,
+            **metadata_by_filename[Path(pdf_page.source).name],
+        }
+
+
+if __name__ == "__main__":
+    df = pd.read_csv(METADATA_PATH)
+    print(f"Number of PDFs: {len(list_pdf_files(PDF_DIR_PATH))}")
+    for name, iter_pages in [("sequential", iter_sequential), ("parallel", iter_parallel)]:
+        start = time.perf_counter()
+        number_of_pages = sum(1 for _ in iter_pages(df))
+        duration = time.perf_counter() - start
+        print(
+            f"{name}: {number_of_pages} pages in {duration:.2f} s, "
+            f"{number_of_pages / duration:.1f} pages/s"
+        )
@@ -0,0 +1,31 @@
+import logging
+
+from dependency_injector.wiring import Provide, inject
+
+from ai_document_search_backend.container import Container
+from ai_document_search_backend.database_providers.cosmos_conversation_database import (
+    CosmosConversationDatabase,
+)
+
+# Rewrites the conversations stored in Cosmos DB before the compact format was introduced.
+# The conversations are read in both formats, so the server can keep running meanwhile.
+# Cosmos DB is used whichever conversation database is configured for the server.
+
+
+@inject
+def main(
+    conversation_database: CosmosConversationDatabase = Provide[
+        Container.cosmos_conversation_database
+    ],
+) -> None:
+    compacted = conversation_database.compact_conversations()
+    logging.info(f"Compacted {compacted} conversations")
+
+
+if __name__ == "__main__":
+    container = Container()
+    container.init_resources()
+    container.wire(modules=[__name__])
+
+    logging.basicConfig(level=logging.INFO)
+    main()
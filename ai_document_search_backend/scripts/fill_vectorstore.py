@@ -1,4 +1,5 @@
 import logging
+import sys
 
 from dependency_injector.wiring import Provide, inject
 
@@ -11,12 +12,23 @@ from ai_document_search_backend.utils.relative_path_from_file import (
 PDF_DIR_PATH = relative_path_from_file(__file__, "../../data/pdfs/")
 METADATA_PATH = relative_path_from_file(__file__, "../../data/clean_data.csv")
 
+# By default, only the new and changed pages are stored and the removed pages are deleted,
+# so the chatbot keeps answering during the update.
+# With --full, the schema is deleted and all pages are stored and vectorized again.
+# With --new-version, all pages are stored in a new version of the class, which the chatbot
+# switches to once it is validated, so the chatbot keeps answering also during a full reload.
+FULL = "--full" in sys.argv[1:]
+NEW_VERSION = "--new-version" in sys.argv[1:]
+
 
 @inject
 def main(chatbot_service: ChatbotService = Provide[Container.chatbot_service]) -> None:
-    chatbot_service.delete_schema()
-
-    chatbot_service.store(PDF_DIR_PATH, METADATA_PATH)
+    if NEW_VERSION:
+        chatbot_service.store_new_version(PDF_DIR_PATH, METADATA_PATH)
+    else:
+        if FULL:
+            chatbot_service.delete_schema()
+        chatbot_service.store(PDF_DIR_PATH, METADATA_PATH, incremental=not FULL)
 
     chatbot_service.answer("What is the Loan to value ratio?", [], [])
 
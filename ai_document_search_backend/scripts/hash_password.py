@@ -0,0 +1,11 @@
+import getpass
+
+from passlib.context import CryptContext
+
+# Prints the bcrypt hash of a password, which can be used as AUTH_HASHED_PASSWORD
+# instead of AUTH_PASSWORD, so that the password is not hashed when the server starts.
+
+if __name__ == "__main__":
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    password = getpass.getpass("Password: ")
+    print(pwd_context.hash(password))
@@ -0,0 +1,27 @@
+import logging
+
+from dependency_injector.wiring import Provide, inject
+
+from ai_document_search_backend.container import Container
+from ai_document_search_backend.database_providers.cosmos_clients import CosmosClients
+
+# Creates the Cosmos DB database and container if they do not exist yet,
+# so that the server can be started with cosmos.provision_on_startup set to false.
+
+
+@inject
+def main(
+    cosmos_clients: CosmosClients = Provide[Container.cosmos_clients],
+    offer_throughput: int = Provide[Container.config.cosmos.offer_throughput],
+) -> None:
+    cosmos_clients.provision(offer_throughput)
+    logging.info(f"Cosmos DB database {cosmos_clients.db_name} is provisioned")
+
+
+if __name__ == "__main__":
+    container = Container()
+    container.init_resources()
+    container.wire(modules=[__name__])
+
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,69 @@
+"""
+Runs the server with stubbed backends for load testing the concurrency of the /chatbot endpoint.
+
+The chatbot service waits for a fixed time instead of calling Weaviate and OpenAI,
+and the conversations are kept in memory instead of Cosmos DB.
+
+Usage: python ai_document_search_backend/scripts/run_stubbed_server.py [async|threadpool]
+
+- async: the stub waits without blocking the event loop, like the real asynchronous chatbot service
+- threadpool: the stub blocks a worker thread for the whole time, like a synchronous endpoint
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import uvicorn
+from dependency_injector import providers
+
+from ai_document_search_backend.application import app
+from ai_document_search_backend.database_providers.conversation_database import Source
+from ai_document_search_backend.services.chatbot_service import ChatbotAnswer, Exchange, Filter
+
+MODE = sys.argv[1] if len(sys.argv) > 1 else "async"
+LATENCY_SEC = float(os.getenv("STUB_LATENCY_SEC", "2"))
+
+STUB_ANSWER = ChatbotAnswer(
+    text="The loan to value ratio must not exceed 80 %.",
+    sources=[
+        Source(
+            isin="NO1111111111",
+            shortname="Bond 2021",
+            link="https://www.example.com/bond1.pdf",
+            page=1,
+            certainty=0.9,
+            distance=0.1,
+        )
+    ],
+)
+
+
+class StubChatbotService:
+    max_history_length = 4
+
+    def warm_up(self) -> None:
+        pass
+
+    def answer(
+        self, question: str, chat_history: list[Exchange], filters: list[Filter]
+    ) -> ChatbotAnswer:
+        time.sleep(LATENCY_SEC)
+        return STUB_ANSWER
+
+    async def aanswer(
+        self, question: str, chat_history: list[Exchange], filters: list[Filter]
+    ) -> ChatbotAnswer:
+        if MODE == "threadpool":
+            return await asyncio.to_thread(self.answer, question, chat_history, filters)
+        await asyncio.sleep(LATENCY_SEC)
+        return STUB_ANSWER
+
+
+if __name__ == "__main__":
+    app.container.chatbot_service.override(providers.Object(StubChatbotService()))
+    app.container.config.conversation.database.from_value("in_memory")
+
+    print(f"Running stubbed server in {MODE} mode with {LATENCY_SEC} s chatbot latency")
+    uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Union
 
@@ -7,6 +8,7 @@ from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from ai_document_search_backend.services.base_service import BaseService
+from ai_document_search_backend.utils.lru_cache import LRUCache
 
 
 class Token(BaseModel):
@@ -33,7 +35,10 @@ class AuthService(BaseService):
         access_token_expire_minutes: int,
         secret_key: str,
         username: str,
-        password: str,
+        password: Optional[str] = None,
+        hashed_password: Optional[str] = None,
+        token_cache_size: int = 1000,
+        token_cache_ttl_sec: float = 300,
     ) -> None:
         self.algorithm = algorithm
         self.access_token_expire_minutes = access_token_expire_minutes
@@ -41,13 +46,23 @@ class AuthService(BaseService):
 
         self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+        if hashed_password is None:
+            if password is None:
+                raise ValueError("Either password or hashed_password must be set")
+            hashed_password = self.__get_password_hash(password)
+
         self.users_db = {
             username: {
                 "username": username,
-                "hashed_password": self.__get_password_hash(password),
+                "hashed_password": hashed_password,
             }
         }
 
+        # Users of already validated tokens, so that a token is decoded only once.
+        self.token_cache: LRUCache[UserInDB] = LRUCache(
+            max_size=token_cache_size, ttl_sec=token_cache_ttl_sec
+        )
+
         super().__init__()
 
     def authenticate_user(self, username: str, password: str) -> Union[Optional[UserInDB], bool]:
@@ -68,6 +83,10 @@ class AuthService(BaseService):
         return Token(access_token=encoded_jwt, token_type="bearer")
 
     def get_current_user(self, token: str) -> User:
+        cached_user = self.token_cache.get(token)
+        if cached_user is not None:
+            return cached_user
+
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -84,6 +103,10 @@ class AuthService(BaseService):
         user = self.__get_user(username=token_data.username)
         if user is None:
             raise credentials_exception
+        # The token must not be served from the cache after it expires.
+        expires_at = payload.get("exp")
+        if expires_at is None or expires_at > time.time():
+            self.token_cache.set(token, user, expires_at=expires_at)
         return user
 
     def __get_user(self, username: str) -> Optional[UserInDB]:
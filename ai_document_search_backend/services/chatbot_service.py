@@ -1,20 +1,61 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
 from pathlib import Path
+from typing import AsyncIterator, Literal, Optional, Union
 
+import numpy as np
 import pandas as pd
 import weaviate
 from langchain import PromptTemplate
-from langchain.chains import ConversationalRetrievalChain
+from langchain.callbacks import AsyncIteratorCallbackHandler
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain.chains import LLMChain
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.chains.question_answering import load_qa_chain
 from langchain.chat_models import ChatOpenAI
-from langchain.document_loaders import PyPDFDirectoryLoader
-from langchain.vectorstores import Weaviate
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
 from pydantic import BaseModel
+from weaviate.util import generate_uuid5
 
 from ai_document_search_backend.database_providers.conversation_database import (
     Source,
 )
+from ai_document_search_backend.database_providers.vector_index import VectorIndex
+from ai_document_search_backend.database_providers.weaviate_vector_index import (
+    WeaviateVectorIndex,
+)
 from ai_document_search_backend.services.base_service import BaseService
-from ai_document_search_backend.utils.filters import construct_and_filter, Filter
+from ai_document_search_backend.utils.answer_cache import (
+    AnswerCache,
+    normalize_question,
+)
+from ai_document_search_backend.utils.embeddings import CachedEmbeddings
+from ai_document_search_backend.utils.etag import compute_etag
+from ai_document_search_backend.utils.filter_index import FilterIndex
+from ai_document_search_backend.utils.filters import (
+    construct_and_filter,
+    construct_object_ids_filter,
+    Filter,
+    normalize_filters,
+)
 from ai_document_search_backend.utils.get_chat_history import get_chat_history
+from ai_document_search_backend.utils.pdf_pages import (
+    iter_pdf_pages,
+    list_pdf_files,
+    PdfPage,
+)
+from ai_document_search_backend.utils.stage_timer import StageTimer
+from ai_document_search_backend.utils.text_chunks import TextChunker
+from ai_document_search_backend.utils.standalone_question import is_standalone_question
 
 QUESTION_PROMPT = PromptTemplate.from_template(
     """Answer the question using the pages from different documents given below, or using your own knowledge.
@@ -37,17 +78,28 @@ Page number: {page}
 Page content: {page_content}
 """
 DOCUMENT_PROMPT = PromptTemplate(
-    input_variables=["isin", "shortname", "page", "page_content"], template=document_prompt_template
+    input_variables=["isin", "shortname", "page", "page_content"],
+    template=document_prompt_template,
 )
 
 Exchange = tuple[str, str]
 
+# maximum number of distinct values returned for each filter
+MAX_FILTER_VALUES = 10000
+# The largest number of ids searched as an allow-list instead of filtering by the properties
+MAX_ALLOW_LIST_OBJECT_IDS = 1000
+
 
 class ChatbotAnswer(BaseModel):
     text: str
     sources: list[Source]
 
 
+class ChatbotStreamEvent(BaseModel):
+    event: Literal["sources", "token", "answer"]
+    data: Union[list[Source], str, ChatbotAnswer]
+
+
 class Filters(BaseModel):
     isin: list[str]
     issuer_name: list[str]
@@ -57,6 +109,38 @@ class Filters(BaseModel):
     green: list[str]
 
 
+class CachedFilters(BaseModel):
+    filters: Filters
+    etag: str
+    created_at: float
+    # version of the stored documents the filters were read from
+    corpus_version: str = ""
+
+
+class IndexManifest(BaseModel):
+    """The ids of the objects stored in the vector index (the Weaviate class)"""
+
+    class_name: str
+    object_ids: list[str]
+    # filter values and object ids of each stored document,
+    # None in the manifests written without them
+    documents: Optional[list[dict]] = None
+
+
+class NoDocumentsRetriever(BaseRetriever):
+    """Used instead of searching the vector index when no documents match the filters"""
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return []
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> list[Document]:
+        return []
+
+
 class ChatbotError(Exception):
     def __init__(self, message: str):
         self.message = message
@@ -66,7 +150,7 @@ class ChatbotService(BaseService):
     def __init__(
         self,
         *,
-        weaviate_client: weaviate.Client,
+        weaviate_client: Optional[weaviate.Client],
         openai_api_key: str,
         question_answering_model: str,
         condense_question_model: str,
@@ -75,16 +159,82 @@ class ChatbotService(BaseService):
         max_history_length: int = 4,
         verbose: bool = False,
         temperature: float = 0,
+        max_concurrent_questions: int = 100,
+        filters_cache_ttl_sec: float = 3600,
+        filters_cache_path: Optional[str] = None,
+        answer_cache: Optional[AnswerCache[ChatbotAnswer]] = None,
+        detect_standalone_questions: bool = True,
+        speculative_retrieval: bool = True,
+        ingestion_max_workers: Optional[int] = None,
+        index_manifest_path: Optional[str] = None,
+        class_refresh_sec: float = 60,
+        min_object_count_ratio: float = 0.9,
+        validation_questions: Optional[list[str]] = None,
+        embeddings: Optional[Embeddings] = None,
+        embedding_batch_size: int = 64,
+        vector_index: Optional[VectorIndex] = None,
+        query_embeddings: Optional[Embeddings] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: int = 0,
+        chunk_encoding: str = "cl100k_base",
     ):
+        if weaviate_client is None and vector_index is None:
+            raise ValueError("Either a Weaviate client or a vector index is required")
         self.client = weaviate_client
         self.question_answering_model = question_answering_model
         self.condense_question_model = condense_question_model
         self.openai_api_key = openai_api_key
+        # The active class, either the base class or one of its versions.
         self.weaviate_class_name = weaviate_class_name
+        self.base_class_name = weaviate_class_name
+        self.alias_class_name = f"{weaviate_class_name}Alias"
+        self.alias_object_id = generate_uuid5(weaviate_class_name, self.alias_class_name)
         self.num_sources = num_sources
         self.max_history_length = max_history_length
         self.verbose = verbose
         self.temperature = temperature
+        self.max_concurrent_questions = max_concurrent_questions
+        self.filters_cache_ttl_sec = filters_cache_ttl_sec
+        self.filters_cache_path = filters_cache_path
+        self.detect_standalone_questions = detect_standalone_questions
+        self.speculative_retrieval = speculative_retrieval
+        self.ingestion_max_workers = ingestion_max_workers
+        self.index_manifest_path = index_manifest_path
+        # None = each page is stored as one object, otherwise the long pages are split
+        self.text_chunker = (
+            TextChunker(chunk_size, chunk_overlap, encoding_name=chunk_encoding)
+            if chunk_size is not None
+            else None
+        )
+        self.class_refresh_sec = class_refresh_sec
+        self.min_object_count_ratio = min_object_count_ratio
+        self.validation_questions = validation_questions or []
+        # None = the pages and the questions are vectorized by Weaviate (text2vec-openai),
+        # otherwise their vectors are computed by these embeddings and sent to Weaviate.
+        self.embeddings = embeddings
+        self.embedding_batch_size = embedding_batch_size
+        # Vectorize the questions searched in Weaviate, e.g. cached OpenAI embeddings of the model
+        # used by text2vec-openai. None = the same as the pages.
+        self.query_embeddings = query_embeddings
+        # None = the documents are stored in Weaviate, in a class per version,
+        # otherwise in this index (e.g. a local one).
+        self.local_vector_index = vector_index
+
+        self.active_class_checked_at = 0.0
+        self.active_class_lock = threading.Lock()
+
+        self.cached_filters: Optional[CachedFilters] = None
+        self.cached_filters_lock = threading.Lock()
+
+        # (modification time of the index manifest, its class name, index of its documents)
+        self.document_filter_index: Optional[tuple[int, str, Optional[FilterIndex]]] = None
+
+        # Answers of the standalone questions, disabled by default.
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+
+        # Created lazily because a semaphore belongs to the event loop it is first used in.
+        self.question_semaphore: Optional[asyncio.Semaphore] = None
+        self.question_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
 
         self.text_key = "text"
         self.custom_metadata_properties = [
@@ -98,224 +248,732 @@ class ChatbotService(BaseService):
             "green",
         ]
 
-        super().__init__()
-
-    def store(self, pdf_dir_path: str, metadata_path: str) -> None:
-        """Store the documents in the vectorstore"""
-
-        self.logger.info("Loading PDFs")
-        loader = PyPDFDirectoryLoader(pdf_dir_path)
-        documents = loader.load()
-        if len(documents) == 0:
-            raise ValueError(f"No PDFs found in {pdf_dir_path}")
+        # The vectorstore, the LLM wrappers and the chains that do not depend on the request
+        # are created once and reused by all requests served by this instance.
+        self.vector_index = vector_index or self.__create_weaviate_index(self.weaviate_class_name)
+        self.vectorstore = self.vector_index.as_vectorstore()
+        self.question_answering_llm = ChatOpenAI(
+            model=self.question_answering_model,
+            openai_api_key=self.openai_api_key,
+            temperature=self.temperature,
+        )
+        self.condense_question_llm = ChatOpenAI(
+            model=self.condense_question_model,
+            openai_api_key=self.openai_api_key,
+            temperature=self.temperature,
+        )
+        self.combine_docs_chain = load_qa_chain(
+            self.question_answering_llm,
+            chain_type="stuff",
+            verbose=self.verbose,
+            prompt=QUESTION_PROMPT,
+            document_prompt=DOCUMENT_PROMPT,
+        )
+        # Used only by the streaming endpoint, the tokens are sent to its callback handler.
+        self.streaming_question_answering_llm = ChatOpenAI(
+            model=self.question_answering_model,
+            openai_api_key=self.openai_api_key,
+            temperature=self.temperature,
+            streaming=True,
+        )
+        self.streaming_combine_docs_chain = load_qa_chain(
+            self.streaming_question_answering_llm,
+            chain_type="stuff",
+            verbose=self.verbose,
+            prompt=QUESTION_PROMPT,
+            document_prompt=DOCUMENT_PROMPT,
+        )
+        self.question_generator = LLMChain(
+            llm=self.condense_question_llm,
+            prompt=CONDENSE_QUESTION_PROMPT,
+            verbose=self.verbose,
+        )
 
-        df = pd.read_csv(metadata_path)
-        pdf_page_objects = []
-        for doc in documents:
-            text = doc.page_content
-            if text == "":
-                continue
-            pdf_page_object = {
-                self.text_key: text,
-                # PyPDFDirectoryLoader uses zero-based indexing, we want one-based indexing
-                "page": doc.metadata["page"] + 1,
-                "source": doc.metadata["source"],
-            }
-            filename = Path(doc.metadata["source"]).name
-            metadata_row = df[df["filename"] == filename]
-            for prop in self.custom_metadata_properties:
-                pdf_page_object[prop] = metadata_row[prop].values[0]
-            pdf_page_objects.append(pdf_page_object)
-
-        self.logger.info(f"Storing {len(pdf_page_objects)} objects in Weaviate")
-
-        if not self.client.schema.exists(self.weaviate_class_name):
-            self.logger.info(f"Creating class {self.weaviate_class_name}")
-            class_obj = {
-                "class": self.weaviate_class_name,
-                "properties": [
-                    {
-                        "name": self.text_key,
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": False,
-                            }
-                        },
-                    },
-                    {
-                        "name": "page",
-                        "dataType": ["number"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "source",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "link",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "shortname",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "isin",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "issuer_name",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "filename",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "industry",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "risk_type",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                    {
-                        "name": "green",
-                        "dataType": ["text"],
-                        "moduleConfig": {
-                            "text2vec-openai": {
-                                "skip": False,
-                                "vectorizePropertyName": True,
-                            }
-                        },
-                    },
-                ],
-                "vectorizer": "text2vec-openai",
-                "moduleConfig": {
-                    "text2vec-openai": {
-                        "model": "ada",
-                        "modelVersion": "002",
-                        "type": "text",
-                        "vectorizeClassName": False,
-                    },
-                },
-            }
-            self.client.schema.create_class(class_obj)
-
-        self.client.batch.configure(batch_size=100)
-        with self.client.batch as batch:
-            for pdf_page_object in pdf_page_objects:
-                batch.add_data_object(
-                    data_object=pdf_page_object,
-                    class_name=self.weaviate_class_name,
-                )
+        super().__init__()
 
-        self.logger.info(
-            f"Number of {self.weaviate_class_name} objects in Weaviate: {self.__get_number_of_objects()}"
+    def warm_up(self) -> None:
+        """Open the connections to the vectorstore so that the first request is not slowed down"""
+
+        if self.local_vector_index is not None:
+            self.refresh_active_class()
+            self.get_cached_filters()
+            self.logger.info("Chatbot service is warmed up")
+            return
+        if not self.client.is_ready():
+            raise ChatbotError("Weaviate is not ready")
+        self.refresh_active_class()
+        self.client.schema.exists(self.weaviate_class_name)
+        self.get_cached_filters()
+        self.logger.info("Chatbot service is warmed up")
+
+    def store(self, pdf_dir_path: str, metadata_path: str, incremental: bool = False) -> None:
+        """
+        Store the documents in the vectorstore.
+        In the incremental mode, only the new and changed pages are stored
+        and the pages that are no longer in the documents are deleted.
+        The documents are stored in the active class version, the one the alias points to.
+        """
+
+        self.refresh_active_class()
+        if self.__store(pdf_dir_path, metadata_path, self.vector_index, incremental):
+            self.invalidate_caches()
+
+    def store_new_version(self, pdf_dir_path: str, metadata_path: str) -> str:
+        """
+        Store the documents in a new version of the class and switch to it once it is validated.
+        The active version keeps answering until then. All classes except the new version
+        and the previous one are deleted afterwards. Return the name of the new class.
+        A local vector index is replaced by the new documents at once when they are saved.
+        """
+
+        if self.local_vector_index is not None:
+            self.vector_index.delete_all()
+            self.__store(pdf_dir_path, metadata_path, self.vector_index, incremental=False)
+            self.invalidate_caches()
+            return self.vector_index.name
+        self.refresh_active_class()
+        previous_class_name = self.weaviate_class_name
+        class_name = f"{self.base_class_name}_v{self.__get_next_class_version()}"
+        self.logger.info(f"Storing a new version of the documents in class {class_name}")
+        self.__store(
+            pdf_dir_path, metadata_path, self.__create_weaviate_index(class_name), incremental=False
         )
+        try:
+            self.__validate_class(class_name, previous_class_name)
+        except ChatbotError:
+            self.client.schema.delete_class(class_name)
+            raise
+        self.__set_alias_target(class_name)
+        self.__switch_class(class_name)
+        self.__delete_old_classes(keep={class_name, previous_class_name})
+        return class_name
+
+    def refresh_active_class(self) -> None:
+        """
+        Switch to the class version the alias points to, if it was changed by another process.
+        A local vector index is reloaded if it was saved by another process.
+        """
+
+        self.active_class_checked_at = time.time()
+        if self.local_vector_index is not None:
+            if self.vector_index.refresh():
+                self.invalidate_caches()
+            return
+        try:
+            class_name = self.__get_alias_target() or self.base_class_name
+        except Exception as e:
+            self.logger.warning(
+                f"Could not get the active class, keeping {self.weaviate_class_name}: {e}"
+            )
+            return
+        if class_name != self.weaviate_class_name:
+            self.__switch_class(class_name)
 
     def answer(
         self, question: str, chat_history: list[Exchange], filters: list[Filter]
     ) -> ChatbotAnswer:
         """Answer the question"""
 
-        vectorstore = Weaviate(
+        self.logger.info(f"Answering question: {question}")
+        if self.__is_active_class_expired():
+            self.refresh_active_class()
+        timer = StageTimer()
+        try:
+            with timer.measure("condense"):
+                standalone_question = self.__condense_question(question, chat_history)
+            cache_scope = self.__get_answer_cache_scope(filters)
+            with timer.measure("cache"):
+                cached_answer = self.answer_cache.get(standalone_question, cache_scope)
+            if cached_answer is not None:
+                self.logger.info(f"Answer cache hit: {self.answer_cache.stats}")
+                self.logger.info(f"Latency breakdown: {timer}")
+                return cached_answer
+            with timer.measure("retrieve"):
+                source_documents = self.__create_retriever(filters).get_relevant_documents(
+                    standalone_question
+                )
+            with timer.measure("answer"):
+                answer_text = self.combine_docs_chain.run(
+                    input_documents=source_documents, question=standalone_question
+                )
+        except Exception as e:
+            self.logger.error(f"Error while answering question: {e}")
+            raise ChatbotError(f"Error while answering question: {e}")
+        answer = self.__to_chatbot_answer(answer_text, source_documents)
+        self.answer_cache.set(standalone_question, cache_scope, answer)
+        self.__log_query_embeddings_stats()
+        self.logger.info(f"Latency breakdown: {timer}")
+        return answer
+
+    async def aanswer(
+        self, question: str, chat_history: list[Exchange], filters: list[Filter]
+    ) -> ChatbotAnswer:
+        """Answer the question without blocking the event loop"""
+
+        async with self.__get_question_semaphore():
+            self.logger.info(f"Answering question: {question}")
+            if self.__is_active_class_expired():
+                await asyncio.to_thread(self.refresh_active_class)
+            timer = StageTimer()
+            cache_scope = self.__get_answer_cache_scope(filters)
+            try:
+                (
+                    standalone_question,
+                    cached_answer,
+                    source_documents,
+                ) = await self.__acondense_and_retrieve(
+                    question, chat_history, filters, cache_scope, timer
+                )
+                if cached_answer is not None:
+                    self.logger.info(f"Answer cache hit: {self.answer_cache.stats}")
+                    self.logger.info(f"Latency breakdown: {timer}")
+                    return cached_answer
+                with timer.measure("answer"):
+                    answer_text = await self.combine_docs_chain.arun(
+                        input_documents=source_documents, question=standalone_question
+                    )
+            except Exception as e:
+                self.logger.error(f"Error while answering question: {e}")
+                raise ChatbotError(f"Error while answering question: {e}")
+        answer = self.__to_chatbot_answer(answer_text, source_documents)
+        await self.answer_cache.aset(standalone_question, cache_scope, answer)
+        self.__log_query_embeddings_stats()
+        self.logger.info(f"Latency breakdown: {timer}")
+        return answer
+
+    async def astream_answer(
+        self, question: str, chat_history: list[Exchange], filters: list[Filter]
+    ) -> AsyncIterator[ChatbotStreamEvent]:
+        """
+        Answer the question step by step.
+        Yields the sources as soon as they are retrieved, then the tokens of the answer
+        as they are generated and finally the complete answer.
+        """
+
+        async with self.__get_question_semaphore():
+            self.logger.info(f"Answering question: {question}")
+            if self.__is_active_class_expired():
+                await asyncio.to_thread(self.refresh_active_class)
+            timer = StageTimer()
+            cache_scope = self.__get_answer_cache_scope(filters)
+            try:
+                (
+                    standalone_question,
+                    cached_answer,
+                    source_documents,
+                ) = await self.__acondense_and_retrieve(
+                    question, chat_history, filters, cache_scope, timer
+                )
+            except Exception as e:
+                self.logger.error(f"Error while answering question: {e}")
+                raise ChatbotError(f"Error while answering question: {e}")
+
+            if cached_answer is not None:
+                self.logger.info(f"Answer cache hit: {self.answer_cache.stats}")
+                self.logger.info(f"Latency breakdown: {timer}")
+                yield ChatbotStreamEvent(event="sources", data=cached_answer.sources)
+                yield ChatbotStreamEvent(event="token", data=cached_answer.text)
+                yield ChatbotStreamEvent(event="answer", data=cached_answer)
+                return
+
+            sources = self.__to_sources(source_documents)
+            yield ChatbotStreamEvent(event="sources", data=sources)
+
+            callback_handler = AsyncIteratorCallbackHandler()
+            answer_task = asyncio.create_task(
+                self.streaming_combine_docs_chain.arun(
+                    input_documents=source_documents,
+                    question=standalone_question,
+                    callbacks=[callback_handler],
+                )
+            )
+            # Stop waiting for tokens also when the chain fails before the model is called.
+            answer_task.add_done_callback(lambda _: callback_handler.done.set())
+            try:
+                with timer.measure("answer"):
+                    async for token in callback_handler.aiter():
+                        yield ChatbotStreamEvent(event="token", data=token)
+                    answer_text = await answer_task
+            except Exception as e:
+                self.logger.error(f"Error while answering question: {e}")
+                raise ChatbotError(f"Error while answering question: {e}")
+            finally:
+                answer_task.cancel()
+
+        answer = self.__to_chatbot_answer(answer_text, source_documents)
+        await self.answer_cache.aset(standalone_question, cache_scope, answer)
+        self.__log_query_embeddings_stats()
+        self.logger.info(f"Latency breakdown: {timer}")
+        yield ChatbotStreamEvent(event="answer", data=answer)
+
+    def delete_schema(self) -> None:
+        """Delete the schema"""
+
+        if self.local_vector_index is not None:
+            self.vector_index.delete_all()
+            self.vector_index.save()
+        else:
+            self.client.schema.delete_all()
+        if self.index_manifest_path is not None and os.path.exists(self.index_manifest_path):
+            os.remove(self.index_manifest_path)
+        if self.weaviate_class_name != self.base_class_name:
+            self.__switch_class(self.base_class_name)
+        self.invalidate_caches()
+
+    def get_filters(self) -> Filters:
+        return self.get_cached_filters().filters
+
+    def get_cached_filters(self) -> CachedFilters:
+        """Get the available filter values from memory, from the cache file or from Weaviate"""
+
+        corpus_version = self.__get_corpus_version()
+        with self.cached_filters_lock:
+            if self.cached_filters is None or self.__is_stale(self.cached_filters, corpus_version):
+                self.cached_filters = self.__load_filters_cache_file()
+            if self.cached_filters is None or self.__is_stale(self.cached_filters, corpus_version):
+                filters = self.__get_available_filters()
+                self.cached_filters = CachedFilters(
+                    filters=filters,
+                    etag=compute_etag(
+                        {"filters": filters.model_dump(), "corpus_version": corpus_version}
+                    ),
+                    created_at=time.time(),
+                    corpus_version=corpus_version,
+                )
+                self.__save_filters_cache_file(self.cached_filters)
+            return self.cached_filters
+
+    def invalidate_caches(self) -> None:
+        """Invalidate everything that depends on the stored documents"""
+
+        self.answer_cache.clear()
+        with self.cached_filters_lock:
+            self.cached_filters = None
+            if self.filters_cache_path is not None and os.path.exists(self.filters_cache_path):
+                os.remove(self.filters_cache_path)
+
+    def __create_weaviate_index(self, class_name: str) -> WeaviateVectorIndex:
+        return WeaviateVectorIndex(
             self.client,
-            index_name=self.weaviate_class_name,
-            by_text=True,
+            class_name=class_name,
             text_key=self.text_key,
             attributes=self.custom_metadata_properties + ["page"],
+            embeddings=self.embeddings,
+            query_embeddings=self.query_embeddings,
         )
-        question_answering_llm = ChatOpenAI(
-            model=self.question_answering_model,
-            openai_api_key=self.openai_api_key,
-            temperature=self.temperature,
-        )
-        condense_question_llm = ChatOpenAI(
-            model=self.condense_question_model,
-            openai_api_key=self.openai_api_key,
-            temperature=self.temperature,
+
+    def __is_active_class_expired(self) -> bool:
+        return time.time() - self.active_class_checked_at > self.class_refresh_sec
+
+    def __switch_class(self, class_name: str) -> None:
+        vector_index = self.__create_weaviate_index(class_name)
+        vectorstore = vector_index.as_vectorstore()
+        with self.active_class_lock:
+            self.weaviate_class_name = class_name
+            self.vector_index = vector_index
+            self.vectorstore = vectorstore
+        self.logger.info(f"Switched to class {class_name}")
+        self.invalidate_caches()
+
+    def __get_alias_target(self) -> Optional[str]:
+        """Get the name of the active class version, if any version was activated"""
+
+        alias = self.client.data_object.get_by_id(
+            self.alias_object_id, class_name=self.alias_class_name
         )
-        qa = ConversationalRetrievalChain.from_llm(
-            llm=question_answering_llm,
-            retriever=vectorstore.as_retriever(
-                search_kwargs={
-                    "additional": ["certainty", "distance"],
-                    "k": self.num_sources,
-                    "where_filter": construct_and_filter(filters),
+        return None if alias is None else alias["properties"]["class_name"]
+
+    def __set_alias_target(self, class_name: str) -> None:
+        if not self.client.schema.exists(self.alias_class_name):
+            self.client.schema.create_class(
+                {
+                    "class": self.alias_class_name,
+                    "properties": [{"name": "class_name", "dataType": ["text"]}],
+                    "vectorizer": "none",
                 }
-            ),
-            condense_question_llm=condense_question_llm,
-            get_chat_history=self.__get_chat_history,
-            combine_docs_chain_kwargs={
-                "prompt": QUESTION_PROMPT,
-                "document_prompt": DOCUMENT_PROMPT,
-            },
-            return_source_documents=True,
-            verbose=self.verbose,
+            )
+        data_object = {"class_name": class_name}
+        if self.client.data_object.exists(self.alias_object_id, class_name=self.alias_class_name):
+            self.client.data_object.replace(
+                data_object, self.alias_class_name, self.alias_object_id
+            )
+        else:
+            self.client.data_object.create(data_object, self.alias_class_name, self.alias_object_id)
+
+    def __get_class_versions(self) -> dict[int, str]:
+        pattern = re.compile(rf"^{re.escape(self.base_class_name)}_v(\d+)$")
+        versions = {}
+        for class_obj in self.client.schema.get()["classes"]:
+            match = pattern.match(class_obj["class"])
+            if match:
+                versions[int(match.group(1))] = class_obj["class"]
+        return versions
+
+    def __get_next_class_version(self) -> int:
+        return max(self.__get_class_versions().keys(), default=0) + 1
+
+    def __delete_old_classes(self, keep: set[str]) -> None:
+        """Delete the class versions and the unversioned base class, except the ones to keep"""
+
+        class_names = list(self.__get_class_versions().values())
+        if self.client.schema.exists(self.base_class_name):
+            class_names.append(self.base_class_name)
+        for class_name in class_names:
+            if class_name not in keep:
+                self.logger.info(f"Deleting class {class_name}")
+                self.client.schema.delete_class(class_name)
+
+    def __validate_class(self, class_name: str, previous_class_name: str) -> None:
+        """Check that the new class version can replace the previous one"""
+
+        vector_index = self.__create_weaviate_index(class_name)
+        number_of_objects = vector_index.count()
+        if number_of_objects == 0:
+            raise ChatbotError(f"Class {class_name} is empty")
+        if self.client.schema.exists(previous_class_name):
+            previous_number_of_objects = self.__create_weaviate_index(previous_class_name).count()
+            if number_of_objects < self.min_object_count_ratio * previous_number_of_objects:
+                raise ChatbotError(
+                    f"Class {class_name} has {number_of_objects} objects, "
+                    f"but {previous_class_name} has {previous_number_of_objects} objects"
+                )
+        vectorstore = vector_index.as_vectorstore()
+        for question in self.validation_questions:
+            if len(vectorstore.similarity_search(question, k=1)) == 0:
+                raise ChatbotError(f"No documents found in {class_name} for: {question}")
+        self.logger.info(f"Class {class_name} with {number_of_objects} objects is valid")
+
+    def __get_available_filters(self) -> Filters:
+        filter_properties = list(Filters.model_fields.keys())
+        try:
+            values = self.vector_index.get_property_values(filter_properties, MAX_FILTER_VALUES)
+        except ValueError as e:
+            raise ChatbotError(str(e))
+        return Filters(**values)
+
+    def __store(
+        self, pdf_dir_path: str, metadata_path: str, vector_index: VectorIndex, incremental: bool
+    ) -> bool:
+        """Store the documents in the index, return whether any objects were added or deleted"""
+
+        pdf_paths = list_pdf_files(pdf_dir_path)
+        if len(pdf_paths) == 0:
+            raise ValueError(f"No PDFs found in {pdf_dir_path}")
+        metadata_by_filename = self.__load_metadata(metadata_path)
+
+        try:
+            vector_index.create_if_not_exists()
+        except ValueError as e:
+            raise ChatbotError(str(e))
+
+        indexed_object_ids = self.__get_indexed_object_ids(vector_index) if incremental else set()
+
+        # The pages are stored while the remaining PDFs are still being parsed.
+        self.logger.info(f"Storing pages of {len(pdf_paths)} PDFs in {vector_index.name}")
+        object_ids: set[str] = set()
+        # filename -> filter values of the document
+        documents: dict[str, dict] = {}
+        # filename -> ids of the objects of the document
+        document_object_ids: dict[str, set[str]] = {}
+        number_of_added_objects = 0
+        # pages waiting to be vectorized and stored together
+        pending_objects: list[tuple[str, dict]] = []
+        pdf_pages = iter_pdf_pages(pdf_paths, max_workers=self.ingestion_max_workers)
+        if self.text_chunker is not None:
+            pdf_pages = self.text_chunker.iter_chunks(pdf_pages)
+        for pdf_page in pdf_pages:
+            if pdf_page.text == "":
+                continue
+            pdf_page_object = self.__to_pdf_page_object(pdf_page, metadata_by_filename)
+            object_id = self.__get_object_id(pdf_page_object, vector_index.name)
+            object_ids.add(object_id)
+            documents.setdefault(
+                pdf_page_object["filename"],
+                {prop: pdf_page_object[prop] for prop in Filters.model_fields},
+            )
+            document_object_ids.setdefault(pdf_page_object["filename"], set()).add(object_id)
+            if object_id in indexed_object_ids:
+                continue
+            pending_objects.append((object_id, pdf_page_object))
+            if len(pending_objects) >= self.embedding_batch_size:
+                vector_index.add_objects(pending_objects)
+                pending_objects = []
+            number_of_added_objects += 1
+        vector_index.add_objects(pending_objects)
+
+        removed_object_ids = indexed_object_ids - object_ids
+        vector_index.delete_objects(removed_object_ids)
+        vector_index.save()
+        for filename, document in documents.items():
+            document["object_ids"] = sorted(document_object_ids[filename])
+        self.__save_index_manifest(object_ids, vector_index.name, list(documents.values()))
+
+        self.logger.info(
+            f"Added {number_of_added_objects} objects, deleted {len(removed_object_ids)} objects, "
+            f"kept {len(object_ids) - number_of_added_objects} unchanged objects"
+        )
+        self.logger.info(f"Number of objects in {vector_index.name}: {vector_index.count()}")
+        return number_of_added_objects > 0 or len(removed_object_ids) > 0
+
+    def __get_object_id(self, pdf_page_object: dict, class_name: str) -> str:
+        """
+        The same page with the same content and metadata always gets the same id,
+        wherever the PDFs are stored, so the absolute source path is not hashed.
+        """
+
+        content = {key: value for key, value in pdf_page_object.items() if key != "source"}
+        content_hash = hashlib.sha256(
+            json.dumps(content, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return generate_uuid5(
+            f"{pdf_page_object['filename']}/{pdf_page_object['page']}/{content_hash}",
+            class_name,
         )
 
-        self.logger.info(f"Answering question: {question}")
+    def __get_indexed_object_ids(self, vector_index: VectorIndex) -> set[str]:
+        """Get the ids of the stored objects from the manifest, or from the index if it is outdated"""
+
+        manifest = self.__load_index_manifest()
+        if (
+            manifest is not None
+            and manifest.class_name == vector_index.name
+            and len(manifest.object_ids) == vector_index.count()
+        ):
+            return set(manifest.object_ids)
+        self.logger.info(f"Listing the ids of the objects in {vector_index.name}")
         try:
-            result = qa({"question": question, "chat_history": chat_history})
-        except Exception as e:
-            self.logger.error(f"Error while answering question: {e}")
-            raise ChatbotError(f"Error while answering question: {e}")
-        answer_text = result["answer"]
+            return vector_index.get_object_ids()
+        except ValueError as e:
+            raise ChatbotError(str(e))
+
+    def __load_index_manifest(self) -> Optional[IndexManifest]:
+        if self.index_manifest_path is None or not os.path.exists(self.index_manifest_path):
+            return None
+        try:
+            return IndexManifest.model_validate_json(Path(self.index_manifest_path).read_text())
+        except ValueError as e:
+            self.logger.warning(f"Ignoring invalid index manifest: {e}")
+            return None
+
+    def __save_index_manifest(
+        self, object_ids: set[str], class_name: str, documents: list[dict]
+    ) -> None:
+        if self.index_manifest_path is None:
+            return
+        manifest = IndexManifest(
+            class_name=class_name, object_ids=sorted(object_ids), documents=documents
+        )
+        Path(self.index_manifest_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(self.index_manifest_path).write_text(manifest.model_dump_json())
+
+    def __get_document_filter_index(self) -> Optional[FilterIndex]:
+        """
+        The filter values of the documents in the active index, from the index manifest,
+        reloaded when it is changed. None if they are not known.
+        """
+
+        modified_at = self.__get_index_manifest_modified_at()
+        if modified_at is None:
+            return None
+        cached = self.document_filter_index
+        if cached is None or cached[0] != modified_at:
+            manifest = self.__load_index_manifest()
+            class_name = manifest.class_name if manifest is not None else ""
+            filter_index = None
+            if manifest is not None and manifest.documents is not None:
+                filter_index = FilterIndex(manifest.documents)
+            cached = (modified_at, class_name, filter_index)
+            self.document_filter_index = cached
+        _, class_name, filter_index = cached
+        return filter_index if class_name == self.vector_index.name else None
+
+    def __get_index_manifest_modified_at(self) -> Optional[int]:
+        if self.index_manifest_path is None:
+            return None
+        try:
+            return os.stat(self.index_manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def __get_corpus_version(self) -> str:
+        """
+        Changes when the stored documents change: when the service switches to another class
+        or when the documents are stored again (also by another process, e.g. fill_vectorstore.py),
+        which rewrites the index manifest.
+        """
+
+        return f"{self.weaviate_class_name}@{self.__get_index_manifest_modified_at() or 0}"
+
+    def __load_metadata(self, metadata_path: str) -> dict[str, dict]:
+        df = pd.read_csv(metadata_path)
+        return df.set_index("filename", drop=False)[self.custom_metadata_properties].to_dict(
+            "index"
+        )
+
+    def __to_pdf_page_object(
+        self, pdf_page: PdfPage, metadata_by_filename: dict[str, dict]
+    ) -> dict:
+        filename = Path(pdf_page.source).name
+        if filename not in metadata_by_filename:
+            raise ValueError(f"No metadata found for {filename}")
+        return {
+            self.text_key: pdf_page.text,
+            "page": pdf_page.page,
+            "source": pdf_page.source,
+            **metadata_by_filename[filename],
+        }
+
+    def __is_stale(self, cached_filters: CachedFilters, corpus_version: str) -> bool:
+        """Expired, or read from other documents than the ones stored now"""
+
+        return (
+            time.time() - cached_filters.created_at > self.filters_cache_ttl_sec
+            or cached_filters.corpus_version != corpus_version
+        )
+
+    def __load_filters_cache_file(self) -> Optional[CachedFilters]:
+        if self.filters_cache_path is None or not os.path.exists(self.filters_cache_path):
+            return None
+        try:
+            return CachedFilters.model_validate_json(Path(self.filters_cache_path).read_text())
+        except ValueError as e:
+            self.logger.warning(f"Ignoring invalid filters cache file: {e}")
+            return None
+
+    def __save_filters_cache_file(self, cached_filters: CachedFilters) -> None:
+        if self.filters_cache_path is None:
+            return
+        Path(self.filters_cache_path).write_text(cached_filters.model_dump_json())
+
+    def __condense_question(self, question: str, chat_history: list[Exchange]) -> str:
+        """Create a standalone question from the question and the chat history"""
+
+        chat_history_str = self.__get_chat_history(chat_history)
+        if not self.__needs_condensing(question, chat_history_str):
+            return question
+        return self.question_generator.run(question=question, chat_history=chat_history_str)
+
+    async def __acondense_and_retrieve(
+        self,
+        question: str,
+        chat_history: list[Exchange],
+        filters: list[Filter],
+        cache_scope: str,
+        timer: StageTimer,
+    ) -> tuple[str, Optional[ChatbotAnswer], list[Document]]:
+        """
+        Get the standalone question and either its cached answer or the relevant documents.
+        While the question is being condensed, the documents for the original question are
+        retrieved speculatively and used if the standalone question turns out to be the same.
+        """
+
+        retriever = self.__create_retriever(filters)
+        chat_history_str = self.__get_chat_history(chat_history)
+        speculative_retrieval: Optional[asyncio.Task[list[Document]]] = None
+        try:
+            with timer.measure("condense"):
+                if self.__needs_condensing(question, chat_history_str):
+                    if self.speculative_retrieval:
+                        speculative_retrieval = asyncio.create_task(
+                            retriever.aget_relevant_documents(question)
+                        )
+                        # The result is not needed when the question changes, nor its error.
+                        speculative_retrieval.add_done_callback(
+                            lambda task: task.cancelled() or task.exception()
+                        )
+                    standalone_question = await self.question_generator.arun(
+                        question=question, chat_history=chat_history_str
+                    )
+                else:
+                    standalone_question = question
+            with timer.measure("cache"):
+                cached_answer = await self.answer_cache.aget(standalone_question, cache_scope)
+            if cached_answer is not None:
+                return standalone_question, cached_answer, []
+            with timer.measure("retrieve"):
+                if speculative_retrieval is not None and normalize_question(
+                    standalone_question
+                ) == normalize_question(question):
+                    self.logger.info("Using the speculatively retrieved documents")
+                    source_documents = await speculative_retrieval
+                else:
+                    source_documents = await retriever.aget_relevant_documents(standalone_question)
+            return standalone_question, None, source_documents
+        finally:
+            if speculative_retrieval is not None:
+                speculative_retrieval.cancel()
+
+    def __needs_condensing(self, question: str, chat_history_str: str) -> bool:
+        if not chat_history_str:
+            return False
+        if self.detect_standalone_questions and is_standalone_question(question):
+            self.logger.info("Skipping condensing of a standalone question")
+            return False
+        return True
+
+    def __get_answer_cache_scope(self, filters: list[Filter]) -> str:
+        """Everything except the question that the answer depends on"""
+
+        return json.dumps(
+            {
+                "filters": construct_and_filter(normalize_filters(filters)),
+                "corpus_version": self.__get_corpus_version(),
+                "num_sources": self.num_sources,
+                "question_answering_model": self.question_answering_model,
+                "temperature": self.temperature,
+            },
+            sort_keys=True,
+        )
+
+    def __create_retriever(self, filters: list[Filter]) -> BaseRetriever:
+        """
+        The filters are first matched against the documents in the index manifest.
+        When no document matches, nothing is searched. When the matching documents have
+        few objects in Weaviate, their ids are searched as an allow-list instead of
+        filtering all objects by the properties. Otherwise, and in a local index,
+        which filters by its own index of the properties, the filters are searched as they are.
+        """
+
+        where_filter = construct_and_filter(filters)
+        document_filter_index = self.__get_document_filter_index()
+        if document_filter_index is not None:
+            mask = document_filter_index.match(filters)
+            if mask is not None and not mask.any():
+                self.logger.info("No documents match the filters, skipping the retrieval")
+                return NoDocumentsRetriever()
+            if mask is not None and self.local_vector_index is None:
+                object_ids = self.__get_object_ids(document_filter_index, mask)
+                if object_ids is not None and len(object_ids) <= MAX_ALLOW_LIST_OBJECT_IDS:
+                    where_filter = construct_object_ids_filter(object_ids)
+        return self.vectorstore.as_retriever(
+            search_kwargs={
+                "additional": ["certainty", "distance"],
+                "k": self.num_sources,
+                "where_filter": where_filter,
+            }
+        )
+
+    @staticmethod
+    def __get_object_ids(document_filter_index: FilterIndex, mask: np.ndarray) -> Optional[list]:
+        """The ids of the objects of the matching documents, None if they are not known"""
+
+        object_ids = []
+        for row in np.flatnonzero(mask):
+            document_object_ids = document_filter_index.objects[row].get("object_ids")
+            if document_object_ids is None:
+                return None
+            object_ids.extend(document_object_ids)
+        return object_ids
+
+    def __to_chatbot_answer(
+        self, answer_text: str, source_documents: list[Document]
+    ) -> ChatbotAnswer:
         self.logger.info(f"Answer: {answer_text}")
-        sources = [
+        return ChatbotAnswer(text=answer_text, sources=self.__to_sources(source_documents))
+
+    @staticmethod
+    def __to_sources(source_documents: list[Document]) -> list[Source]:
+        return [
             Source(
                 isin=source.metadata["isin"],
                 shortname=source.metadata["shortname"],
@@ -324,45 +982,21 @@ class ChatbotService(BaseService):
                 certainty=round(source.metadata["_additional"]["certainty"], 3),
                 distance=round(source.metadata["_additional"]["distance"], 3),
             )
-            for source in result["source_documents"]
+            for source in source_documents
         ]
 
-        return ChatbotAnswer(text=answer_text, sources=sources)
+    def __log_query_embeddings_stats(self) -> None:
+        """Logged after each retrieval, like the answer cache stats after each cache hit"""
 
-    def delete_schema(self) -> None:
-        """Delete the schema"""
-
-        self.client.schema.delete_all()
+        if isinstance(self.query_embeddings, CachedEmbeddings):
+            self.logger.info(f"Query embeddings cache: {self.query_embeddings.stats}")
 
-    def get_filters(self) -> Filters:
-        return Filters(
-            isin=self.__get_available_values("isin"),
-            issuer_name=self.__get_available_values("issuer_name"),
-            filename=self.__get_available_values("filename"),
-            industry=self.__get_available_values("industry"),
-            risk_type=self.__get_available_values("risk_type"),
-            green=self.__get_available_values("green"),
-        )
-
-    def __get_number_of_objects(self) -> int:
-        result = self.client.query.aggregate(self.weaviate_class_name).with_meta_count().do()
-        number_of_objects = result["data"]["Aggregate"][self.weaviate_class_name][0]["meta"][
-            "count"
-        ]
-        return number_of_objects
-
-    def __get_available_values(self, property_name: str) -> list[str]:
-        result = (
-            self.client.query.aggregate(self.weaviate_class_name)
-            .with_group_by_filter(property_name)
-            .with_fields("groupedBy { path value }")
-            .do()
-        )
-        available_values = [
-            group["groupedBy"]["value"]
-            for group in result["data"]["Aggregate"][self.weaviate_class_name]
-        ]
-        return available_values
+    def __get_question_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self.question_semaphore is None or self.question_semaphore_loop is not loop:
+            self.question_semaphore = asyncio.Semaphore(self.max_concurrent_questions)
+            self.question_semaphore_loop = loop
+        return self.question_semaphore
 
     def __get_chat_history(self, inputs: list[tuple[str, str]]) -> str:
         return get_chat_history(inputs, self.max_history_length)
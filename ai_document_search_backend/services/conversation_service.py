@@ -1,20 +1,37 @@
+import asyncio
 from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
 
 from ai_document_search_backend.database_providers.conversation_database import (
     Conversation,
     ConversationDatabase,
+    ConversationWindow,
     Message,
 )
 from ai_document_search_backend.services.base_service import BaseService
+from ai_document_search_backend.utils.background_jobs import BackgroundJob, BackgroundJobs
+from ai_document_search_backend.utils.conversation_write_queue import ConversationWriteQueue
 
 
 class ConversationService(BaseService):
-    def __init__(self, conversation_database: ConversationDatabase):
+    def __init__(
+        self,
+        conversation_database: ConversationDatabase,
+        chunk_size: int = 100,
+        background_jobs: Optional[BackgroundJobs] = None,
+        write_queue: Optional[ConversationWriteQueue] = None,
+    ):
         self.conversation_database = conversation_database
+        # number of messages loaded at a time when the messages are streamed
+        self.chunk_size = chunk_size
+        self.background_jobs = background_jobs if background_jobs is not None else BackgroundJobs()
+        # when set, the exchanges are added to the conversations in the background
+        self.write_queue = write_queue
 
         super().__init__()
 
     def get_latest_conversation(self, username: str) -> Conversation:
+        self.__wait_for_queued_exchanges(username)
         conversation = self.conversation_database.get_latest_conversation(username)
         if conversation is None:
             conversation = self.create_new_conversation(username)
@@ -25,15 +42,139 @@ class ConversationService(BaseService):
         self.conversation_database.add_conversation(username, new_conversation)
         return new_conversation
 
+    def get_latest_conversation_window(
+        self, username: str, max_messages: Optional[int] = None, before: Optional[int] = None
+    ) -> ConversationWindow:
+        """Get the last messages of the latest conversation, create it if there is none"""
+
+        self.__wait_for_queued_exchanges(username)
+        conversation_id = self.conversation_database.get_latest_conversation_id(username)
+        if conversation_id is not None:
+            window = self.conversation_database.get_conversation_window(
+                username, conversation_id, max_messages, before
+            )
+            if window is not None:
+                return window
+        new_conversation = Conversation(created_at=self.__get_current_time(), messages=[])
+        conversation_id = self.conversation_database.add_conversation(username, new_conversation)
+        return self.__to_empty_window(conversation_id, new_conversation)
+
     def add_to_latest_conversation(
         self, username: str, user_message: Message, bot_message: Message
     ) -> None:
         self.conversation_database.add_to_latest_conversation(username, user_message, bot_message)
 
+    def add_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> None:
+        if self.write_queue is not None and self.write_queue.enqueue(
+            username, conversation_id, user_message, bot_message
+        ):
+            return
+        self.conversation_database.add_to_conversation(
+            username, conversation_id, user_message, bot_message
+        )
+
     def clear_conversations(self, username: str) -> str:
         self.conversation_database.clear_conversations(username)
         return f"Conversations deleted for user {username}"
 
+    def clear_conversations_in_background(self, username: str) -> BackgroundJob:
+        """Start deleting the conversations and return the job that can be polled for its status"""
+
+        return self.background_jobs.submit(
+            username, lambda: self.conversation_database.clear_conversations(username)
+        )
+
+    def get_background_job(self, username: str, job_id: str) -> Optional[BackgroundJob]:
+        return self.background_jobs.get(username, job_id)
+
+    async def aget_latest_conversation(self, username: str) -> Conversation:
+        await self.__await_queued_exchanges(username)
+        conversation = await self.conversation_database.aget_latest_conversation(username)
+        if conversation is None:
+            conversation = await self.acreate_new_conversation(username)
+        return conversation
+
+    async def acreate_new_conversation(self, username: str) -> Conversation:
+        new_conversation = Conversation(created_at=self.__get_current_time(), messages=[])
+        await self.conversation_database.aadd_conversation(username, new_conversation)
+        return new_conversation
+
+    async def aget_latest_conversation_window(
+        self, username: str, max_messages: Optional[int] = None, before: Optional[int] = None
+    ) -> ConversationWindow:
+        await self.__await_queued_exchanges(username)
+        conversation_id = await self.conversation_database.aget_latest_conversation_id(username)
+        if conversation_id is not None:
+            window = await self.conversation_database.aget_conversation_window(
+                username, conversation_id, max_messages, before
+            )
+            if window is not None:
+                return window
+        new_conversation = Conversation(created_at=self.__get_current_time(), messages=[])
+        conversation_id = await self.conversation_database.aadd_conversation(
+            username, new_conversation
+        )
+        return self.__to_empty_window(conversation_id, new_conversation)
+
+    async def aiter_messages(
+        self, username: str, conversation_id: str, start: int, end: int
+    ) -> AsyncIterator[Message]:
+        """Iterate over the messages from start to end, loading at most chunk_size at a time"""
+
+        for chunk_start in range(start, end, self.chunk_size):
+            chunk_end = min(chunk_start + self.chunk_size, end)
+            window = await self.conversation_database.aget_conversation_window(
+                username, conversation_id, chunk_end - chunk_start, before=chunk_end
+            )
+            if window is None:
+                return
+            for message in window.messages:
+                yield message
+
+    async def aadd_to_latest_conversation(
+        self, username: str, user_message: Message, bot_message: Message
+    ) -> None:
+        await self.conversation_database.aadd_to_latest_conversation(
+            username, user_message, bot_message
+        )
+
+    async def aadd_to_conversation(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> None:
+        # Enqueueing does not block, the response does not wait for the database.
+        if self.write_queue is not None and self.write_queue.enqueue(
+            username, conversation_id, user_message, bot_message
+        ):
+            return
+        await self.conversation_database.aadd_to_conversation(
+            username, conversation_id, user_message, bot_message
+        )
+
+    async def aclear_conversations(self, username: str) -> str:
+        await self.conversation_database.aclear_conversations(username)
+        return f"Conversations deleted for user {username}"
+
+    def __wait_for_queued_exchanges(self, username: str) -> None:
+        # The exchanges queued by the previous requests of the user are read back.
+        if self.write_queue is not None and self.write_queue.has_pending(username):
+            self.write_queue.wait_until_written(username)
+
+    async def __await_queued_exchanges(self, username: str) -> None:
+        if self.write_queue is not None and self.write_queue.has_pending(username):
+            await asyncio.to_thread(self.write_queue.wait_until_written, username)
+
+    @staticmethod
+    def __to_empty_window(conversation_id: str, conversation: Conversation) -> ConversationWindow:
+        return ConversationWindow(
+            id=conversation_id,
+            created_at=conversation.created_at,
+            messages=[],
+            start=0,
+            total_messages=0,
+        )
+
     @staticmethod
     def __get_current_time() -> str:
         return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,116 @@
+import asyncio
+import re
+from typing import Generic, Optional, TypeVar
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from ai_document_search_backend.utils.lru_cache import LRUCache
+
+V = TypeVar("V")
+
+CacheEntry = tuple[str, str, Optional[list[float]], V]
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase the question and collapse whitespace and trailing punctuation."""
+
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class AnswerCache(Generic[V]):
+    """
+    LRU cache of answers keyed by the question and a scope (e.g. the filters and the model configuration).
+    When `similarity_threshold` is set, an answer to a different question in the same scope is returned
+    if the cosine similarity of the embeddings of the two questions is at least the threshold.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 0,
+        ttl_sec: Optional[float] = None,
+        similarity_threshold: Optional[float] = None,
+        embeddings: Optional[Embeddings] = None,
+    ):
+        if similarity_threshold is not None and embeddings is None:
+            raise ValueError("Embeddings must be set when similarity_threshold is set")
+        self.similarity_threshold = similarity_threshold
+        self.embeddings = embeddings
+        self.entries: LRUCache[CacheEntry] = LRUCache(max_size=max_size, ttl_sec=ttl_sec)
+        self.similar_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.entries.max_size > 0
+
+    @property
+    def uses_similarity(self) -> bool:
+        return self.enabled and self.similarity_threshold is not None
+
+    def get(self, question: str, scope: str) -> Optional[V]:
+        entry = self.entries.get((scope, normalize_question(question)))
+        if entry is not None:
+            return entry[3]
+        if not self.uses_similarity:
+            return None
+        return self.__get_similar(self.embeddings.embed_query(question), scope)
+
+    async def aget(self, question: str, scope: str) -> Optional[V]:
+        entry = self.entries.get((scope, normalize_question(question)))
+        if entry is not None:
+            return entry[3]
+        if not self.uses_similarity:
+            return None
+        return self.__get_similar(await self.__aembed(question), scope)
+
+    def set(self, question: str, scope: str, value: V) -> None:
+        if not self.enabled:
+            return
+        embedding = self.embeddings.embed_query(question) if self.uses_similarity else None
+        self.__set(question, scope, embedding, value)
+
+    async def aset(self, question: str, scope: str, value: V) -> None:
+        if not self.enabled:
+            return
+        embedding = await self.__aembed(question) if self.uses_similarity else None
+        self.__set(question, scope, embedding, value)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.entries.hits + self.entries.misses
+        hits = self.entries.hits + self.similar_hits
+        return {
+            "size": len(self.entries),
+            "exact_hits": self.entries.hits,
+            "similar_hits": self.similar_hits,
+            "misses": lookups - hits,
+            "hit_rate": round(hits / lookups, 3) if lookups > 0 else 0.0,
+        }
+
+    async def __aembed(self, question: str) -> list[float]:
+        try:
+            return await self.embeddings.aembed_query(question)
+        except NotImplementedError:
+            # Not all embeddings implement the asynchronous interface.
+            return await asyncio.to_thread(self.embeddings.embed_query, question)
+
+    def __set(self, question: str, scope: str, embedding: Optional[list[float]], value: V) -> None:
+        key = normalize_question(question)
+        self.entries.set((scope, key), (scope, key, embedding, value))
+
+    def __get_similar(self, embedding: list[float], scope: str) -> Optional[V]:
+        candidates = [entry for entry in self.entries.values() if entry[0] == scope]
+        if len(candidates) == 0:
+            return None
+        candidate_embeddings = np.array([entry[2] for entry in candidates], dtype=np.float32)
+        query_embedding = np.array(embedding, dtype=np.float32)
+        norms = np.linalg.norm(candidate_embeddings, axis=1) * np.linalg.norm(query_embedding)
+        similarities = candidate_embeddings @ query_embedding / np.maximum(norms, 1e-12)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        self.similar_hits += 1
+        return candidates[best][3]
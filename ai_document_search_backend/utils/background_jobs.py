@@ -0,0 +1,62 @@
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Literal, Optional
+
+from pydantic import BaseModel
+
+from ai_document_search_backend.utils.lru_cache import LRUCache
+
+
+class BackgroundJob(BaseModel):
+    id: str
+    # user who started the job, only they can see it
+    owner: str
+    status: Literal["pending", "running", "succeeded", "failed"]
+    created_at: float
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BackgroundJobs:
+    """
+    Runs long operations in worker threads and keeps their status for ttl_sec seconds.
+    The jobs are kept in the memory of the process that started them.
+    """
+
+    def __init__(self, max_workers: int = 4, max_jobs: int = 1000, ttl_sec: float = 3600):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="background-job"
+        )
+        self.jobs: LRUCache[BackgroundJob] = LRUCache(max_size=max_jobs, ttl_sec=ttl_sec)
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, owner: str, fn: Callable[[], None]) -> BackgroundJob:
+        job = BackgroundJob(
+            id=str(uuid.uuid4()), owner=owner, status="pending", created_at=time.time()
+        )
+        self.jobs.set(job.id, job)
+        self.executor.submit(self.__run, job, fn)
+        return job
+
+    def get(self, owner: str, job_id: str) -> Optional[BackgroundJob]:
+        job = self.jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def __run(self, job: BackgroundJob, fn: Callable[[], None]) -> None:
+        job.status = "running"
+        try:
+            fn()
+            job.status = "succeeded"
+        except Exception as e:
+            self.logger.error(f"Background job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
@@ -1,8 +1,15 @@
-from ai_document_search_backend.database_providers.conversation_database import Conversation
+from typing import Union
+
+from ai_document_search_backend.database_providers.conversation_database import (
+    Conversation,
+    ConversationWindow,
+)
 from ai_document_search_backend.services.chatbot_service import Exchange
 
 
-def conversation_to_chat_history(conversation: Conversation) -> list[Exchange]:
+def conversation_to_chat_history(
+    conversation: Union[Conversation, ConversationWindow]
+) -> list[Exchange]:
     """
     Convert a conversation to a chat history.
     Assumes that conversation messages are ordered by time and that the odd messages are from the user
@@ -0,0 +1,235 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from typing import Optional
+
+from pydantic import BaseModel
+
+from ai_document_search_backend.database_providers.conversation_database import (
+    ConversationDatabase,
+    ConversationNotFoundError,
+    Message,
+)
+
+
+class PendingExchange(BaseModel):
+    username: str
+    conversation_id: str
+    user_message: Message
+    bot_message: Message
+    enqueued_at: float
+
+
+class ConversationWriteQueue:
+    """
+    Adds exchanges to the conversations in background threads (write-behind).
+
+    The exchanges of each user are always written by the same thread, so they are stored in order.
+    Exchanges waiting in the queue of a thread are written together, at most batch_size at a time.
+    Failed writes are retried max_retries times with an exponential backoff,
+    except when the conversation does not exist anymore. A retry has the same write id,
+    so the parts of the write that were already stored are not stored again.
+    When max_pending exchanges are waiting, enqueue refuses new ones,
+    and the caller should write them synchronously.
+    The stats are logged every stats_log_interval_sec seconds while there is any activity.
+    """
+
+    def __init__(
+        self,
+        conversation_database: ConversationDatabase,
+        num_workers: int = 2,
+        batch_size: int = 20,
+        max_pending: int = 10000,
+        max_retries: int = 3,
+        retry_delay_sec: float = 0.5,
+        stats_log_interval_sec: Optional[float] = 60,
+    ):
+        self.conversation_database = conversation_database
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay_sec = retry_delay_sec
+        self.logger = logging.getLogger(__name__)
+
+        self.persisted = 0
+        self.failed = 0
+        self.retries = 0
+        # time from enqueueing an exchange to storing it
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+        self.__pending_per_user: Counter[str] = Counter()
+        self.__condition = threading.Condition()
+        self.__queues: list[queue.Queue[Optional[PendingExchange]]] = []
+        self.__workers: list[threading.Thread] = []
+        for i in range(num_workers):
+            worker_queue: queue.Queue[Optional[PendingExchange]] = queue.Queue()
+            worker = threading.Thread(
+                target=self.__work,
+                args=(worker_queue,),
+                name=f"conversation-writer-{i}",
+                daemon=True,
+            )
+            worker.start()
+            self.__queues.append(worker_queue)
+            self.__workers.append(worker)
+
+        self.__stopped = threading.Event()
+        if stats_log_interval_sec is not None:
+            threading.Thread(
+                target=self.__log_stats,
+                args=(stats_log_interval_sec,),
+                name="conversation-writer-stats",
+                daemon=True,
+            ).start()
+
+    def enqueue(
+        self, username: str, conversation_id: str, user_message: Message, bot_message: Message
+    ) -> bool:
+        """Queue the exchange, return False if the queue is full or has been shut down"""
+
+        with self.__condition:
+            if not self.__workers or self.pending >= self.max_pending:
+                self.logger.warning(f"Conversation write queue is not accepting: {self.stats}")
+                return False
+            self.__pending_per_user[username] += 1
+        exchange = PendingExchange(
+            username=username,
+            conversation_id=conversation_id,
+            user_message=user_message,
+            bot_message=bot_message,
+            enqueued_at=time.time(),
+        )
+        self.__get_queue(username).put(exchange)
+        return True
+
+    def has_pending(self, username: str) -> bool:
+        return self.__pending_per_user[username] > 0
+
+    def wait_until_written(self, username: str, timeout: Optional[float] = None) -> bool:
+        """Wait until all queued exchanges of the user are written, return False on timeout"""
+
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: self.__pending_per_user[username] == 0, timeout=timeout
+            )
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all queued exchanges are written, return False on timeout"""
+
+        with self.__condition:
+            return self.__condition.wait_for(lambda: self.pending == 0, timeout=timeout)
+
+    def shutdown(self, timeout: Optional[float] = None) -> None:
+        """Write the queued exchanges and stop the threads"""
+
+        if not self.flush(timeout):
+            self.logger.error(f"Conversation write queue not flushed on shutdown: {self.stats}")
+        with self.__condition:
+            workers, self.__workers = self.__workers, []
+        self.__stopped.set()
+        for worker_queue in self.__queues:
+            worker_queue.put(None)
+        for worker in workers:
+            worker.join(timeout)
+
+    @property
+    def pending(self) -> int:
+        return sum(self.__pending_per_user.values())
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "persisted": self.persisted,
+            "failed": self.failed,
+            "retries": self.retries,
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+    def __log_stats(self, interval_sec: float) -> None:
+        logged_stats = None
+        while not self.__stopped.wait(interval_sec):
+            stats = self.stats
+            # Logged only when something was queued or written since the last time.
+            if stats != logged_stats:
+                self.logger.info(f"Conversation write queue: {stats}")
+                logged_stats = stats
+
+    def __get_queue(self, username: str) -> queue.Queue:
+        # crc32 instead of hash(), so that a user is mapped to the same thread in every run
+        return self.__queues[zlib.crc32(username.encode()) % len(self.__queues)]
+
+    def __work(self, worker_queue: queue.Queue) -> None:
+        while True:
+            exchange = worker_queue.get()
+            if exchange is None:
+                return
+            batch = [exchange]
+            while len(batch) < self.batch_size:
+                try:
+                    exchange = worker_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if exchange is None:
+                    worker_queue.put(None)
+                    break
+                batch.append(exchange)
+
+            # Consecutive exchanges of the same conversation are written together.
+            groups: list[list[PendingExchange]] = []
+            for exchange in batch:
+                if groups and (
+                    groups[-1][0].username,
+                    groups[-1][0].conversation_id,
+                ) == (exchange.username, exchange.conversation_id):
+                    groups[-1].append(exchange)
+                else:
+                    groups.append([exchange])
+            for group in groups:
+                self.__write(group)
+
+    def __write(self, exchanges: list[PendingExchange]) -> None:
+        username = exchanges[0].username
+        conversation_id = exchanges[0].conversation_id
+        write_id = uuid.uuid4().hex
+        written = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.conversation_database.add_exchanges_to_conversation(
+                    username,
+                    conversation_id,
+                    [(exchange.user_message, exchange.bot_message) for exchange in exchanges],
+                    write_id=write_id,
+                )
+                written = True
+                break
+            except ConversationNotFoundError as e:
+                # The conversation was deleted, retrying would not help.
+                self.logger.error(f"Dropping {len(exchanges)} exchanges: {e}")
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.logger.error(f"Dropping {len(exchanges)} exchanges after retries: {e}")
+                    break
+                self.retries += 1
+                self.logger.warning(f"Writing exchanges failed, retrying: {e}")
+                time.sleep(self.retry_delay_sec * 2**attempt)
+
+        now = time.time()
+        with self.__condition:
+            if written:
+                self.persisted += len(exchanges)
+                self.last_lag_ms = (now - exchanges[0].enqueued_at) * 1000
+                self.max_lag_ms = max(self.max_lag_ms, self.last_lag_ms)
+            else:
+                self.failed += len(exchanges)
+            self.__pending_per_user[username] -= len(exchanges)
+            if self.__pending_per_user[username] == 0:
+                del self.__pending_per_user[username]
+            self.__condition.notify_all()
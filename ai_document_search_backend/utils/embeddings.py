@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from ai_document_search_backend.utils.lru_cache import LRUCache
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+CREATE_EMBEDDINGS_TABLE = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    namespace TEXT NOT NULL,
+    text TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (namespace, text)
+)
+"""
+SELECT_EMBEDDING = "SELECT vector FROM embeddings WHERE namespace = ? AND text = ?"
+INSERT_EMBEDDING = "INSERT OR REPLACE INTO embeddings (namespace, text, vector) VALUES (?, ?, ?)"
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic embeddings computed locally without any model, meant for tests and offline use.
+
+    Each word of the text is hashed to one of the dimensions with a sign (the hashing trick),
+    so texts sharing words have similar embeddings. The embeddings are normalized.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in TOKEN_PATTERN.findall(text.lower()):
+            # Not hash(), which differs between processes.
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+            vector[digest % self.dimensions] += 1.0 if digest & (1 << 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Embeddings computed by a sentence-transformers model on the CPU of this process.
+
+    Requires the sentence-transformers package, which is not installed by default
+    (`poetry run pip install sentence-transformers`).
+    The texts are embedded batch_size at a time. Each call uses num_threads threads
+    (null = number of CPUs), and the calls of concurrent requests take turns,
+    so that they do not compete for the same CPUs.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        batch_size: int = 32,
+        num_threads: Optional[int] = None,
+    ):
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "Local embeddings require the sentence-transformers package, "
+                "install it with `poetry run pip install sentence-transformers`"
+            ) from e
+
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.__lock = threading.Lock()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with self.__lock:
+            embeddings = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return embeddings.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings of the queries (the questions) cached by their text,
+    so that a repeated question is not embedded again. The documents are not cached.
+
+    The max_size most recently used embeddings are kept in memory. If path is set,
+    all embeddings are also stored in a SQLite file, which is shared by the workers
+    and kept across restarts. They are stored per namespace, which identifies the model.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_size: int = 1000,
+        path: Optional[str] = None,
+        namespace: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.namespace = namespace or get_embeddings_namespace(embeddings)
+        self.entries: LRUCache[list[float]] = LRUCache(max_size=max_size)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        self.__connection: Optional[sqlite3.Connection] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.__connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.__connection.execute("PRAGMA journal_mode = WAL")
+            self.__connection.execute("PRAGMA busy_timeout = 5000")
+            self.__connection.execute(CREATE_EMBEDDINGS_TABLE)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        embedding = self.__get(text)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.__set(text, embedding)
+        return embedding
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        try:
+            return await self.embeddings.aembed_documents(texts)
+        except NotImplementedError:
+            return await asyncio.to_thread(self.embeddings.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        if self.__connection is None:
+            embedding = self.__get(text)
+        else:
+            embedding = await asyncio.to_thread(self.__get, text)
+        if embedding is not None:
+            return embedding
+        try:
+            embedding = await self.embeddings.aembed_query(text)
+        except NotImplementedError:
+            # Not all embeddings implement the asynchronous interface.
+            embedding = await asyncio.to_thread(self.embeddings.embed_query, text)
+        if self.__connection is None:
+            self.__set(text, embedding)
+        else:
+            await asyncio.to_thread(self.__set, text, embedding)
+        return embedding
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total > 0 else 0.0,
+        }
+
+    def __get(self, text: str) -> Optional[list[float]]:
+        embedding = self.entries.get(text)
+        if embedding is None and self.__connection is not None:
+            with self.__lock:
+                row = self.__connection.execute(SELECT_EMBEDDING, (self.namespace, text)).fetchone()
+            if row is not None:
+                embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+                self.entries.set(text, embedding)
+                self.disk_hits += 1
+        if embedding is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return embedding
+
+    def __set(self, text: str, embedding: list[float]) -> None:
+        self.entries.set(text, embedding)
+        if self.__connection is not None:
+            vector = np.asarray(embedding, dtype=np.float32).tobytes()
+            with self.__lock:
+                self.__connection.execute(INSERT_EMBEDDING, (self.namespace, text, vector))
+
+
+def get_embeddings_namespace(embeddings: Embeddings) -> str:
+    """Identifies the model, e.g. OpenAIEmbeddings/text-embedding-ada-002"""
+
+    model = next(
+        (
+            getattr(embeddings, attribute)
+            for attribute in ["model", "model_name", "dimensions"]
+            if getattr(embeddings, attribute, None) is not None
+        ),
+        "",
+    )
+    return f"{type(embeddings).__name__}/{model}"
@@ -0,0 +1,19 @@
+import hashlib
+import json
+from typing import Optional
+
+
+def compute_etag(data) -> str:
+    """Compute a strong ETag from JSON-serializable data."""
+
+    serialized = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha256(serialized.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check whether the value of the If-None-Match header matches the ETag."""
+
+    if if_none_match is None:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
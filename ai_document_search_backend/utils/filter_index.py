@@ -0,0 +1,74 @@
+from typing import Optional
+
+import numpy as np
+
+from ai_document_search_backend.utils.filters import Filter
+
+
+class FilterIndex:
+    """
+    Inverted index from (property, value) to the rows of the objects with the value,
+    so that the filters are evaluated without comparing the values of all objects.
+
+    The rows of each property are sorted by the value, the rows of a value are a slice of them
+    (like the lists of an IVF index), so a property takes one integer per object
+    however many values it has. Properties are indexed when first filtered by.
+    """
+
+    def __init__(self, objects: list[dict]):
+        self.objects = objects
+        # property -> (value -> (start, end) in the rows, rows sorted by the value)
+        self.__postings: dict[str, tuple[dict, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def get_rows(self, prop: str, value) -> np.ndarray:
+        """The rows of the objects with the value of the property, in ascending order"""
+
+        postings = self.__postings.get(prop)
+        if postings is None:
+            postings = self.__index(prop)
+            self.__postings[prop] = postings
+        slices, rows = postings
+        start, end = slices.get(value, (0, 0))
+        return rows[start:end]
+
+    def match(self, filters: list[Filter]) -> Optional[np.ndarray]:
+        """
+        Which objects match all filters (any of the values of each filter),
+        None if no values are filtered by.
+        """
+
+        mask = None
+        for filter in filters:
+            if len(filter.values) == 0:
+                continue
+            filter_mask = self.get_mask(filter.property_name, filter.values)
+            mask = filter_mask if mask is None else mask & filter_mask
+        return mask
+
+    def get_mask(self, prop: str, values: list) -> np.ndarray:
+        """Which objects have any of the values of the property"""
+
+        mask = np.zeros(len(self.objects), dtype=bool)
+        for value in values:
+            mask[self.get_rows(prop, value)] = True
+        return mask
+
+    def __index(self, prop: str) -> tuple[dict, np.ndarray]:
+        values = [obj.get(prop) for obj in self.objects]
+        # Hashable values only, e.g. not the lists of a text array.
+        rows_by_value: dict = {}
+        for row, value in enumerate(values):
+            if value is not None and not isinstance(value, (list, dict)):
+                rows_by_value.setdefault(value, []).append(row)
+        slices = {}
+        rows = np.empty(sum(len(value_rows) for value_rows in rows_by_value.values()), np.int32)
+        start = 0
+        for value, value_rows in rows_by_value.items():
+            end = start + len(value_rows)
+            rows[start:end] = value_rows
+            slices[value] = (start, end)
+            start = end
+        return slices, rows
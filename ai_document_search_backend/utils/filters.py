@@ -31,3 +31,31 @@ def construct_or_filter(filter: Filter) -> dict:
         ],
     }
     return or_filter
+
+
+def construct_object_ids_filter(object_ids: list[str]) -> dict:
+    """Match only the objects with the ids (an allow-list)"""
+
+    return {
+        "path": ["id"],
+        "operator": "ContainsAny",
+        "valueTextArray": object_ids,
+    }
+
+
+def normalize_filters(filters: list[Filter]) -> list[Filter]:
+    """
+    Sort the filters and their values and remove duplicates and empty filters,
+    so that equivalent filters are equal. The filters of the same property are kept apart,
+    because all of them must match, unlike the values of one filter.
+    """
+
+    normalized = {
+        (filter.property_name, tuple(sorted(set(filter.values))))
+        for filter in filters
+        if len(filter.values) > 0
+    }
+    return [
+        Filter(property_name=property_name, values=list(values))
+        for property_name, values in sorted(normalized)
+    ]
@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """
+    Thread-safe least recently used cache.
+    Entries expire after `ttl_sec` seconds (if set) or at their own `expires_at` timestamp,
+    whichever comes first.
+    """
+
+    def __init__(self, max_size: int, ttl_sec: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.hits = 0
+        self.misses = 0
+
+        self.__entries: OrderedDict[Hashable, tuple[V, Optional[float]]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self.__entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.__entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: V, expires_at: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        if self.ttl_sec is not None:
+            ttl_expires_at = time.time() + self.ttl_sec
+            expires_at = ttl_expires_at if expires_at is None else min(expires_at, ttl_expires_at)
+        with self.__lock:
+            self.__entries[key] = (value, expires_at)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def values(self) -> list[V]:
+        """Values of the entries that have not expired yet, from the least recently used."""
+
+        now = time.time()
+        with self.__lock:
+            return [
+                value
+                for value, expires_at in self.__entries.values()
+                if expires_at is None or expires_at > now
+            ]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def __len__(self) -> int:
+        return len(self.__entries)
@@ -0,0 +1,62 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+
+from pydantic import BaseModel
+from pypdf import PdfReader
+
+
+class PdfPage(BaseModel):
+    source: str
+    # one-based page number
+    page: int
+    text: str
+
+
+def list_pdf_files(pdf_dir_path: str) -> list[str]:
+    """List the visible PDF files in the directory and its subdirectories, like PyPDFDirectoryLoader"""
+
+    pdf_dir = Path(pdf_dir_path)
+    return [
+        str(path)
+        for path in sorted(pdf_dir.glob("**/[!.]*.pdf"))
+        if path.is_file()
+        and not any(part.startswith(".") for part in path.relative_to(pdf_dir).parts)
+    ]
+
+
+def load_pdf_pages(pdf_path: str) -> list[PdfPage]:
+    """Extract the text of all pages of a PDF file"""
+
+    reader = PdfReader(pdf_path)
+    return [
+        PdfPage(source=pdf_path, page=page_number + 1, text=page.extract_text())
+        for page_number, page in enumerate(reader.pages)
+    ]
+
+
+def iter_pdf_pages(
+    pdf_paths: list[str], max_workers: Optional[int] = None, max_pending_files: Optional[int] = None
+) -> Iterator[PdfPage]:
+    """
+    Extract the pages of the PDF files in parallel processes, in the order of the files.
+    At most max_pending_files files are parsed or waiting to be consumed at the same time,
+    so the memory used does not depend on the number of files.
+    """
+
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending_files = max_pending_files or 2 * max_workers
+    pending: deque[Future[list[PdfPage]]] = deque()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for pdf_path in pdf_paths:
+                if len(pending) >= max_pending_files:
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(load_pdf_pages, pdf_path))
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,5 +1,14 @@
 import os
+from typing import Optional
 
 
 def relative_path_from_file(filename: str, path: str) -> str:
     return os.path.join(os.path.dirname(filename), *path.split("/"))
+
+
+def resolve_path_from_file(filename: str, path: Optional[str]) -> Optional[str]:
+    """Resolve a relative path (e.g. from the config) against the directory of the file"""
+
+    if path is None or os.path.isabs(path):
+        return path
+    return relative_path_from_file(filename, path)
@@ -0,0 +1,28 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class StageTimer:
+    """Measures how long the individual stages of a request take."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations_ms: dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        stage_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms = (time.perf_counter() - stage_start) * 1000
+            self.durations_ms[stage] = self.durations_ms.get(stage, 0) + duration_ms
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def __str__(self) -> str:
+        stages = [f"{stage}={duration:.0f}ms" for stage, duration in self.durations_ms.items()]
+        return " ".join(stages + [f"total={self.total_ms:.0f}ms"])
@@ -0,0 +1,71 @@
+import re
+
+# Words that usually refer to something mentioned earlier in the conversation.
+REFERRING_WORDS = {
+    "it",
+    "its",
+    "it's",
+    "they",
+    "them",
+    "their",
+    "theirs",
+    "this",
+    "that",
+    "these",
+    "those",
+    "he",
+    "him",
+    "his",
+    "she",
+    "her",
+    "hers",
+    "there",
+    "such",
+    "same",
+    "former",
+    "latter",
+    "above",
+    "previous",
+    "aforementioned",
+    "else",
+    "other",
+    "another",
+}
+
+# Beginnings of questions that continue the previous one.
+FOLLOW_UP_PREFIXES = (
+    "and ",
+    "but ",
+    "also ",
+    "so ",
+    "then ",
+    "what about ",
+    "how about ",
+    "and what",
+    "what else",
+)
+
+MIN_STANDALONE_WORDS = 4
+
+# A question names what it asks about with an ISIN or a bond name, e.g. "Bond 2021" or "NAS 19/24".
+ISIN_PATTERN = re.compile(r"\b[A-Z]{2}[A-Z0-9]{9}[0-9]\b")
+BOND_NAME_PATTERN = re.compile(r"\b[A-Z][A-Za-z]*\.? [0-9]")
+
+
+def is_standalone_question(question: str) -> bool:
+    """
+    Cheap heuristic deciding whether a question can be understood without the chat history.
+    Errs on the side of returning False, in which case the question is condensed as usual.
+    A question that does not name a bond, e.g. "What is the maturity date?", is a follow-up,
+    because it usually asks about the bond of the previous questions.
+    """
+
+    normalized = re.sub(r"\s+", " ", question).strip().lower()
+    words = re.findall(r"[a-z0-9']+", normalized)
+    if len(words) < MIN_STANDALONE_WORDS:
+        return False
+    if normalized.startswith(FOLLOW_UP_PREFIXES):
+        return False
+    if any(word in REFERRING_WORDS for word in words):
+        return False
+    return bool(ISIN_PATTERN.search(question) or BOND_NAME_PATTERN.search(question))
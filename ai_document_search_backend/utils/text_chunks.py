@@ -0,0 +1,83 @@
+import bisect
+import threading
+from typing import Iterable, Iterator, Optional
+
+import tiktoken
+
+from ai_document_search_backend.utils.pdf_pages import PdfPage
+
+
+class TextChunker:
+    """
+    Splits the pages of the documents into chunks of at most chunk_size tokens.
+
+    A chunk never spans more than one page, so its page number is exact. A page longer than
+    chunk_size is split into chunks overlapping by chunk_overlap tokens, the shorter pages
+    are kept whole. The tokens are counted by the tiktoken encoding of the question answering
+    model, and the chunks end at character boundaries, so no character is split
+    between two chunks.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int = 0,
+        encoding_name: str = "cl100k_base",
+        encoding: Optional[tiktoken.Encoding] = None,
+    ):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be at least 0 and less than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding_name = encoding_name
+        self.__encoding = encoding
+        self.__lock = threading.Lock()
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        # Loaded when first used, tiktoken downloads the encoding the first time.
+        with self.__lock:
+            if self.__encoding is None:
+                self.__encoding = tiktoken.get_encoding(self.encoding_name)
+            return self.__encoding
+
+    def iter_chunks(self, pages: Iterable[PdfPage]) -> Iterator[PdfPage]:
+        for page in pages:
+            tokens = self.encoding.encode(page.text)
+            if len(tokens) <= self.chunk_size:
+                yield page
+                continue
+            data = page.text.encode()
+            for start, end in self.__get_chunk_spans(data, tokens):
+                yield PdfPage(source=page.source, page=page.page, text=data[start:end].decode())
+
+    def __get_chunk_spans(self, data: bytes, tokens: list[int]) -> Iterator[tuple[int, int]]:
+        """
+        Byte offsets of the chunks. A chunk starts and ends only at the tokens that start
+        a character, so a character encoded by several tokens is not split.
+        """
+
+        offsets = [0]
+        for token in tokens:
+            offsets.append(offsets[-1] + len(self.encoding.decode_single_token_bytes(token)))
+        # The continuation bytes of UTF-8 are 10xxxxxx.
+        boundaries = [
+            i for i, offset in enumerate(offsets) if offset == len(data) or data[offset] >> 6 != 2
+        ]
+
+        def boundary_at_or_before(i: int) -> int:
+            return boundaries[bisect.bisect_right(boundaries, i) - 1]
+
+        start = 0
+        while True:
+            end = boundary_at_or_before(min(start + self.chunk_size, len(tokens)))
+            if end <= start:
+                # A single character longer than chunk_size tokens.
+                end = boundaries[bisect.bisect_right(boundaries, start)]
+            yield offsets[start], offsets[end]
+            if end == len(tokens):
+                return
+            start = max(boundary_at_or_before(end - self.chunk_overlap), start + 1)
+            start = boundaries[bisect.bisect_left(boundaries, start)]
@@ -0,0 +1,54 @@
+import logging
+import os
+
+from dotenv import load_dotenv
+from locust import HttpUser, task, events, constant
+from locust.env import Environment
+
+# Used together with ai_document_search_backend/scripts/run_stubbed_server.py.
+# With the stubbed chatbot latency of STUB_LATENCY_SEC seconds, a single worker should answer
+# about (number of users / STUB_LATENCY_SEC) questions per second in the async mode,
+# while in the threadpool mode the throughput is capped by the size of the threadpool.
+min_requests_per_sec = float(os.getenv("STUB_MIN_REQUESTS_PER_SEC", "0"))
+
+
+class StubbedChatUser(HttpUser):
+    wait_time = constant(0)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token = None
+
+    def on_start(self):
+        load_dotenv()
+        username = os.getenv("AUTH_USERNAME")
+        password = os.getenv("AUTH_PASSWORD")
+
+        response = self.client.post(
+            "/auth/token", data={"username": username, "password": password}
+        )
+        if response.status_code != 200:
+            raise Exception("Could not authenticate.")
+        self.token = response.json()["access_token"]
+
+    @events.test_stop.add_listener
+    def on_test_stop(environment: Environment):  # noqa: N805
+        chatbot_entries = environment.stats.entries[("/chatbot", "POST")]
+        if chatbot_entries.num_requests == 0:
+            logging.error("No /chatbot requests completed during the test run.")
+            environment.process_exit_code = 1
+            return
+
+        requests_per_sec = round(chatbot_entries.total_rps, 2)
+        logging.info(f"/chatbot throughput: {requests_per_sec} requests/s")
+        if requests_per_sec < min_requests_per_sec:
+            logging.error(f"/chatbot throughput is lower than {min_requests_per_sec} requests/s.")
+            environment.process_exit_code = 1
+
+    @task
+    def ask_question(self):
+        self.client.post(
+            "/chatbot",
+            json={"question": "What is the Loan to value ratio?", "filters": []},
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
@@ -0,0 +1,237 @@
+"""
+Stand-in for Cosmos DB used by the tests when COSMOS_KEY is not set.
+
+It keeps the items in memory and supports only the operations and the queries
+of CosmosConversationDatabase. Set COSMOS_KEY (and cosmos.url, e.g. of the local emulator)
+to run the tests against a real Cosmos DB instead.
+"""
+
+import copy
+import re
+import threading
+import uuid
+from typing import AsyncIterator, Iterator, Optional
+
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from ai_document_search_backend.database_providers.cosmos_conversation_database import (
+    SELECT_CONVERSATIONS_TO_COMPACT,
+    SELECT_ITEM_IDS,
+    SELECT_LATEST_CONVERSATION,
+    SELECT_SOURCE_DOCUMENTS,
+    SELECT_WINDOW,
+    get_not_written_predicate,
+)
+
+WINDOW_QUERY_PATTERN = re.compile(
+    re.escape(SELECT_WINDOW).replace(re.escape("{messages}"), "(?P<messages>.*)")
+)
+
+NOT_WRITTEN_PATTERN = re.compile(
+    re.escape(get_not_written_predicate("WRITE_ID", 123456789))
+    .replace("WRITE_ID", "(?P<write_id>[^']*)")
+    .replace("123456789", "(?P<part>[0-9]+)")
+)
+
+
+class StandInContainer:
+    def __init__(self):
+        # (partition key, id) -> item
+        self.items: dict[tuple[str, str], dict] = {}
+        self.lock = threading.Lock()
+
+    def read(self) -> dict:
+        return {"id": "Conversations"}
+
+    def read_item(self, item: str, partition_key: str) -> dict:
+        with self.lock:
+            return copy.deepcopy(self.__get(partition_key, item))
+
+    def create_item(self, body: dict) -> dict:
+        with self.lock:
+            if (body["username"], body["id"]) in self.items:
+                raise CosmosResourceExistsError(message=f"Item {body['id']} already exists")
+            return self.__set(body)
+
+    def upsert_item(self, body: dict) -> dict:
+        with self.lock:
+            return self.__set(body)
+
+    def replace_item(self, item: str, body: dict, etag=None, match_condition=None) -> dict:
+        with self.lock:
+            current = self.__get(body["username"], item)
+            if etag is not None and current["_etag"] != etag:
+                raise CosmosAccessConditionFailedError(message=f"Item {item} was changed")
+            return self.__set(body)
+
+    def patch_item(
+        self,
+        item: str,
+        partition_key: str,
+        patch_operations: list[dict],
+        filter_predicate: Optional[str] = None,
+    ) -> dict:
+        with self.lock:
+            patched = copy.deepcopy(self.__get(partition_key, item))
+            if filter_predicate is not None:
+                match = NOT_WRITTEN_PATTERN.fullmatch(filter_predicate)
+                if match is None:
+                    raise NotImplementedError(filter_predicate)
+                last_write = patched.get("last_write")
+                if (
+                    last_write is not None
+                    and last_write["id"] == match.group("write_id")
+                    and last_write["part"] >= int(match.group("part"))
+                ):
+                    raise CosmosAccessConditionFailedError(message="Precondition failed")
+            for operation in patch_operations:
+                if operation["op"] == "add" and operation["path"] == "/messages/-":
+                    patched["messages"].append(copy.deepcopy(operation["value"]))
+                elif operation["op"] == "set" and operation["path"] == "/last_write":
+                    patched["last_write"] = copy.deepcopy(operation["value"])
+                else:
+                    raise NotImplementedError(operation)
+            return self.__set(patched)
+
+    def delete_item(self, item: str, partition_key: str) -> None:
+        with self.lock:
+            self.__get(partition_key, item)
+            del self.items[(partition_key, item)]
+
+    def delete_all_items_by_partition_key(self, partition_key: str) -> None:
+        with self.lock:
+            for key in [key for key in self.items if key[0] == partition_key]:
+                del self.items[key]
+
+    def query_items(
+        self,
+        query: str,
+        parameters: Optional[list[dict]] = None,
+        partition_key: Optional[str] = None,
+        enable_cross_partition_query: Optional[bool] = None,
+    ) -> Iterator:
+        params = {param["name"]: param["value"] for param in parameters or []}
+        with self.lock:
+            items = [
+                copy.deepcopy(item)
+                for (item_partition_key, _), item in self.items.items()
+                if partition_key is None or item_partition_key == partition_key
+            ]
+        return iter(self.__query(query, params, items))
+
+    @staticmethod
+    def __query(query: str, params: dict, items: list[dict]) -> list:
+        conversations = [item for item in items if "messages" in item]
+        if query == SELECT_LATEST_CONVERSATION:
+            conversations = [c for c in conversations if c["username"] == params["@username"]]
+            latest = sorted(conversations, key=lambda c: c["created_at"])[-1:]
+            return [{"id": c["id"], "created_at": c["created_at"]} for c in latest]
+        if query == SELECT_ITEM_IDS:
+            return [item["id"] for item in items if item["username"] == params["@username"]]
+        if query == SELECT_SOURCE_DOCUMENTS:
+            return [
+                {key: item[key] for key in ["id", "isin", "shortname", "link"]}
+                for item in items
+                if item["id"] in params["@ids"]
+            ]
+        if query == SELECT_CONVERSATIONS_TO_COMPACT:
+            return [
+                {"id": c["id"], "username": c["username"]}
+                for c in conversations
+                if any("r" not in message for message in c["messages"])
+            ]
+        match = WINDOW_QUERY_PATTERN.fullmatch(query)
+        if match is not None:
+            return [
+                {
+                    "id": c["id"],
+                    "created_at": c["created_at"],
+                    "messages": StandInContainer.__slice(match["messages"], params, c["messages"]),
+                    "total_messages": len(c["messages"]),
+                }
+                for c in conversations
+                if c["id"] == params["@id"]
+            ]
+        raise NotImplementedError(query)
+
+    @staticmethod
+    def __slice(expression: str, params: dict, messages: list) -> list:
+        if expression == "c.messages":
+            return messages
+        if expression == "ARRAY_SLICE(c.messages, 0, 0)":
+            return []
+        if expression == "ARRAY_SLICE(c.messages, -@max_messages)":
+            return messages[-params["@max_messages"] :]
+        if expression == "ARRAY_SLICE(c.messages, @start, @length)":
+            return messages[params["@start"] : params["@start"] + params["@length"]]
+        raise NotImplementedError(expression)
+
+    def __get(self, partition_key: str, item_id: str) -> dict:
+        item = self.items.get((partition_key, item_id))
+        if item is None:
+            raise CosmosResourceNotFoundError(message=f"Item {item_id} not found")
+        return item
+
+    def __set(self, body: dict) -> dict:
+        item = {**copy.deepcopy(body), "_etag": str(uuid.uuid4())}
+        self.items[(item["username"], item["id"])] = item
+        return copy.deepcopy(item)
+
+
+class AsyncStandInContainer:
+    """The asynchronous interface of the same items"""
+
+    def __init__(self, container: StandInContainer):
+        self.container = container
+
+    async def read(self) -> dict:
+        return self.container.read()
+
+    async def read_item(self, *args, **kwargs) -> dict:
+        return self.container.read_item(*args, **kwargs)
+
+    async def create_item(self, *args, **kwargs) -> dict:
+        return self.container.create_item(*args, **kwargs)
+
+    async def upsert_item(self, *args, **kwargs) -> dict:
+        return self.container.upsert_item(*args, **kwargs)
+
+    async def replace_item(self, *args, **kwargs) -> dict:
+        return self.container.replace_item(*args, **kwargs)
+
+    async def patch_item(self, *args, **kwargs) -> dict:
+        return self.container.patch_item(*args, **kwargs)
+
+    async def delete_item(self, *args, **kwargs) -> None:
+        self.container.delete_item(*args, **kwargs)
+
+    async def query_items(self, *args, **kwargs) -> AsyncIterator:
+        for item in self.container.query_items(*args, **kwargs):
+            yield item
+
+
+class StandInCosmosClients:
+    """Replaces CosmosClients"""
+
+    def __init__(self):
+        self.container = StandInContainer()
+        self.db_name = "StandIn"
+
+    def get_container(self) -> StandInContainer:
+        return self.container
+
+    async def aget_container(self) -> AsyncStandInContainer:
+        return AsyncStandInContainer(self.container)
+
+    def provision(self, offer_throughput: int) -> None:
+        pass
+
+    async def awarm_up(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
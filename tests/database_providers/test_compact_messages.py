@@ -0,0 +1,63 @@
+import json
+
+from fastapi.encoders import jsonable_encoder
+
+from ai_document_search_backend.database_providers.compact_messages import (
+    COMPRESSION_MIN_LENGTH,
+    decode_message,
+    encode_message,
+    get_document_ids,
+    get_source_documents,
+)
+from ai_document_search_backend.database_providers.conversation_database import Message, Source
+
+source = Source(
+    isin="NO1111111111",
+    shortname="Bond 2021",
+    link="https://www.example.com/bond1.pdf",
+    page=1,
+    certainty=0.9,
+    distance=0.1,
+)
+bot_message = Message(
+    role="bot",
+    text="The loan to value ratio must not exceed 80 %.",
+    sources=[source, source.model_copy(update={"page": 5})],
+)
+
+
+def get_documents(messages: list[Message]) -> dict:
+    return {document.id: document for document in get_source_documents(messages)}
+
+
+def test_encodes_and_decodes_message():
+    data = encode_message(bot_message)
+    assert data["r"] == "b"
+    assert data["t"] == bot_message.text
+    assert len(get_document_ids(data)) == 1
+    assert decode_message(data, get_documents([bot_message])) == bot_message
+
+
+def test_keeps_messages_without_sources_and_with_no_sources():
+    without_sources = Message(role="user", text="Hello")
+    with_no_sources = Message(role="bot", text="I don't know", sources=[])
+    assert decode_message(encode_message(without_sources), {}) == without_sources
+    assert decode_message(encode_message(with_no_sources), {}) == with_no_sources
+
+
+def test_compresses_long_texts():
+    message = Message(role="bot", text="The loan to value ratio. " * COMPRESSION_MIN_LENGTH)
+    data = encode_message(message)
+    assert "t" not in data
+    assert len(data["z"]) < len(message.text)
+    assert decode_message(data, {}) == message
+
+
+def test_encoded_message_is_smaller():
+    encoded_size = len(json.dumps(encode_message(bot_message)))
+    original_size = len(json.dumps(jsonable_encoder(bot_message)))
+    assert encoded_size < original_size
+
+
+def test_decodes_message_in_original_format():
+    assert decode_message(jsonable_encoder(bot_message), {}) == bot_message
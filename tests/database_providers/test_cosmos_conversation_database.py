@@ -1,11 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from azure.core.exceptions import ServiceResponseError
+from dependency_injector import providers
+from fastapi.encoders import jsonable_encoder
 
 from ai_document_search_backend.container import Container
 from ai_document_search_backend.database_providers.conversation_database import (
     Conversation,
+    ConversationWindow,
     Message,
     Source,
 )
+from ai_document_search_backend.database_providers.cosmos_conversation_database import (
+    SOURCE_DOCUMENTS_PARTITION,
+)
+from tests.database_providers.cosmos_stand_in import StandInCosmosClients
 
 test_username = "test_user"
 user_message = Message(role="user", text="Hello")
@@ -31,9 +42,17 @@ bot_message = Message(
         ),
     ],
 )
+other_user_message = Message(role="user", text="How are you?")
+other_bot_message = Message(role="bot", text="Fine")
 
 container = Container()
 container.config.cosmos.db_name.from_value("TestDB")
+container.config.conversation.database.from_value("cosmos")
+if container.config.cosmos.key():
+    container.cosmos_clients().provision(offer_throughput=400)
+else:
+    # Without a key, the tests run against an in-memory stand-in of Cosmos DB.
+    container.cosmos_clients.override(providers.Object(StandInCosmosClients()))
 db = container.conversation_database()
 
 
@@ -106,6 +125,19 @@ def test_adds_to_latest_conversation_with_existing_messages():
     )
 
 
+def test_concurrent_additions_to_latest_conversation_are_all_kept():
+    conversation = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for _ in range(4):
+            executor.submit(db.add_to_latest_conversation, test_username, user_message, bot_message)
+
+    assert db.get_latest_conversation(test_username) == Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message] * 4,
+    )
+
+
 def test_raises_error_when_adding_messages_without_any_existing_conversation():
     try:
         db.add_to_latest_conversation(test_username, user_message, bot_message)
@@ -114,6 +146,150 @@ def test_raises_error_when_adding_messages_without_any_existing_conversation():
         assert str(e) == "No conversation found for user test_user"
 
 
+def test_gets_conversation_by_id():
+    conversation_older = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    older_id = db.add_conversation(test_username, conversation_older)
+    newer_id = db.add_conversation(test_username, conversation_newer)
+    assert older_id != newer_id
+    assert db.get_latest_conversation_id(test_username) == newer_id
+    assert db.get_conversation(test_username, older_id) == conversation_older
+
+
+def test_get_conversation_returns_none_when_conversation_does_not_exist():
+    assert db.get_conversation(test_username, "unknown") is None
+
+
+def test_adds_to_conversation_by_id():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    older_id = db.add_conversation(test_username, conversation_older)
+    db.add_conversation(test_username, conversation_newer)
+    db.add_to_conversation(test_username, older_id, user_message, bot_message)
+
+    assert db.get_conversation(test_username, older_id) == Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    assert db.get_latest_conversation(test_username) == conversation_newer
+
+
+def test_raises_error_when_adding_messages_to_unknown_conversation():
+    try:
+        db.add_to_conversation(test_username, "unknown", user_message, bot_message)
+        assert False
+    except ValueError as e:
+        assert str(e) == "No conversation unknown found for user test_user"
+
+
+def test_retried_write_does_not_duplicate_messages(monkeypatch):
+    conversation_id = db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    exchanges = [
+        (Message(role="user", text=f"Question {i}"), Message(role="bot", text=f"Answer {i}"))
+        for i in range(10)
+    ]
+    patch_item = db.conversations.patch_item
+    calls = []
+
+    def patch_item_and_time_out(*args, **kwargs):
+        calls.append(kwargs)
+        result = patch_item(*args, **kwargs)
+        if len(calls) == 2:
+            # The second patch is applied, but its response is lost.
+            raise ServiceResponseError("Timeout")
+        return result
+
+    monkeypatch.setattr(db.conversations, "patch_item", patch_item_and_time_out)
+    with pytest.raises(ServiceResponseError):
+        db.add_exchanges_to_conversation(test_username, conversation_id, exchanges, "write")
+    db.add_exchanges_to_conversation(test_username, conversation_id, exchanges, "write")
+
+    messages = db.get_conversation(test_username, conversation_id).messages
+    assert messages == [message for exchange in exchanges for message in exchange]
+
+
+def test_gets_last_messages_of_conversation():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    assert db.get_conversation_window(test_username, conversation_id, 2) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=[other_user_message, other_bot_message],
+        start=2,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id, 10) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=conversation.messages,
+        start=0,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=conversation.messages,
+        start=0,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id, 0) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=[],
+        start=4,
+        total_messages=4,
+    )
+
+
+def test_gets_messages_of_conversation_before_index():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=3)
+    assert window.messages == [bot_message, other_user_message]
+    assert window.start == 1
+    assert window.total_messages == 4
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=1)
+    assert window.messages == [user_message]
+    assert window.start == 0
+
+    window = db.get_conversation_window(test_username, conversation_id, before=2)
+    assert window.messages == [user_message, bot_message]
+    assert window.start == 0
+
+
+def test_gets_last_messages_when_before_is_beyond_the_end():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=10)
+    assert window.messages == [other_user_message, other_bot_message]
+    assert window.start == 2
+    assert window.total_messages == 4
+
+    window = db.get_conversation_window(test_username, conversation_id, 3, before=5)
+    assert window.messages == [bot_message, other_user_message, other_bot_message]
+    assert window.start == 1
+
+
+def test_get_conversation_window_returns_none_when_conversation_does_not_exist():
+    assert db.get_conversation_window(test_username, "unknown", 2) is None
+
+
 def test_clears_conversations():
     conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
     conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
@@ -121,3 +297,61 @@ def test_clears_conversations():
     db.add_conversation(test_username, conversation_older)
     db.clear_conversations(test_username)
     assert db.get_latest_conversation(test_username) is None
+
+
+def test_source_documents_are_not_cleared_as_conversations_of_a_user():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+    with pytest.raises(ValueError, match="reserved"):
+        db.clear_conversations(SOURCE_DOCUMENTS_PARTITION)
+    with pytest.raises(ValueError, match="reserved"):
+        asyncio.run(db.aadd_conversation("#admin", conversation))
+    db.source_documents.clear()
+    assert db.get_conversation(test_username, conversation_id) == conversation
+
+
+def test_reads_and_compacts_messages_in_original_format():
+    conversation_id = db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    db_conversation = db.conversations.read_item(item=conversation_id, partition_key=test_username)
+    db_conversation["messages"] = jsonable_encoder([user_message, bot_message])
+    db.conversations.replace_item(item=conversation_id, body=db_conversation)
+    db.add_to_conversation(test_username, conversation_id, other_user_message, other_bot_message)
+
+    expected_messages = [user_message, bot_message, other_user_message, other_bot_message]
+    assert db.get_conversation(test_username, conversation_id).messages == expected_messages
+
+    assert db.compact_conversations() >= 1
+    db_conversation = db.conversations.read_item(item=conversation_id, partition_key=test_username)
+    assert all("r" in message for message in db_conversation["messages"])
+    assert db.get_conversation(test_username, conversation_id).messages == expected_messages
+
+
+def test_adds_and_gets_conversation_asynchronously():
+    async def add_and_get():
+        conversation_id = await db.aadd_conversation(
+            test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+        )
+        await db.aadd_to_conversation(test_username, conversation_id, user_message, bot_message)
+        await db.aadd_to_conversation(
+            test_username, conversation_id, other_user_message, other_bot_message
+        )
+        assert await db.aget_latest_conversation_id(test_username) == conversation_id
+        assert await db.aget_conversation(test_username, conversation_id) == Conversation(
+            created_at="2021-01-01T00:00:00",
+            messages=[user_message, bot_message, other_user_message, other_bot_message],
+        )
+        window = await db.aget_conversation_window(test_username, conversation_id, 2)
+        assert window.messages == [other_user_message, other_bot_message]
+        assert window.start == 2
+        window = await db.aget_conversation_window(test_username, conversation_id, 2, before=10)
+        assert window.messages == [other_user_message, other_bot_message]
+        assert window.start == 2
+
+        await db.aclear_conversations(test_username)
+        assert await db.aget_latest_conversation(test_username) is None
+
+    asyncio.run(add_and_get())
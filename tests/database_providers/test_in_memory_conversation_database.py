@@ -1,7 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
 import pytest
 
 from ai_document_search_backend.database_providers.conversation_database import (
     Conversation,
+    ConversationWindow,
     Message,
     Source,
 )
@@ -33,6 +37,8 @@ bot_message = Message(
         ),
     ],
 )
+other_user_message = Message(role="user", text="How are you?")
+other_bot_message = Message(role="bot", text="Fine")
 
 db = InMemoryConversationDatabase()
 
@@ -107,6 +113,19 @@ def test_adds_to_latest_conversation_with_existing_messages():
     )
 
 
+def test_concurrent_additions_to_latest_conversation_are_all_kept():
+    conversation = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for _ in range(4):
+            executor.submit(db.add_to_latest_conversation, test_username, user_message, bot_message)
+
+    assert db.get_latest_conversation(test_username) == Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message] * 4,
+    )
+
+
 def test_raises_error_when_adding_messages_without_any_existing_conversation():
     try:
         db.add_to_latest_conversation(test_username, user_message, bot_message)
@@ -115,6 +134,122 @@ def test_raises_error_when_adding_messages_without_any_existing_conversation():
         assert str(e) == "No conversation found for user test_user"
 
 
+def test_gets_conversation_by_id():
+    conversation_older = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    older_id = db.add_conversation(test_username, conversation_older)
+    newer_id = db.add_conversation(test_username, conversation_newer)
+    assert older_id != newer_id
+    assert db.get_latest_conversation_id(test_username) == newer_id
+    assert db.get_conversation(test_username, older_id) == conversation_older
+
+
+def test_get_conversation_returns_none_when_conversation_does_not_exist():
+    assert db.get_conversation(test_username, "unknown") is None
+
+
+def test_adds_to_conversation_by_id():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    older_id = db.add_conversation(test_username, conversation_older)
+    db.add_conversation(test_username, conversation_newer)
+    db.add_to_conversation(test_username, older_id, user_message, bot_message)
+
+    assert db.get_conversation(test_username, older_id) == Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    assert db.get_latest_conversation(test_username) == conversation_newer
+
+
+def test_raises_error_when_adding_messages_to_unknown_conversation():
+    try:
+        db.add_to_conversation(test_username, "unknown", user_message, bot_message)
+        assert False
+    except ValueError as e:
+        assert str(e) == "No conversation unknown found for user test_user"
+
+
+def test_gets_last_messages_of_conversation():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    assert db.get_conversation_window(test_username, conversation_id, 2) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=[other_user_message, other_bot_message],
+        start=2,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id, 10) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=conversation.messages,
+        start=0,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=conversation.messages,
+        start=0,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id, 0) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=[],
+        start=4,
+        total_messages=4,
+    )
+
+
+def test_gets_messages_of_conversation_before_index():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=3)
+    assert window.messages == [bot_message, other_user_message]
+    assert window.start == 1
+    assert window.total_messages == 4
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=1)
+    assert window.messages == [user_message]
+    assert window.start == 0
+
+    window = db.get_conversation_window(test_username, conversation_id, before=2)
+    assert window.messages == [user_message, bot_message]
+    assert window.start == 0
+
+
+def test_gets_last_messages_when_before_is_beyond_the_end():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=10)
+    assert window.messages == [other_user_message, other_bot_message]
+    assert window.start == 2
+    assert window.total_messages == 4
+
+    window = db.get_conversation_window(test_username, conversation_id, 3, before=5)
+    assert window.messages == [bot_message, other_user_message, other_bot_message]
+    assert window.start == 1
+
+
+def test_get_conversation_window_returns_none_when_conversation_does_not_exist():
+    assert db.get_conversation_window(test_username, "unknown", 2) is None
+
+
 def test_clears_conversations():
     conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
     conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
@@ -122,3 +257,64 @@ def test_clears_conversations():
     db.add_conversation(test_username, conversation_older)
     db.clear_conversations(test_username)
     assert db.get_latest_conversation(test_username) is None
+
+
+def test_evicts_least_recently_changed_conversations_above_limit():
+    limited_db = InMemoryConversationDatabase(max_conversations=2)
+    first_id = limited_db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    second_id = limited_db.add_conversation(
+        test_username, Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    )
+    limited_db.add_to_conversation(test_username, first_id, user_message, bot_message)
+    third_id = limited_db.add_conversation(
+        "other_user", Conversation(created_at="2021-01-03T00:00:00", messages=[])
+    )
+
+    assert limited_db.get_conversation(test_username, second_id) is None
+    assert limited_db.get_conversation(test_username, first_id) is not None
+    assert limited_db.get_latest_conversation_id(test_username) == first_id
+    assert limited_db.get_latest_conversation_id("other_user") == third_id
+
+
+def test_evicts_conversations_not_changed_for_max_age(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "time", lambda: now)
+    expiring_db = InMemoryConversationDatabase(max_age_sec=60)
+    expiring_db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+
+    now += 30
+    assert expiring_db.get_latest_conversation(test_username) is not None
+    now += 31
+    assert expiring_db.get_latest_conversation(test_username) is None
+
+
+def test_returned_conversation_is_not_changed_by_later_additions():
+    conversation_id = db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    conversation = db.get_conversation(test_username, conversation_id)
+    db.add_to_conversation(test_username, conversation_id, user_message, bot_message)
+    assert conversation.messages == []
+
+
+def test_saves_and_loads_snapshot(tmp_path):
+    snapshot_path = str(tmp_path / "conversations.json")
+    saved_db = InMemoryConversationDatabase(snapshot_path=snapshot_path)
+    older_id = saved_db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    newer_id = saved_db.add_conversation(
+        test_username, Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    )
+    saved_db.add_to_conversation(test_username, older_id, user_message, bot_message)
+    saved_db.save_snapshot()
+
+    loaded_db = InMemoryConversationDatabase(snapshot_path=snapshot_path)
+    assert loaded_db.get_latest_conversation_id(test_username) == newer_id
+    assert loaded_db.get_conversation(test_username, older_id) == Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
@@ -0,0 +1,172 @@
+import pytest
+
+from ai_document_search_backend.database_providers.local_vector_index import LocalVectorIndex
+from ai_document_search_backend.utils.embeddings import HashingEmbeddings
+from ai_document_search_backend.utils.filters import construct_and_filter, Filter
+
+embeddings = HashingEmbeddings()
+
+
+def page(text: str, isin: str = "NO1111111111", industry: str = "Shipping", **kwargs) -> dict:
+    return {
+        "text": text,
+        "page": 1,
+        "link": "https://example.com",
+        "shortname": f"Bond {isin}",
+        "isin": isin,
+        "issuer_name": "Issuer",
+        "filename": f"{isin}.pdf",
+        "industry": industry,
+        "risk_type": "Senior Unsecured",
+        "green": "No",
+        **kwargs,
+    }
+
+
+@pytest.fixture
+def index(tmp_path) -> LocalVectorIndex:
+    index = LocalVectorIndex(str(tmp_path / "index"), embeddings)
+    index.create_if_not_exists()
+    index.add_objects(
+        [
+            ("a", page("The loan to value ratio shall not exceed 75 %")),
+            ("b", page("The maturity date is 1 March 2026", isin="NO2222222222")),
+            ("c", page("Interest is paid quarterly", isin="NO3333333333", industry="Banks")),
+        ]
+    )
+    index.save()
+    return index
+
+
+def search_ids(index: LocalVectorIndex, question: str, k: int = 3, where_filter=None) -> list:
+    results = index.search(embeddings.embed_query(question), k, where_filter)
+    return [properties["isin"] for properties, _ in results]
+
+
+def test_finds_nearest_objects(index):
+    results = index.search(embeddings.embed_query("What is the loan to value ratio?"), 2)
+    assert len(results) == 2
+    assert results[0][0]["text"] == "The loan to value ratio shall not exceed 75 %"
+    assert 0 <= results[0][1] < results[1][1]
+
+
+def test_filters_objects(index):
+    where_filter = construct_and_filter(
+        [
+            Filter(property_name="isin", values=["NO2222222222", "NO3333333333"]),
+            Filter(property_name="industry", values=["Banks"]),
+        ]
+    )
+    assert search_ids(index, "loan to value ratio", where_filter=where_filter) == ["NO3333333333"]
+    assert search_ids(index, "loan to value ratio", where_filter={}) == search_ids(
+        index, "loan to value ratio"
+    )
+
+
+def test_changes_are_searched_after_save(index):
+    index.delete_objects({"a"})
+    index.add_objects([("d", page("The loan to value ratio is tested", isin="NO4444444444"))])
+    assert index.get_object_ids() == {"b", "c", "d"}
+    assert index.count() == 3
+    assert "NO1111111111" in search_ids(index, "loan to value ratio")
+
+    index.save()
+    assert search_ids(index, "loan to value ratio", k=1) == ["NO4444444444"]
+    assert "NO1111111111" not in search_ids(index, "loan to value ratio")
+
+
+def test_replaces_object_with_the_same_id(index):
+    index.add_objects([("a", page("Interest is paid monthly", isin="NO5555555555"))])
+    index.save()
+    assert index.count() == 3
+    assert "NO1111111111" not in search_ids(index, "anything")
+
+
+def test_loads_saved_objects_and_refreshes(index, tmp_path):
+    other = LocalVectorIndex(str(tmp_path / "index"), embeddings)
+    assert other.get_object_ids() == {"a", "b", "c"}
+    assert search_ids(other, "maturity date", k=1) == ["NO2222222222"]
+
+    index.delete_objects({"b"})
+    index.save()
+    assert other.refresh()
+    assert not other.refresh()
+    assert other.get_object_ids() == {"a", "c"}
+    # Only the files of the current and the previous version are kept.
+    index.delete_objects({"c"})
+    index.save()
+    assert len(list((tmp_path / "index").glob("vectors-*.npy"))) == 2
+
+
+def test_deletes_all_objects(index, tmp_path):
+    index.delete_all()
+    index.save()
+    assert index.count() == 0
+    assert index.search(embeddings.embed_query("loan"), 3) == []
+    assert LocalVectorIndex(str(tmp_path / "index"), embeddings).count() == 0
+
+
+def test_old_objects_are_searched_while_the_index_is_rebuilt(index, tmp_path):
+    index.delete_all()
+    index.add_objects([("d", page("The loan to value ratio is tested", isin="NO4444444444"))])
+    other = LocalVectorIndex(str(tmp_path / "index"), embeddings)
+    assert other.get_object_ids() == {"a", "b", "c"}
+    assert search_ids(other, "maturity date", k=1) == ["NO2222222222"]
+    assert search_ids(index, "maturity date", k=1) == ["NO2222222222"]
+
+    index.save()
+    assert other.refresh()
+    assert other.get_object_ids() == {"d"}
+    assert search_ids(index, "maturity date") == ["NO4444444444"]
+
+
+def test_gets_property_values(index):
+    assert index.get_property_values(["isin", "industry"], 10) == {
+        "isin": ["NO1111111111", "NO2222222222", "NO3333333333"],
+        "industry": ["Banks", "Shipping"],
+    }
+    assert index.get_property_values(["industry"], 1) == {"industry": ["Shipping"]}
+
+
+def test_ivf_mode_searches_nearest_clusters(tmp_path):
+    index = LocalVectorIndex(str(tmp_path / "ivf"), embeddings, mode="ivf", num_probes=4)
+    index.add_objects(
+        [
+            (str(i), page(f"Clause {i} about topic{i % 50} and term{i % 7}", isin=f"NO{i:010d}"))
+            for i in range(1200)
+        ]
+    )
+    index.save()
+    assert len(list((tmp_path / "ivf").glob("ivf-*.npz"))) == 1
+
+    flat = LocalVectorIndex(str(tmp_path / "ivf"), embeddings)
+    question = "Clause 123 about topic23 and term4"
+    assert search_ids(index, question, k=1) == search_ids(flat, question, k=1)
+    # Fewer than k probed objects match the filter, all matching objects are compared.
+    where_filter = construct_and_filter([Filter(property_name="isin", values=["NO0000000999"])])
+    assert search_ids(index, question, k=1, where_filter=where_filter) == ["NO0000000999"]
+
+    # The filter matches fewer objects than the probed clusters have, they are all compared.
+    where_filter = construct_and_filter([Filter(property_name="industry", values=["Banks"])])
+    index.add_objects([("banks", page("Interest", isin="NO9999999999", industry="Banks"))])
+    index.save()
+    assert search_ids(index, question, k=3, where_filter=where_filter) == ["NO9999999999"]
+
+    # All 34 clusters are probed.
+    exhaustive = LocalVectorIndex(str(tmp_path / "ivf"), embeddings, mode="ivf", num_probes=34)
+    query = embeddings.embed_query(question)
+    # Compared by the distances, the objects with equal distances may be in another order.
+    assert [distance for _, distance in exhaustive.search(query, 10)] == pytest.approx(
+        [distance for _, distance in flat.search(query, 10)]
+    )
+
+
+def test_vectorstore_returns_documents_like_weaviate(index):
+    documents = index.as_vectorstore().similarity_search(
+        "maturity date", k=1, additional=["certainty", "distance"], where_filter={}
+    )
+    assert len(documents) == 1
+    assert documents[0].page_content == "The maturity date is 1 March 2026"
+    assert documents[0].metadata["isin"] == "NO2222222222"
+    additional = documents[0].metadata["_additional"]
+    assert additional["certainty"] == pytest.approx(1 - additional["distance"] / 2)
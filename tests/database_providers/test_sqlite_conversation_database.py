@@ -0,0 +1,295 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_document_search_backend.database_providers.conversation_database import (
+    Conversation,
+    ConversationWindow,
+    Message,
+    Source,
+)
+from ai_document_search_backend.database_providers.sqlite_conversation_database import (
+    SqliteConversationDatabase,
+)
+
+test_username = "test_user"
+user_message = Message(role="user", text="Hello")
+bot_message = Message(
+    role="bot",
+    text="Hi",
+    sources=[
+        Source(
+            isin="NO1111111111",
+            shortname="Bond 2021",
+            link="https://www.example.com/bond1.pdf",
+            page=1,
+            certainty=0.9,
+            distance=0.1,
+        ),
+        Source(
+            isin="NO2222222222",
+            shortname="Bond 2022",
+            link="https://www.example.com/bond2.pdf",
+            page=5,
+            certainty=0.8,
+            distance=0.2,
+        ),
+    ],
+)
+other_user_message = Message(role="user", text="How are you?")
+other_bot_message = Message(role="bot", text="Fine")
+
+db: SqliteConversationDatabase
+
+
+@pytest.fixture(autouse=True)
+def run_before_and_after_tests(tmp_path):
+    global db
+    db = SqliteConversationDatabase(path=str(tmp_path / "conversations.db"))
+    yield
+
+
+def test_get_latest_conversation_returns_none_when_conversation_does_not_exist():
+    assert db.get_latest_conversation(test_username) is None
+
+
+def test_adds_a_conversation_with_no_messages():
+    conversation = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation)
+    assert db.get_latest_conversation(test_username) == conversation
+
+
+def test_adds_a_conversation_with_messages():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    db.add_conversation(test_username, conversation)
+    assert db.get_latest_conversation(test_username) == conversation
+
+
+def test_gets_latest_conversation_with_no_messages():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation_newer)
+    db.add_conversation(test_username, conversation_older)
+    assert db.get_latest_conversation(test_username) == conversation_newer
+
+
+def test_gets_latest_conversation_with_messages():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(
+        created_at="2021-01-02T00:00:00", messages=[user_message, bot_message]
+    )
+    db.add_conversation(test_username, conversation_newer)
+    db.add_conversation(test_username, conversation_older)
+    assert db.get_latest_conversation(test_username) == conversation_newer
+
+
+def test_adds_to_latest_conversation_with_no_messages():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation_newer)
+    db.add_conversation(test_username, conversation_older)
+    db.add_to_latest_conversation(test_username, user_message, bot_message)
+
+    assert db.get_latest_conversation(test_username) == Conversation(
+        created_at="2021-01-02T00:00:00", messages=[user_message, bot_message]
+    )
+
+
+def test_adds_to_latest_conversation_with_existing_messages():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(
+        created_at="2021-01-02T00:00:00", messages=[user_message, bot_message]
+    )
+    db.add_conversation(test_username, conversation_newer)
+    db.add_conversation(test_username, conversation_older)
+    db.add_to_latest_conversation(test_username, user_message, bot_message)
+
+    assert db.get_latest_conversation(test_username) == Conversation(
+        created_at="2021-01-02T00:00:00",
+        messages=[user_message, bot_message, user_message, bot_message],
+    )
+
+
+def test_concurrent_additions_to_latest_conversation_are_all_kept():
+    conversation = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for _ in range(4):
+            executor.submit(db.add_to_latest_conversation, test_username, user_message, bot_message)
+
+    assert db.get_latest_conversation(test_username) == Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message] * 4,
+    )
+
+
+def test_raises_error_when_adding_messages_without_any_existing_conversation():
+    try:
+        db.add_to_latest_conversation(test_username, user_message, bot_message)
+        assert False
+    except ValueError as e:
+        assert str(e) == "No conversation found for user test_user"
+
+
+def test_gets_conversation_by_id():
+    conversation_older = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    older_id = db.add_conversation(test_username, conversation_older)
+    newer_id = db.add_conversation(test_username, conversation_newer)
+    assert older_id != newer_id
+    assert db.get_latest_conversation_id(test_username) == newer_id
+    assert db.get_conversation(test_username, older_id) == conversation_older
+
+
+def test_get_conversation_returns_none_when_conversation_does_not_exist():
+    assert db.get_conversation(test_username, "unknown") is None
+
+
+def test_adds_to_conversation_by_id():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    older_id = db.add_conversation(test_username, conversation_older)
+    db.add_conversation(test_username, conversation_newer)
+    db.add_to_conversation(test_username, older_id, user_message, bot_message)
+
+    assert db.get_conversation(test_username, older_id) == Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    assert db.get_latest_conversation(test_username) == conversation_newer
+
+
+def test_raises_error_when_adding_messages_to_unknown_conversation():
+    try:
+        db.add_to_conversation(test_username, "unknown", user_message, bot_message)
+        assert False
+    except ValueError as e:
+        assert str(e) == "No conversation unknown found for user test_user"
+
+
+def test_gets_last_messages_of_conversation():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    assert db.get_conversation_window(test_username, conversation_id, 2) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=[other_user_message, other_bot_message],
+        start=2,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id, 10) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=conversation.messages,
+        start=0,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=conversation.messages,
+        start=0,
+        total_messages=4,
+    )
+    assert db.get_conversation_window(test_username, conversation_id, 0) == ConversationWindow(
+        id=conversation_id,
+        created_at="2021-01-01T00:00:00",
+        messages=[],
+        start=4,
+        total_messages=4,
+    )
+
+
+def test_gets_messages_of_conversation_before_index():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=3)
+    assert window.messages == [bot_message, other_user_message]
+    assert window.start == 1
+    assert window.total_messages == 4
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=1)
+    assert window.messages == [user_message]
+    assert window.start == 0
+
+    window = db.get_conversation_window(test_username, conversation_id, before=2)
+    assert window.messages == [user_message, bot_message]
+    assert window.start == 0
+
+
+def test_gets_last_messages_when_before_is_beyond_the_end():
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00",
+        messages=[user_message, bot_message, other_user_message, other_bot_message],
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+
+    window = db.get_conversation_window(test_username, conversation_id, 2, before=10)
+    assert window.messages == [other_user_message, other_bot_message]
+    assert window.start == 2
+    assert window.total_messages == 4
+
+    window = db.get_conversation_window(test_username, conversation_id, 3, before=5)
+    assert window.messages == [bot_message, other_user_message, other_bot_message]
+    assert window.start == 1
+
+
+def test_get_conversation_window_returns_none_when_conversation_does_not_exist():
+    assert db.get_conversation_window(test_username, "unknown", 2) is None
+
+
+def test_clears_conversations():
+    conversation_older = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_newer = Conversation(created_at="2021-01-02T00:00:00", messages=[])
+    db.add_conversation(test_username, conversation_newer)
+    db.add_conversation(test_username, conversation_older)
+    db.clear_conversations(test_username)
+    assert db.get_latest_conversation(test_username) is None
+
+
+def test_keeps_messages_without_sources_and_with_no_sources():
+    message_with_no_sources = Message(role="bot", text="I don't know", sources=[])
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, message_with_no_sources]
+    )
+    conversation_id = db.add_conversation(test_username, conversation)
+    assert db.get_conversation(test_username, conversation_id) == conversation
+
+
+def test_does_not_get_conversation_of_other_user():
+    conversation = Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    conversation_id = db.add_conversation(test_username, conversation)
+    assert db.get_conversation("other_user", conversation_id) is None
+    assert db.get_latest_conversation_id("other_user") is None
+
+
+def test_keeps_conversations_after_reopening(tmp_path):
+    path = str(tmp_path / "reopened.db")
+    conversation = Conversation(
+        created_at="2021-01-01T00:00:00", messages=[user_message, bot_message]
+    )
+    conversation_id = SqliteConversationDatabase(path=path).add_conversation(
+        test_username, conversation
+    )
+    assert (
+        SqliteConversationDatabase(path=path).get_conversation(test_username, conversation_id)
+        == conversation
+    )
+
+
+def test_compresses_long_texts():
+    long_message = Message(role="bot", text="The loan to value ratio. " * 100)
+    conversation = Conversation(created_at="2021-01-01T00:00:00", messages=[long_message])
+    conversation_id = db.add_conversation(test_username, conversation)
+    assert db.get_conversation(test_username, conversation_id) == conversation
@@ -0,0 +1,127 @@
+import pandas as pd
+import pytest
+
+from ai_document_search_backend.services.chatbot_service import ChatbotError, ChatbotService
+from ai_document_search_backend.utils.embeddings import HashingEmbeddings
+from tests.database_providers.test_local_vector_index import page
+from tests.database_providers.weaviate_stand_in import StandInWeaviateClient
+from tests.utils.test_pdf_pages import write_pdf
+
+embeddings = HashingEmbeddings()
+
+
+@pytest.fixture
+def client() -> StandInWeaviateClient:
+    return StandInWeaviateClient()
+
+
+@pytest.fixture
+def documents(tmp_path) -> tuple[str, str]:
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "bond1.pdf", ["The loan to value ratio is 60 %", "Maturity in 2026"])
+    write_pdf(pdf_dir / "bond2.pdf", ["Interest is paid quarterly"])
+    metadata_path = tmp_path / "metadata.csv"
+    pd.DataFrame(
+        [
+            page("", isin="NO1111111111", filename="bond1.pdf"),
+            page("", isin="NO2222222222", filename="bond2.pdf"),
+        ]
+    ).drop(columns=["text", "page"]).to_csv(metadata_path, index=False)
+    return str(pdf_dir), str(metadata_path)
+
+
+def create_chatbot_service(client: StandInWeaviateClient, **kwargs) -> ChatbotService:
+    return ChatbotService(
+        weaviate_client=client,
+        embeddings=embeddings,
+        openai_api_key="test",
+        question_answering_model="test",
+        condense_question_model="test",
+        weaviate_class_name="Test",
+        ingestion_max_workers=1,
+        **kwargs,
+    )
+
+
+def get_alias_target(client: StandInWeaviateClient) -> str:
+    (alias,) = client.classes["TestAlias"]["objects"].values()
+    return alias["class_name"]
+
+
+def test_new_version_is_activated_and_old_classes_are_deleted(client, documents):
+    # The unversioned class of the documents stored before the versions.
+    client.schema.create_class({"class": "Test", "properties": []})
+    chatbot_service = create_chatbot_service(client)
+
+    assert chatbot_service.store_new_version(*documents) == "Test_v1"
+    assert get_alias_target(client) == "Test_v1"
+    assert chatbot_service.weaviate_class_name == "Test_v1"
+    assert chatbot_service.vector_index.count() == 3
+    # The previous class is kept, so that it can still be switched back to.
+    assert set(client.classes) == {"Test", "Test_v1", "TestAlias"}
+
+    assert chatbot_service.store_new_version(*documents) == "Test_v2"
+    assert chatbot_service.store_new_version(*documents) == "Test_v3"
+    assert get_alias_target(client) == "Test_v3"
+    assert set(client.classes) == {"Test_v2", "Test_v3", "TestAlias"}
+
+
+def test_other_instances_switch_to_the_new_version(client, documents):
+    chatbot_service = create_chatbot_service(client)
+    other_chatbot_service = create_chatbot_service(client)
+
+    chatbot_service.store_new_version(*documents)
+    assert other_chatbot_service.weaviate_class_name == "Test"
+    other_chatbot_service.refresh_active_class()
+    assert other_chatbot_service.weaviate_class_name == "Test_v1"
+
+
+def test_incremental_store_updates_the_active_version(client, documents, tmp_path):
+    create_chatbot_service(client).store_new_version(*documents)
+
+    # A new instance, e.g. of fill_vectorstore.py, starts with the base class.
+    chatbot_service = create_chatbot_service(client)
+    pdf_dir, metadata_path = documents
+    write_pdf(tmp_path / "pdfs" / "bond3.pdf", ["Coupon is 5 %"])
+    pd.DataFrame(
+        [
+            page("", isin="NO1111111111", filename="bond1.pdf"),
+            page("", isin="NO2222222222", filename="bond2.pdf"),
+            page("", isin="NO3333333333", filename="bond3.pdf"),
+        ]
+    ).drop(columns=["text", "page"]).to_csv(metadata_path, index=False)
+    chatbot_service.store(pdf_dir, metadata_path, incremental=True)
+
+    assert get_alias_target(client) == "Test_v1"
+    assert set(client.classes) == {"Test_v1", "TestAlias"}
+    assert len(client.classes["Test_v1"]["objects"]) == 4
+
+
+def test_failed_validation_keeps_the_alias_on_the_old_class(client, documents, tmp_path):
+    chatbot_service = create_chatbot_service(client, min_object_count_ratio=0.9)
+    chatbot_service.store_new_version(*documents)
+
+    # The new version has too few objects compared to the active one.
+    pdf_dir, metadata_path = documents
+    (tmp_path / "pdfs" / "bond1.pdf").unlink()
+    with pytest.raises(ChatbotError, match="Test_v2 has 1 objects, but Test_v1 has 3 objects"):
+        chatbot_service.store_new_version(pdf_dir, metadata_path)
+
+    assert get_alias_target(client) == "Test_v1"
+    assert chatbot_service.weaviate_class_name == "Test_v1"
+    assert set(client.classes) == {"Test_v1", "TestAlias"}
+
+
+def test_empty_version_is_not_activated(client, documents, tmp_path):
+    chatbot_service = create_chatbot_service(client)
+    chatbot_service.store_new_version(*documents)
+
+    pdf_dir, metadata_path = documents
+    write_pdf(tmp_path / "pdfs" / "bond1.pdf", [""])
+    write_pdf(tmp_path / "pdfs" / "bond2.pdf", [""])
+    with pytest.raises(ChatbotError, match="Class Test_v2 is empty"):
+        chatbot_service.store_new_version(pdf_dir, metadata_path)
+
+    assert get_alias_target(client) == "Test_v1"
+    assert set(client.classes) == {"Test_v1", "TestAlias"}
@@ -0,0 +1,158 @@
+"""
+Stand-in for the Weaviate client used by the tests of the class versions.
+
+It keeps the classes and their objects in memory and supports only the operations
+of WeaviateVectorIndex and of the class versions of ChatbotService.
+The vector search returns the objects in the order they were added.
+"""
+
+import copy
+from typing import Optional
+
+import weaviate
+
+
+class StandInSchema:
+    def __init__(self, classes: dict[str, dict]):
+        self.classes = classes
+
+    def exists(self, class_name: str) -> bool:
+        return class_name in self.classes
+
+    def create_class(self, schema_class: dict) -> None:
+        self.classes[schema_class["class"]] = {"schema": copy.deepcopy(schema_class), "objects": {}}
+
+    def delete_class(self, class_name: str) -> None:
+        del self.classes[class_name]
+
+    def get(self, class_name: Optional[str] = None) -> dict:
+        if class_name is not None:
+            return copy.deepcopy(self.classes[class_name]["schema"])
+        return {"classes": [copy.deepcopy(c["schema"]) for c in self.classes.values()]}
+
+
+class StandInDataObject:
+    def __init__(self, classes: dict[str, dict]):
+        self.classes = classes
+
+    def get_by_id(self, uuid: str, class_name: str) -> Optional[dict]:
+        if not self.exists(uuid, class_name):
+            return None
+        return {"id": uuid, "properties": copy.deepcopy(self.classes[class_name]["objects"][uuid])}
+
+    def exists(self, uuid: str, class_name: str) -> bool:
+        return class_name in self.classes and uuid in self.classes[class_name]["objects"]
+
+    def create(self, data_object: dict, class_name: str, uuid: str) -> str:
+        self.classes[class_name]["objects"][uuid] = copy.deepcopy(data_object)
+        return uuid
+
+    def replace(self, data_object: dict, class_name: str, uuid: str) -> None:
+        self.classes[class_name]["objects"][uuid] = copy.deepcopy(data_object)
+
+
+class StandInBatch:
+    def __init__(self, classes: dict[str, dict]):
+        self.classes = classes
+
+    def configure(self, batch_size: int) -> "StandInBatch":
+        return self
+
+    def __enter__(self) -> "StandInBatch":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def add_data_object(
+        self, data_object: dict, class_name: str, uuid: str, vector: Optional[list] = None
+    ) -> None:
+        self.classes[class_name]["objects"][uuid] = copy.deepcopy(data_object)
+
+    def delete_objects(self, class_name: str, where: dict) -> None:
+        assert where["path"] == ["id"] and where["operator"] == "ContainsAny"
+        for uuid in where["valueTextArray"]:
+            self.classes[class_name]["objects"].pop(uuid, None)
+
+
+class StandInGetQuery:
+    def __init__(self, classes: dict[str, dict], class_name: str, properties: list[str]):
+        self.classes = classes
+        self.class_name = class_name
+        self.properties = properties
+        self.additional: list[str] = []
+        self.limit: Optional[int] = None
+        self.after: Optional[str] = None
+
+    def with_additional(self, additional: list[str]) -> "StandInGetQuery":
+        self.additional = additional
+        return self
+
+    def with_near_vector(self, near_vector: dict) -> "StandInGetQuery":
+        return self
+
+    def with_limit(self, limit: int) -> "StandInGetQuery":
+        self.limit = limit
+        return self
+
+    def with_after(self, after: str) -> "StandInGetQuery":
+        self.after = after
+        return self
+
+    def do(self) -> dict:
+        objects = list(self.classes[self.class_name]["objects"].items())
+        if self.after is not None:
+            objects = objects[[uuid for uuid, _ in objects].index(self.after) + 1 :]
+        objects = objects[: self.limit]
+        return {
+            "data": {
+                "Get": {
+                    self.class_name: [
+                        {
+                            **{prop: properties.get(prop) for prop in self.properties},
+                            "_additional": {"id": uuid},
+                        }
+                        for uuid, properties in objects
+                    ]
+                }
+            }
+        }
+
+
+class StandInAggregateQuery:
+    def __init__(self, classes: dict[str, dict], class_name: str):
+        self.classes = classes
+        self.class_name = class_name
+
+    def with_meta_count(self) -> "StandInAggregateQuery":
+        return self
+
+    def do(self) -> dict:
+        count = len(self.classes[self.class_name]["objects"])
+        return {"data": {"Aggregate": {self.class_name: [{"meta": {"count": count}}]}}}
+
+
+class StandInQuery:
+    def __init__(self, classes: dict[str, dict]):
+        self.classes = classes
+
+    def get(self, class_name: str, properties: list[str]) -> StandInGetQuery:
+        return StandInGetQuery(self.classes, class_name, properties)
+
+    def aggregate(self, class_name: str) -> StandInAggregateQuery:
+        return StandInAggregateQuery(self.classes, class_name)
+
+
+class StandInWeaviateClient(weaviate.Client):
+    """Passes for a weaviate.Client (the vectorstore of LangChain checks it) without connecting"""
+
+    def __init__(self):
+        # class name -> {"schema": class schema, "objects": id -> properties}
+        self.classes: dict[str, dict] = {}
+        self.schema = StandInSchema(self.classes)
+        self.data_object = StandInDataObject(self.classes)
+        self.batch = StandInBatch(self.classes)
+        self.query = StandInQuery(self.classes)
+
+    def is_ready(self) -> bool:
+        return True
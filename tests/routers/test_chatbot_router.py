@@ -1,8 +1,18 @@
+import json
+
 import pytest
 from anys import ANY_STR, ANY_LIST, ANY_INT, ANY_FLOAT
+from dependency_injector import providers
 from fastapi.testclient import TestClient
 
 from ai_document_search_backend.application import app
+from ai_document_search_backend.database_providers.conversation_database import (
+    ConversationWindow,
+)
+from ai_document_search_backend.services.chatbot_service import (
+    ChatbotAnswer,
+    ChatbotStreamEvent,
+)
 
 test_username = "test_user"
 test_password = "test_password"
@@ -38,6 +48,14 @@ def test_not_authenticated_root_endpoint():
     assert response.status_code == 401
 
 
+def test_not_authenticated_stream_endpoint():
+    response = client.post(
+        "/chatbot/stream",
+        json={"question": "What is the Loan to value ratio?", "filters": []},
+    )
+    assert response.status_code == 401
+
+
 def test_not_authenticated_filter_endpoint():
     response = client.get("/chatbot/filter")
     assert response.status_code == 401
@@ -69,6 +87,36 @@ def test_chatbot_response(get_token):
     }
 
 
+def test_chatbot_stream_response(get_token):
+    """
+    This test runs against real OpenAI API and Weaviate instance.
+    APP_OPENAI_API_KEY and APP_WEAVIATE_API_KEY environment variables must be set.
+    """
+    response = client.post(
+        "/chatbot/stream",
+        headers={"Authorization": f"Bearer {get_token}"},
+        json={"question": "What is the Loan to value ratio?", "filters": []},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (lines[0].removeprefix("event: "), json.loads(lines[1].removeprefix("data: ")))
+        for lines in (event.split("\n") for event in response.text.strip().split("\n\n"))
+    ]
+    event_names = [name for name, _ in events]
+    assert event_names[0] == "sources"
+    assert event_names[-1] == "answer"
+    assert set(event_names[1:-1]) == {"token"}
+    assert events[-1][1] == {
+        "text": "".join(data for name, data in events if name == "token"),
+        "sources": events[0][1],
+    }
+
+    response = client.get("/conversation", headers={"Authorization": f"Bearer {get_token}"})
+    assert response.status_code == 200
+    assert len(response.json()["messages"]) == 2
+
+
 def test_chat_history(get_token):
     """
     This test runs against real OpenAI API and Weaviate instance.
@@ -115,6 +163,20 @@ def test_gets_available_filters(get_token):
     assert response_data["green"][0] == ANY_STR
 
 
+def test_filters_are_not_sent_again_when_etag_matches(get_token):
+    response = client.get("/chatbot/filter", headers={"Authorization": f"Bearer {get_token}"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = client.get(
+        "/chatbot/filter",
+        headers={"Authorization": f"Bearer {get_token}", "If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+
 @pytest.mark.parametrize(
     "filters",
     [
@@ -192,3 +254,37 @@ def test_chatbot_exception_when_message_is_too_long(get_token):
     }
     assert "Error while answering question:" in response_data["detail"]
     assert "This model's maximum context length is" in response_data["detail"]
+
+
+class AnsweringChatbotService:
+    max_history_length = 1
+
+    async def astream_answer(self, question, chat_history, filters):
+        yield ChatbotStreamEvent(event="sources", data=[])
+        yield ChatbotStreamEvent(event="token", data="Hi")
+        yield ChatbotStreamEvent(event="answer", data=ChatbotAnswer(text="Hi", sources=[]))
+
+
+class FailingConversationService:
+    async def aget_latest_conversation_window(self, username, max_messages=None, before=None):
+        return ConversationWindow(
+            id="id", created_at="2021-01-01T00:00:00", messages=[], start=0, total_messages=0
+        )
+
+    async def aadd_to_conversation(self, username, conversation_id, user_message, bot_message):
+        raise RuntimeError("Database is not available")
+
+
+def test_chatbot_stream_sends_error_event_when_saving_fails(get_token):
+    with app.container.chatbot_service.override(
+        providers.Object(AnsweringChatbotService())
+    ), app.container.conversation_service.override(providers.Object(FailingConversationService())):
+        response = client.post(
+            "/chatbot/stream",
+            headers={"Authorization": f"Bearer {get_token}"},
+            json={"question": "Hello", "filters": []},
+        )
+    assert response.status_code == 200
+    assert response.text.strip().split("\n\n")[-1] == (
+        'event: error\ndata: {"detail": "Error while streaming the answer"}'
+    )
@@ -1,5 +1,9 @@
+import json
+import time
+
 import pytest
 from anys import ANY_STR
+from dependency_injector import providers
 from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
 
@@ -9,6 +13,7 @@ from ai_document_search_backend.database_providers.conversation_database import
     Source,
     Conversation,
 )
+from tests.database_providers.cosmos_stand_in import StandInCosmosClients
 
 test_username = "test_user"
 test_password = "test_password"
@@ -42,6 +47,12 @@ app.container.config.auth.username.from_value(test_username)
 app.container.config.auth.password.from_value(test_password)
 
 app.container.config.cosmos.db_name.from_value("TestDB")
+app.container.config.conversation.database.from_value("cosmos")
+if app.container.config.cosmos.key():
+    app.container.cosmos_clients().provision(offer_throughput=400)
+else:
+    # Without a key, the tests run against an in-memory stand-in of Cosmos DB.
+    app.container.cosmos_clients.override(providers.Object(StandInCosmosClients()))
 
 client = TestClient(app)
 
@@ -89,6 +100,59 @@ def test_gets_latest_conversation(get_token):
     assert response.json() == jsonable_encoder(conversation_newer)
 
 
+def test_gets_latest_conversation_page_by_page(get_token):
+    conversation = Conversation(
+        created_at="2021-01-02T00:00:00",
+        messages=[user_message, bot_message, user_message, bot_message, user_message, bot_message],
+    )
+    conversation_id = app.container.conversation_database().add_conversation(
+        test_username, conversation
+    )
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.get("/conversation?limit=4", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": conversation_id,
+        "created_at": "2021-01-02T00:00:00",
+        "messages": jsonable_encoder([user_message, bot_message, user_message, bot_message]),
+        "start": 2,
+        "total_messages": 6,
+    }
+
+    response = client.get("/conversation?limit=4&before=2", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["messages"] == jsonable_encoder([user_message, bot_message])
+    assert response.json()["start"] == 0
+
+
+def test_streams_latest_conversation_as_ndjson(get_token):
+    conversation = Conversation(
+        created_at="2021-01-02T00:00:00",
+        messages=[user_message, bot_message, user_message, bot_message],
+    )
+    conversation_id = app.container.conversation_database().add_conversation(
+        test_username, conversation
+    )
+
+    response = client.get(
+        "/conversation?before=3",
+        headers={"Authorization": f"Bearer {get_token}", "Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines == [
+        {
+            "id": conversation_id,
+            "created_at": "2021-01-02T00:00:00",
+            "start": 0,
+            "total_messages": 4,
+        },
+        *jsonable_encoder([user_message, bot_message, user_message]),
+    ]
+
+
 def test_creates_new_empty_conversation_when_none_existed(get_token):
     response = client.post("/conversation", headers={"Authorization": f"Bearer {get_token}"})
     assert response.status_code == 200
@@ -110,3 +174,31 @@ def test_clears_conversations_of_user(get_token):
     response = client.delete("/conversation", headers={"Authorization": f"Bearer {get_token}"})
     assert response.status_code == 200
     assert response.json() == "Conversations deleted for user test_user"
+
+
+def test_clears_conversations_of_user_in_background(get_token):
+    conversation = Conversation(
+        created_at="2021-01-02T00:00:00", messages=[user_message, bot_message]
+    )
+    app.container.conversation_database().add_conversation(test_username, conversation)
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    response = client.delete("/conversation?background=true", headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    for _ in range(100):
+        response = client.get(f"/conversation/jobs/{job_id}", headers=headers)
+        assert response.status_code == 200
+        if response.json()["status"] == "succeeded":
+            break
+        time.sleep(0.1)
+    assert response.json()["status"] == "succeeded"
+    assert app.container.conversation_database().get_latest_conversation(test_username) is None
+
+
+def test_unknown_background_job_is_not_found(get_token):
+    response = client.get(
+        "/conversation/jobs/unknown", headers={"Authorization": f"Bearer {get_token}"}
+    )
+    assert response.status_code == 404
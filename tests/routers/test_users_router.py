@@ -30,3 +30,16 @@ def test_get_current_user_when_authenticated(get_token):
     response = client.get("/users/me", headers={"Authorization": f"Bearer {get_token}"})
     assert response.status_code == 200
     assert response.json() == {"username": test_username}
+
+
+def test_invalid_token():
+    response = client.get("/users/me", headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Could not validate credentials"}
+
+
+def test_get_current_user_repeatedly_with_the_same_token(get_token):
+    for _ in range(3):
+        response = client.get("/users/me", headers={"Authorization": f"Bearer {get_token}"})
+        assert response.status_code == 200
+        assert response.json() == {"username": test_username}
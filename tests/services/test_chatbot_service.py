@@ -0,0 +1,92 @@
+import pandas as pd
+
+from ai_document_search_backend.database_providers.local_vector_index import LocalVectorIndex
+from ai_document_search_backend.services.chatbot_service import ChatbotService
+from ai_document_search_backend.utils.answer_cache import AnswerCache
+from ai_document_search_backend.utils.embeddings import HashingEmbeddings
+from tests.database_providers.test_local_vector_index import page
+from tests.utils.test_pdf_pages import write_pdf
+
+embeddings = HashingEmbeddings()
+
+
+class CountingCombineDocsChain:
+    """Answers without calling the model, with the number of the answer"""
+
+    def __init__(self):
+        self.number_of_answers = 0
+
+    def run(self, input_documents, question: str) -> str:
+        self.number_of_answers += 1
+        return f"Answer {self.number_of_answers}"
+
+
+def create_chatbot_service(tmp_path) -> ChatbotService:
+    chatbot_service = ChatbotService(
+        weaviate_client=None,
+        vector_index=LocalVectorIndex(str(tmp_path / "index"), embeddings),
+        embeddings=embeddings,
+        openai_api_key="test",
+        question_answering_model="test",
+        condense_question_model="test",
+        weaviate_class_name="Test",
+        ingestion_max_workers=1,
+        index_manifest_path=str(tmp_path / "manifest.json"),
+        # The index is not reloaded by the refresh, only the manifest tells about the changes.
+        class_refresh_sec=3600,
+        answer_cache=AnswerCache(max_size=10),
+    )
+    chatbot_service.combine_docs_chain = CountingCombineDocsChain()
+    return chatbot_service
+
+
+def write_documents(tmp_path, texts: list[str]) -> tuple[str, str]:
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir(exist_ok=True)
+    write_pdf(pdf_dir / "bond1.pdf", texts)
+    metadata_path = tmp_path / "metadata.csv"
+    pd.DataFrame([page("", filename="bond1.pdf")]).drop(columns=["text", "page"]).to_csv(
+        metadata_path, index=False
+    )
+    return str(pdf_dir), str(metadata_path)
+
+
+def test_cached_answers_are_not_used_after_the_documents_are_stored_by_another_process(
+    tmp_path,
+):
+    documents = write_documents(tmp_path, ["The loan to value ratio is 60 %"])
+    create_chatbot_service(tmp_path).store(*documents, incremental=True)
+
+    chatbot_service = create_chatbot_service(tmp_path)
+    question = "What is the loan to value ratio?"
+    assert chatbot_service.answer(question, [], []).text == "Answer 1"
+    assert chatbot_service.answer(question, [], []).text == "Answer 1"
+
+    # e.g. fill_vectorstore.py
+    documents = write_documents(tmp_path, ["The loan to value ratio is 70 %"])
+    create_chatbot_service(tmp_path).store(*documents, incremental=True)
+
+    assert chatbot_service.answer(question, [], []).text == "Answer 2"
+
+
+def test_filters_are_read_again_after_the_documents_are_stored_by_another_process(tmp_path):
+    documents = write_documents(tmp_path, ["The loan to value ratio is 60 %"])
+    create_chatbot_service(tmp_path).store(*documents, incremental=True)
+
+    chatbot_service = create_chatbot_service(tmp_path)
+    cached_filters = chatbot_service.get_cached_filters()
+    assert cached_filters.filters.isin == ["NO1111111111"]
+    assert chatbot_service.get_cached_filters().etag == cached_filters.etag
+
+    pdf_dir, metadata_path = write_documents(tmp_path, ["The loan to value ratio is 60 %"])
+    pd.DataFrame([page("", isin="NO2222222222", filename="bond1.pdf")]).drop(
+        columns=["text", "page"]
+    ).to_csv(metadata_path, index=False)
+    other_chatbot_service = create_chatbot_service(tmp_path)
+    other_chatbot_service.store(pdf_dir, metadata_path, incremental=True)
+
+    # Weaviate would return the new values at once, the local index is reloaded first.
+    chatbot_service.vector_index.refresh()
+    new_cached_filters = chatbot_service.get_cached_filters()
+    assert new_cached_filters.filters.isin == ["NO2222222222"]
+    assert new_cached_filters.etag != cached_filters.etag
@@ -0,0 +1,215 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from ai_document_search_backend.database_providers.local_vector_index import LocalVectorIndex
+from ai_document_search_backend.services.chatbot_service import ChatbotService, Filters
+from ai_document_search_backend.utils.embeddings import HashingEmbeddings
+from ai_document_search_backend.utils.text_chunks import TextChunker
+from tests.database_providers.test_local_vector_index import page
+from tests.utils.test_pdf_pages import write_pdf
+from tests.utils.test_text_chunks import BYTE_ENCODING
+
+embeddings = HashingEmbeddings()
+
+
+def test_chatbot_service_stores_documents_in_local_index(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "bond1.pdf", ["The loan to value ratio is 60 %", "Maturity in 2026"])
+    write_pdf(pdf_dir / "bond2.pdf", ["Interest is paid quarterly"])
+    metadata_path = tmp_path / "metadata.csv"
+    pd.DataFrame(
+        [
+            page("", isin="NO1111111111", filename="bond1.pdf"),
+            page("", isin="NO2222222222", filename="bond2.pdf"),
+        ]
+    ).drop(columns=["text", "page"]).to_csv(metadata_path, index=False)
+
+    index = LocalVectorIndex(str(tmp_path / "index"), embeddings)
+    chatbot_service = ChatbotService(
+        weaviate_client=None,
+        vector_index=index,
+        embeddings=embeddings,
+        openai_api_key="test",
+        question_answering_model="test",
+        condense_question_model="test",
+        weaviate_class_name="Test",
+        ingestion_max_workers=1,
+        index_manifest_path=str(tmp_path / "manifest.json"),
+    )
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert index.count() == 3
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert [document["filename"] for document in manifest["documents"]] == [
+        "bond1.pdf",
+        "bond2.pdf",
+    ]
+    assert [len(document["object_ids"]) for document in manifest["documents"]] == [2, 1]
+    assert chatbot_service.get_filters() == Filters(
+        isin=["NO1111111111", "NO2222222222"],
+        issuer_name=["Issuer"],
+        filename=["bond1.pdf", "bond2.pdf"],
+        industry=["Shipping"],
+        risk_type=["Senior Unsecured"],
+        green=["No"],
+    )
+    documents = chatbot_service.vectorstore.similarity_search("loan to value ratio", k=1)
+    assert documents[0].metadata["filename"] == "bond1.pdf"
+    assert Path(documents[0].metadata["source"]).name == "bond1.pdf"
+
+    # Stored again, only the removed page is deleted.
+    (pdf_dir / "bond2.pdf").unlink()
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert index.count() == 2
+    assert chatbot_service.get_filters().isin == ["NO1111111111"]
+
+
+class RecordingLocalVectorIndex(LocalVectorIndex):
+    """Records the ids of the added objects and how many times the ids were listed"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.added_object_ids: list[str] = []
+        self.number_of_listings = 0
+
+    def get_object_ids(self) -> set[str]:
+        self.number_of_listings += 1
+        return super().get_object_ids()
+
+    def count(self) -> int:
+        return len(super().get_object_ids())
+
+    def add_objects(self, objects: list[tuple[str, dict]]) -> None:
+        self.added_object_ids.extend(object_id for object_id, _ in objects)
+        super().add_objects(objects)
+
+
+def create_local_chatbot_service(tmp_path, index: LocalVectorIndex) -> ChatbotService:
+    return ChatbotService(
+        weaviate_client=None,
+        vector_index=index,
+        embeddings=embeddings,
+        openai_api_key="test",
+        question_answering_model="test",
+        condense_question_model="test",
+        weaviate_class_name="Test",
+        ingestion_max_workers=1,
+        index_manifest_path=str(tmp_path / "manifest.json"),
+    )
+
+
+def write_metadata(metadata_path: Path, filenames: list[str]) -> None:
+    pd.DataFrame(
+        [page("", isin=f"NO{i:010d}", filename=filename) for i, filename in enumerate(filenames)]
+    ).drop(columns=["text", "page"]).to_csv(metadata_path, index=False)
+
+
+def test_object_ids_do_not_depend_on_the_pdf_directory(tmp_path):
+    for pdf_dir in [tmp_path / "pdfs", tmp_path / "moved_pdfs"]:
+        pdf_dir.mkdir()
+        write_pdf(pdf_dir / "bond1.pdf", ["The loan to value ratio is 60 %", "Maturity in 2026"])
+    metadata_path = tmp_path / "metadata.csv"
+    write_metadata(metadata_path, ["bond1.pdf"])
+
+    index = RecordingLocalVectorIndex(str(tmp_path / "index"), embeddings)
+    chatbot_service = create_local_chatbot_service(tmp_path, index)
+    chatbot_service.store(str(tmp_path / "pdfs"), str(metadata_path), incremental=True)
+    assert len(index.added_object_ids) == 2
+
+    index.added_object_ids.clear()
+    chatbot_service.store(str(tmp_path / "moved_pdfs"), str(metadata_path), incremental=True)
+    assert index.added_object_ids == []
+    assert index.count() == 2
+
+
+def test_incremental_store_skips_unchanged_files_and_replaces_changed_pages(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "bond1.pdf", ["The loan to value ratio is 60 %", "Maturity in 2026"])
+    write_pdf(pdf_dir / "bond2.pdf", ["Interest is paid quarterly"])
+    metadata_path = tmp_path / "metadata.csv"
+    write_metadata(metadata_path, ["bond1.pdf", "bond2.pdf"])
+
+    index = RecordingLocalVectorIndex(str(tmp_path / "index"), embeddings)
+    chatbot_service = create_local_chatbot_service(tmp_path, index)
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert len(index.added_object_ids) == 3
+    first_object_ids = index.get_object_ids()
+
+    # Unchanged files are skipped.
+    index.added_object_ids.clear()
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert index.added_object_ids == []
+    assert index.get_object_ids() == first_object_ids
+
+    # Only the changed page is stored, the page it replaces is deleted.
+    write_pdf(pdf_dir / "bond1.pdf", ["The loan to value ratio is 60 %", "Maturity in 2030"])
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert len(index.added_object_ids) == 1
+    object_ids = index.get_object_ids()
+    assert len(object_ids) == 3
+    assert object_ids - first_object_ids == set(index.added_object_ids)
+    documents = chatbot_service.vectorstore.similarity_search("Maturity", k=3)
+    assert sorted(document.page_content for document in documents) == [
+        "Interest is paid quarterly",
+        "Maturity in 2030",
+        "The loan to value ratio is 60 %",
+    ]
+
+
+def test_incremental_store_gets_the_stored_ids_from_the_manifest(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "bond1.pdf", ["The loan to value ratio is 60 %", "Maturity in 2026"])
+    metadata_path = tmp_path / "metadata.csv"
+    write_metadata(metadata_path, ["bond1.pdf"])
+
+    index = RecordingLocalVectorIndex(str(tmp_path / "index"), embeddings)
+    chatbot_service = create_local_chatbot_service(tmp_path, index)
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert manifest["class_name"] == index.name
+    assert set(manifest["object_ids"]) == index.get_object_ids()
+
+    index.number_of_listings = 0
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert index.number_of_listings == 0
+
+    # Without the manifest, the ids are listed from the index.
+    (tmp_path / "manifest.json").unlink()
+    index.added_object_ids.clear()
+    chatbot_service.store(str(pdf_dir), str(metadata_path), incremental=True)
+    assert index.number_of_listings == 1
+    assert index.added_object_ids == []
+
+
+def test_chatbot_service_stores_chunks_of_long_pages(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    write_pdf(pdf_dir / "bond1.pdf", ["Short page", "Another short page", "Interest " * 20])
+    metadata_path = tmp_path / "metadata.csv"
+    pd.DataFrame([page("", filename="bond1.pdf")]).drop(columns=["text", "page"]).to_csv(
+        metadata_path, index=False
+    )
+
+    index = LocalVectorIndex(str(tmp_path / "index"), embeddings)
+    chatbot_service = ChatbotService(
+        weaviate_client=None,
+        vector_index=index,
+        embeddings=embeddings,
+        openai_api_key="test",
+        question_answering_model="test",
+        condense_question_model="test",
+        weaviate_class_name="Test",
+        ingestion_max_workers=1,
+        chunk_size=100,
+        chunk_overlap=10,
+    )
+    # Counts the bytes as tokens, so the real encoding is not downloaded.
+    chatbot_service.text_chunker = TextChunker(100, 10, encoding=BYTE_ENCODING)
+    chatbot_service.store(str(pdf_dir), str(metadata_path))
+    documents = chatbot_service.vectorstore.similarity_search("short page", k=5)
+    assert sorted(document.metadata["page"] for document in documents) == [1, 2, 3, 3]
+    assert all(len(document.page_content) <= 100 for document in documents)
@@ -0,0 +1,84 @@
+import asyncio
+
+from langchain.schema.embeddings import Embeddings
+
+from ai_document_search_backend.utils.answer_cache import AnswerCache, normalize_question
+
+scope = '{"filters": {}}'
+other_scope = '{"filters": {"operator": "And"}}'
+
+
+class KeywordEmbeddings(Embeddings):
+    """Embeds a text by the occurrence of a few keywords."""
+
+    keywords = ["loan", "value", "ratio", "maturity", "date"]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(keyword in text.lower()) for keyword in self.keywords]
+
+
+def test_normalizes_question():
+    assert normalize_question("  What is the   Loan to value ratio? ") == (
+        "what is the loan to value ratio"
+    )
+
+
+def test_disabled_cache_returns_none():
+    cache = AnswerCache()
+    cache.set("What is the Loan to value ratio?", scope, "answer")
+    assert cache.get("What is the Loan to value ratio?", scope) is None
+
+
+def test_returns_answer_to_the_same_question():
+    cache = AnswerCache(max_size=10)
+    cache.set("What is the Loan to value ratio?", scope, "answer")
+    assert cache.get("what is the loan to value ratio", scope) == "answer"
+    assert cache.stats == {
+        "size": 1,
+        "exact_hits": 1,
+        "similar_hits": 0,
+        "misses": 0,
+        "hit_rate": 1.0,
+    }
+
+
+def test_does_not_return_answer_from_another_scope():
+    cache = AnswerCache(max_size=10)
+    cache.set("What is the Loan to value ratio?", scope, "answer")
+    assert cache.get("What is the Loan to value ratio?", other_scope) is None
+
+
+def test_does_not_return_answer_to_a_different_question_without_similarity():
+    cache = AnswerCache(max_size=10)
+    cache.set("What is the Loan to value ratio?", scope, "answer")
+    assert cache.get("Tell me the loan to value ratio", scope) is None
+
+
+def test_returns_answer_to_a_similar_question():
+    cache = AnswerCache(max_size=10, similarity_threshold=0.99, embeddings=KeywordEmbeddings())
+    cache.set("What is the Loan to value ratio?", scope, "answer")
+    assert cache.get("Tell me the loan to value ratio", scope) == "answer"
+    assert cache.get("What is the maturity date?", scope) is None
+    assert cache.get("Tell me the loan to value ratio", other_scope) is None
+    assert cache.stats["similar_hits"] == 1
+    assert cache.stats["misses"] == 2
+
+
+def test_async_lookup_of_a_similar_question():
+    cache = AnswerCache(max_size=10, similarity_threshold=0.99, embeddings=KeywordEmbeddings())
+
+    async def set_and_get():
+        await cache.aset("What is the Loan to value ratio?", scope, "answer")
+        return await cache.aget("Tell me the loan to value ratio", scope)
+
+    assert asyncio.run(set_and_get()) == "answer"
+
+
+def test_clear_removes_answers():
+    cache = AnswerCache(max_size=10)
+    cache.set("What is the Loan to value ratio?", scope, "answer")
+    cache.clear()
+    assert cache.get("What is the Loan to value ratio?", scope) is None
@@ -0,0 +1,44 @@
+import threading
+
+from ai_document_search_backend.utils.background_jobs import BackgroundJobs
+
+
+def test_runs_job_in_background():
+    jobs = BackgroundJobs(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn():
+        started.set()
+        release.wait(timeout=5)
+
+    job = jobs.submit("user", fn)
+    assert started.wait(timeout=5)
+    assert jobs.get("user", job.id).status == "running"
+
+    release.set()
+    jobs.shutdown()
+    job = jobs.get("user", job.id)
+    assert job.status == "succeeded"
+    assert job.finished_at is not None
+
+
+def test_records_failure():
+    jobs = BackgroundJobs(max_workers=1)
+
+    def fn():
+        raise ValueError("Something went wrong")
+
+    job = jobs.submit("user", fn)
+    jobs.shutdown()
+    job = jobs.get("user", job.id)
+    assert job.status == "failed"
+    assert job.error == "Something went wrong"
+
+
+def test_job_is_visible_only_to_its_owner():
+    jobs = BackgroundJobs(max_workers=1)
+    job = jobs.submit("user", lambda: None)
+    jobs.shutdown()
+    assert jobs.get("other_user", job.id) is None
+    assert jobs.get("user", "unknown") is None
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+from ai_document_search_backend.database_providers.conversation_database import (
+    Conversation,
+    Message,
+)
+from ai_document_search_backend.database_providers.in_memory_conversation_database import (
+    InMemoryConversationDatabase,
+)
+from ai_document_search_backend.services.conversation_service import ConversationService
+from ai_document_search_backend.utils.conversation_write_queue import ConversationWriteQueue
+
+test_username = "test_user"
+
+
+def get_exchange(i: int) -> tuple[Message, Message]:
+    return Message(role="user", text=f"Question {i}"), Message(role="bot", text=f"Answer {i}")
+
+
+class FlakyConversationDatabase(InMemoryConversationDatabase):
+    def __init__(self, failures: int):
+        self.failures = failures
+        super().__init__()
+
+    def add_exchanges_to_conversation(self, username, conversation_id, exchanges, write_id=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("Database unavailable")
+        super().add_exchanges_to_conversation(username, conversation_id, exchanges, write_id)
+
+
+def test_writes_exchanges_in_order():
+    db = InMemoryConversationDatabase()
+    conversation_id = db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    write_queue = ConversationWriteQueue(db, num_workers=2, batch_size=3)
+
+    for i in range(10):
+        assert write_queue.enqueue(test_username, conversation_id, *get_exchange(i))
+    assert write_queue.flush(timeout=5)
+
+    messages = db.get_conversation(test_username, conversation_id).messages
+    assert messages == [message for i in range(10) for message in get_exchange(i)]
+    assert write_queue.stats["persisted"] == 10
+    assert write_queue.stats["pending"] == 0
+    write_queue.shutdown()
+
+
+def test_retries_failed_writes():
+    db = FlakyConversationDatabase(failures=2)
+    conversation_id = db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    write_queue = ConversationWriteQueue(db, max_retries=3, retry_delay_sec=0.01)
+
+    write_queue.enqueue(test_username, conversation_id, *get_exchange(1))
+    assert write_queue.wait_until_written(test_username, timeout=5)
+
+    assert db.get_conversation(test_username, conversation_id).messages == list(get_exchange(1))
+    assert write_queue.stats["retries"] == 2
+    assert write_queue.stats["failed"] == 0
+    write_queue.shutdown()
+
+
+def test_drops_exchanges_of_unknown_conversation():
+    write_queue = ConversationWriteQueue(InMemoryConversationDatabase())
+
+    write_queue.enqueue(test_username, "unknown", *get_exchange(1))
+    assert write_queue.flush(timeout=5)
+
+    assert write_queue.stats["failed"] == 1
+    assert write_queue.stats["retries"] == 0
+    assert not write_queue.has_pending(test_username)
+    write_queue.shutdown()
+
+
+def test_refuses_exchanges_when_full():
+    db = InMemoryConversationDatabase()
+    release = threading.Event()
+
+    def wait_for_release(*args):
+        release.wait(timeout=5)
+
+    db.add_exchanges_to_conversation = wait_for_release
+    write_queue = ConversationWriteQueue(db, max_pending=1)
+
+    assert write_queue.enqueue(test_username, "id", *get_exchange(1))
+    assert write_queue.has_pending(test_username)
+    assert not write_queue.enqueue(test_username, "id", *get_exchange(2))
+
+    release.set()
+    write_queue.shutdown(timeout=5)
+    assert not write_queue.enqueue(test_username, "id", *get_exchange(3))
+
+
+def test_conversation_service_reads_queued_exchanges():
+    db = InMemoryConversationDatabase()
+    write_queue = ConversationWriteQueue(db)
+    conversation_service = ConversationService(db, write_queue=write_queue)
+
+    window = conversation_service.get_latest_conversation_window(test_username)
+    conversation_service.add_to_conversation(test_username, window.id, *get_exchange(1))
+    window = conversation_service.get_latest_conversation_window(test_username)
+
+    assert window.messages == list(get_exchange(1))
+    write_queue.shutdown()
+
+
+def test_logs_stats_periodically(caplog):
+    db = InMemoryConversationDatabase()
+    conversation_id = db.add_conversation(
+        test_username, Conversation(created_at="2021-01-01T00:00:00", messages=[])
+    )
+    write_queue = ConversationWriteQueue(db, stats_log_interval_sec=0.01)
+
+    with caplog.at_level(logging.INFO):
+        write_queue.enqueue(test_username, conversation_id, *get_exchange(1))
+        assert write_queue.flush(timeout=5)
+        time.sleep(0.1)
+    write_queue.shutdown()
+    assert any("'persisted': 1" in record.message for record in caplog.records)
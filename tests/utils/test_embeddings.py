@@ -0,0 +1,90 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from ai_document_search_backend.utils.embeddings import CachedEmbeddings, HashingEmbeddings
+
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    embeddings = HashingEmbeddings(dimensions=64)
+    embedding = embeddings.embed_query("What is the Loan to value ratio?")
+    assert len(embedding) == 64
+    assert np.isclose(np.linalg.norm(embedding), 1.0)
+    assert HashingEmbeddings(dimensions=64).embed_query("what is the loan to value ratio") == (
+        embedding
+    )
+
+
+def test_hashing_embeddings_of_texts_sharing_words_are_similar():
+    embeddings = HashingEmbeddings()
+    question, related, unrelated = embeddings.embed_documents(
+        [
+            "What is the Loan to value ratio?",
+            "The loan to value ratio shall not exceed 75 %.",
+            "Interest is paid quarterly in arrears.",
+        ]
+    )
+    assert np.dot(question, related) > np.dot(question, unrelated)
+
+
+def test_hashing_embeddings_of_empty_text():
+    assert HashingEmbeddings(dimensions=8).embed_query("") == [0.0] * 8
+
+
+def test_hashing_embeddings_asynchronously():
+    embeddings = HashingEmbeddings()
+    assert asyncio.run(embeddings.aembed_query("maturity date")) == embeddings.embed_query(
+        "maturity date"
+    )
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(dimensions=16)
+        self.embedded_queries = []
+
+    def embed_query(self, text: str) -> list[float]:
+        self.embedded_queries.append(text)
+        return super().embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        raise NotImplementedError
+
+
+def test_cached_embeddings_embed_each_query_once():
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, max_size=1)
+    first = cached.embed_query("maturity date")
+    assert cached.embed_query("maturity date") == first
+    cached.embed_query("interest")
+    # The least recently used query was evicted.
+    cached.embed_query("maturity date")
+    assert embeddings.embedded_queries == ["maturity date", "interest", "maturity date"]
+    assert cached.stats == {"size": 1, "hits": 1, "disk_hits": 0, "misses": 3, "hit_rate": 0.25}
+    # The documents are not cached.
+    assert cached.embed_documents(["interest"]) == [embeddings.embed_query("interest")]
+
+
+def test_cached_embeddings_asynchronously():
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings)
+    first = asyncio.run(cached.aembed_query("maturity date"))
+    assert asyncio.run(cached.aembed_query("maturity date")) == first
+    assert cached.embed_query("maturity date") == first
+    assert embeddings.embedded_queries == ["maturity date"]
+
+
+def test_cached_embeddings_are_stored_on_disk_per_model(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    embedding = CachedEmbeddings(CountingEmbeddings(), path=path).embed_query("maturity date")
+
+    embeddings = CountingEmbeddings()
+    cached = CachedEmbeddings(embeddings, path=path)
+    assert cached.embed_query("maturity date") == pytest.approx(embedding)
+    assert asyncio.run(cached.aembed_query("maturity date")) == pytest.approx(embedding)
+    assert embeddings.embedded_queries == []
+    assert cached.stats["disk_hits"] == 1
+
+    other_model = CachedEmbeddings(HashingEmbeddings(dimensions=8), path=path)
+    assert len(other_model.embed_query("maturity date")) == 8
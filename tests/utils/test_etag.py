@@ -0,0 +1,40 @@
+from ai_document_search_backend.utils.etag import compute_etag, etag_matches
+
+etag = compute_etag({"isin": ["NO1111111111", "NO2222222222"]})
+
+
+def test_etag_is_quoted():
+    assert etag.startswith('"')
+    assert etag.endswith('"')
+
+
+def test_etag_does_not_depend_on_key_order():
+    assert compute_etag({"a": [1], "b": [2]}) == compute_etag({"b": [2], "a": [1]})
+
+
+def test_etag_depends_on_values():
+    assert compute_etag({"isin": ["NO1111111111"]}) != etag
+
+
+def test_no_header_does_not_match():
+    assert not etag_matches(None, etag)
+
+
+def test_same_etag_matches():
+    assert etag_matches(etag, etag)
+
+
+def test_weak_etag_matches():
+    assert etag_matches(f"W/{etag}", etag)
+
+
+def test_one_of_multiple_etags_matches():
+    assert etag_matches(f'"other", {etag}', etag)
+
+
+def test_star_matches():
+    assert etag_matches("*", etag)
+
+
+def test_different_etag_does_not_match():
+    assert not etag_matches('"other"', etag)
@@ -0,0 +1,42 @@
+import numpy as np
+
+from ai_document_search_backend.utils.filter_index import FilterIndex
+from ai_document_search_backend.utils.filters import Filter
+
+objects = [
+    {"isin": "NO1", "industry": "Shipping", "page": 1},
+    {"isin": "NO2", "industry": "Banks", "page": 1},
+    {"isin": "NO1", "industry": "Shipping", "page": 2},
+    {"isin": "NO3", "industry": None, "page": 1},
+]
+
+
+def test_gets_rows_of_value():
+    filter_index = FilterIndex(objects)
+    assert filter_index.get_rows("isin", "NO1").tolist() == [0, 2]
+    assert filter_index.get_rows("page", 1).tolist() == [0, 1, 3]
+    assert filter_index.get_rows("isin", "NO4").tolist() == []
+    assert filter_index.get_rows("industry", None).tolist() == []
+
+
+def test_matches_filters():
+    filter_index = FilterIndex(objects)
+    mask = filter_index.match(
+        [
+            Filter(property_name="isin", values=["NO1", "NO2"]),
+            Filter(property_name="industry", values=["Shipping"]),
+        ]
+    )
+    assert np.flatnonzero(mask).tolist() == [0, 2]
+    assert not filter_index.match(
+        [
+            Filter(property_name="isin", values=["NO2"]),
+            Filter(property_name="industry", values=["Shipping"]),
+        ]
+    ).any()
+
+
+def test_matches_everything_without_values():
+    filter_index = FilterIndex(objects)
+    assert filter_index.match([]) is None
+    assert filter_index.match([Filter(property_name="isin", values=[])]) is None
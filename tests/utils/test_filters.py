@@ -1,5 +1,9 @@
 from ai_document_search_backend.services.chatbot_service import Filter
-from ai_document_search_backend.utils.filters import construct_and_filter
+from ai_document_search_backend.utils.filters import (
+    construct_and_filter,
+    construct_object_ids_filter,
+    normalize_filters,
+)
 
 
 def test_empty_filters():
@@ -160,3 +164,38 @@ def test_multiple_filters_with_multiple_values():
             },
         ],
     }
+
+
+def test_normalize_filters():
+    filters = normalize_filters(
+        [
+            Filter(property_name="isin", values=["NO2222222222", "NO1111111111"]),
+            Filter(property_name="green", values=[]),
+            Filter(property_name="industry", values=["Real Estate - Commercial"]),
+            Filter(property_name="isin", values=["NO1111111111"]),
+        ]
+    )
+    assert filters == [
+        Filter(property_name="industry", values=["Real Estate - Commercial"]),
+        Filter(property_name="isin", values=["NO1111111111"]),
+        Filter(property_name="isin", values=["NO1111111111", "NO2222222222"]),
+    ]
+
+
+def test_normalize_filters_keeps_the_meaning_of_repeated_properties():
+    both_isins = [Filter(property_name="isin", values=["NO2222222222", "NO1111111111"])]
+    each_isin = [
+        Filter(property_name="isin", values=["NO2222222222"]),
+        Filter(property_name="isin", values=["NO1111111111"]),
+    ]
+    assert normalize_filters(both_isins) != normalize_filters(each_isin)
+    assert normalize_filters(each_isin) == normalize_filters(list(reversed(each_isin)))
+    assert normalize_filters(each_isin + each_isin) == normalize_filters(each_isin)
+
+
+def test_object_ids_filter():
+    assert construct_object_ids_filter(["id1", "id2"]) == {
+        "path": ["id"],
+        "operator": "ContainsAny",
+        "valueTextArray": ["id1", "id2"],
+    }
@@ -0,0 +1,77 @@
+import time
+
+from ai_document_search_backend.utils.lru_cache import LRUCache
+
+
+def test_returns_none_for_missing_key():
+    cache = LRUCache(max_size=2)
+    assert cache.get("a") is None
+    assert cache.misses == 1
+
+
+def test_returns_stored_value():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.hits == 1
+
+
+def test_evicts_least_recently_used_entry():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_entry_expires_after_ttl():
+    cache = LRUCache(max_size=2, ttl_sec=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_entry_expires_at_its_own_expiration():
+    cache = LRUCache(max_size=2, ttl_sec=60)
+    cache.set("a", 1, expires_at=time.time() - 1)
+    cache.set("b", 2, expires_at=time.time() + 60)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_values_skip_expired_entries():
+    cache = LRUCache(max_size=3)
+    cache.set("a", 1, expires_at=time.time() - 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.values() == [2, 3]
+
+
+def test_delete_and_clear():
+    cache = LRUCache(max_size=3)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert cache.get("b") is None
+    assert len(cache) == 0
+
+
+def test_zero_size_disables_cache():
+    cache = LRUCache(max_size=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_hit_rate():
+    cache = LRUCache(max_size=2)
+    assert cache.hit_rate == 0.0
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    assert cache.hit_rate == 0.5
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from ai_document_search_backend.utils.pdf_pages import iter_pdf_pages, list_pdf_files, PdfPage
+
+
+def write_pdf(path: Path, page_texts: list[str]) -> None:
+    """Write a minimal PDF with one line of text on each page"""
+
+    num_pages = len(page_texts)
+    font_id = 3 + 2 * num_pages
+    page_ids = [3 + 2 * i for i in range(num_pages)]
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        2: f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {num_pages} >>",
+        font_id: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for page_id, text in zip(page_ids, page_texts):
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET" if text else ""
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        )
+        objects[page_id + 1] = f"<< /Length {len(content)} >>\nstream\n{content}\nendstream"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(pdf)
+        pdf += f"{object_id} 0 obj\n{objects[object_id]}\nendobj\n".encode()
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for object_id in sorted(objects):
+        pdf += f"{offsets[object_id]:010d} 00000 n \n".encode()
+    pdf += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    path.write_bytes(pdf)
+
+
+@pytest.fixture
+def pdf_dir(tmp_path: Path) -> Path:
+    write_pdf(tmp_path / "bond1.pdf", ["Loan to value ratio", "Maturity date"])
+    write_pdf(tmp_path / "bond2.pdf", ["", "Green bond"])
+    (tmp_path / "nested").mkdir()
+    write_pdf(tmp_path / "nested" / "bond3.pdf", ["Issuer"])
+    write_pdf(tmp_path / ".hidden.pdf", ["Hidden"])
+    (tmp_path / "notes.txt").write_text("Not a PDF")
+    return tmp_path
+
+
+def test_list_pdf_files(pdf_dir):
+    assert list_pdf_files(str(pdf_dir)) == [
+        str(pdf_dir / "bond1.pdf"),
+        str(pdf_dir / "bond2.pdf"),
+        str(pdf_dir / "nested" / "bond3.pdf"),
+    ]
+
+
+def test_iter_pdf_pages(pdf_dir):
+    pdf_paths = list_pdf_files(str(pdf_dir))
+    pages = list(iter_pdf_pages(pdf_paths, max_workers=2, max_pending_files=1))
+    assert pages == [
+        PdfPage(source=pdf_paths[0], page=1, text="Loan to value ratio"),
+        PdfPage(source=pdf_paths[0], page=2, text="Maturity date"),
+        PdfPage(source=pdf_paths[1], page=1, text=""),
+        PdfPage(source=pdf_paths[1], page=2, text="Green bond"),
+        PdfPage(source=pdf_paths[2], page=1, text="Issuer"),
+    ]
+
+
+def test_iter_pdf_pages_raises_on_invalid_pdf(tmp_path):
+    invalid_pdf = tmp_path / "invalid.pdf"
+    invalid_pdf.write_text("Not a PDF")
+    with pytest.raises(Exception):
+        list(iter_pdf_pages([str(invalid_pdf)], max_workers=1))
@@ -0,0 +1,16 @@
+import os
+
+from ai_document_search_backend.utils.relative_path_from_file import resolve_path_from_file
+
+
+def test_resolves_relative_paths_against_the_directory_of_the_file():
+    assert resolve_path_from_file("/repo/config.yml", "data/index_manifest.json") == os.path.join(
+        "/repo", "data", "index_manifest.json"
+    )
+
+
+def test_keeps_absolute_paths_and_none():
+    assert (
+        resolve_path_from_file("/repo/config.yml", "/data/manifest.json") == "/data/manifest.json"
+    )
+    assert resolve_path_from_file("/repo/config.yml", None) is None
@@ -0,0 +1,22 @@
+import time
+
+from ai_document_search_backend.utils.stage_timer import StageTimer
+
+
+def test_measures_stages():
+    timer = StageTimer()
+    with timer.measure("retrieve"):
+        time.sleep(0.01)
+    with timer.measure("answer"):
+        pass
+    assert list(timer.durations_ms.keys()) == ["retrieve", "answer"]
+    assert timer.durations_ms["retrieve"] >= 10
+    assert timer.total_ms >= timer.durations_ms["retrieve"]
+
+
+def test_formats_stages():
+    timer = StageTimer()
+    with timer.measure("condense"):
+        pass
+    assert str(timer).startswith("condense=")
+    assert "total=" in str(timer)
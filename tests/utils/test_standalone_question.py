@@ -0,0 +1,45 @@
+import pytest
+
+from ai_document_search_backend.utils.standalone_question import is_standalone_question
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What is the maturity date of the Bond 2021?",
+        "What is the loan to value ratio of NO1111111111?",
+        "Who is the trustee of NAS 19/24 FRN?",
+    ],
+)
+def test_standalone_questions(question):
+    assert is_standalone_question(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What value should it not exceed?",
+        "And the maturity date?",
+        "What about the second bond?",
+        "Why?",
+        "Who is the issuer of this bond?",
+        "How do they compare?",
+        "Tell me more about the same bond",
+    ],
+)
+def test_follow_up_questions(question):
+    assert not is_standalone_question(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "What is the maturity date?",
+        "What is the Loan to value ratio?",
+        "Which industry is the issuer in?",
+        "Is the bond green or not?",
+        "What is the interest rate in 2024?",
+    ],
+)
+def test_elliptical_follow_up_questions(question):
+    assert not is_standalone_question(question)
@@ -0,0 +1,62 @@
+import pytest
+import tiktoken
+
+from ai_document_search_backend.utils.pdf_pages import PdfPage
+from ai_document_search_backend.utils.text_chunks import TextChunker
+
+# Each byte is a token, there are no merges, so the real encodings are not downloaded.
+BYTE_ENCODING = tiktoken.Encoding(
+    name="bytes",
+    pat_str=r"\S+|\s+",
+    mergeable_ranks={bytes([i]): i for i in range(256)},
+    special_tokens={},
+)
+
+
+def chunker(chunk_size: int, chunk_overlap: int = 0) -> TextChunker:
+    return TextChunker(chunk_size, chunk_overlap, encoding=BYTE_ENCODING)
+
+
+def pages(source: str, *texts: str) -> list[PdfPage]:
+    return [PdfPage(source=source, page=i + 1, text=text) for i, text in enumerate(texts)]
+
+
+def test_keeps_short_pages_whole():
+    short_pages = pages("a.pdf", "abc", "d") + pages("b.pdf", "efgh")
+    assert list(chunker(4).iter_chunks(short_pages)) == short_pages
+
+
+def test_splits_long_pages_with_overlap():
+    chunks = list(chunker(4, chunk_overlap=1).iter_chunks(pages("a.pdf", "ab", "abcdefghij", "k")))
+    assert [(chunk.page, chunk.text) for chunk in chunks] == [
+        (1, "ab"),
+        (2, "abcd"),
+        (2, "defg"),
+        (2, "ghij"),
+        (3, "k"),
+    ]
+
+
+def test_chunks_are_at_most_chunk_size_tokens():
+    text = "The loan to value ratio shall not exceed 75 %. " * 20
+    chunks = list(chunker(50, chunk_overlap=10).iter_chunks(pages("a.pdf", text, "", text)))
+    assert all(len(BYTE_ENCODING.encode(chunk.text)) <= 50 for chunk in chunks)
+    assert {chunk.page for chunk in chunks} == {1, 2, 3}
+    assert chunks[0].text == text[:50]
+    assert chunks[1].text == text[40:90]
+
+
+def test_does_not_split_characters():
+    # Each of "æ", "ø" and "å" is two bytes, so two tokens.
+    text = "Lånet forfaller i år for økonomien"
+    chunks = list(chunker(5, chunk_overlap=1).iter_chunks(pages("a.pdf", text)))
+    assert all("�" not in chunk.text for chunk in chunks)
+    assert all(len(BYTE_ENCODING.encode(chunk.text)) <= 5 for chunk in chunks)
+    # Without the overlap, the chunks are the whole text.
+    chunks = list(chunker(5).iter_chunks(pages("a.pdf", text)))
+    assert "".join(chunk.text for chunk in chunks) == text
+
+
+def test_rejects_overlap_not_less_than_chunk_size():
+    with pytest.raises(ValueError):
+        TextChunker(10, chunk_overlap=10)